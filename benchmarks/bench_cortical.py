@@ -0,0 +1,45 @@
+import pytest
+
+from generators import write_freesurfer_stats
+from onsetpy.scripts.onset_convert_fs_stats import load_aparc_stats, load_aseg_stats
+from onsetpy.scripts.onset_evaluate_cortical_measures import (
+    ROI_MAPPING,
+    evaluate_asymmetry,
+    plot_asymmetry_index,
+)
+
+
+@pytest.fixture
+def stats_files(tmp_path):
+    return write_freesurfer_stats(tmp_path)
+
+
+@pytest.fixture
+def stats(stats_files):
+    lh, rh, aseg = stats_files
+    return load_aparc_stats(lh, rh), load_aseg_stats(aseg)
+
+
+def test_load_freesurfer_stats(measure, stats_files):
+    lh, rh, aseg = stats_files
+    measure(lambda: (load_aparc_stats(lh, rh), load_aseg_stats(aseg)))
+
+
+def test_evaluate_asymmetry(measure, stats):
+    aparc, aseg = stats
+    measure(evaluate_asymmetry, aparc, aseg, 0)
+
+
+def test_plot_asymmetry_index(measure, stats, tmp_path):
+    import matplotlib.pyplot as plt
+
+    aparc, aseg = stats
+    df_combined, df_aparc = evaluate_asymmetry(aparc, aseg, 0)
+
+    def _plot():
+        figure = plot_asymmetry_index(
+            df_combined.copy(), df_aparc.index, ROI_MAPPING, tmp_path / "asymmetry.png"
+        )
+        plt.close(figure)
+
+    measure(_plot)
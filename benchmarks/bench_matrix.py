@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from generators import make_cohort, write_json_matrices
+from onsetpy.scripts.onset_json_to_npy import json_to_npy
+from onsetpy.scripts.onset_mean_std_connectivity_matrix import (
+    accumulate_stats,
+    calculate_stats,
+)
+from onsetpy.scripts.onset_zscore_connectivity_matrix import (
+    calculate_leave_one_out_z_scores,
+    calculate_z_scores,
+)
+
+# The largest cohort takes ~640 MB per float64 copy, too much for the default CI runners
+LARGE = pytest.mark.skipif(
+    not os.environ.get("ONSETPY_BENCH_LARGE"),
+    reason="Set ONSETPY_BENCH_LARGE=1 to benchmark the large cohorts.",
+)
+COHORTS = [(50, 84), (200, 164), pytest.param(500, 400, marks=LARGE)]
+
+
+# The single pass of onset_mean_std_connectivity_matrix, with and without its sketch
+@pytest.mark.parametrize("n_bins", [None, 128])
+@pytest.mark.parametrize("precision", ["float64", "float32"])
+@pytest.mark.parametrize("n_subjects,n_regions", COHORTS)
+def test_accumulate_stats(measure, n_subjects, n_regions, precision, n_bins):
+    matrices = list(make_cohort(n_subjects, n_regions))
+    measure(accumulate_stats, matrices, precision, n_bins, items=n_subjects)
+
+
+@pytest.mark.parametrize("n_subjects,n_regions", COHORTS)
+def test_calculate_z_scores(measure, n_subjects, n_regions):
+    cohort = make_cohort(n_subjects, n_regions)
+    mean, std = calculate_stats(list(cohort))
+    measure(calculate_z_scores, mean, std, list(cohort), items=n_subjects)
+
+
+@pytest.mark.parametrize("n_subjects,n_regions", COHORTS)
+def test_calculate_leave_one_out_z_scores(measure, n_subjects, n_regions):
+    matrices = list(make_cohort(n_subjects, n_regions))
+    measure(calculate_leave_one_out_z_scores, matrices, items=n_subjects)
+
+
+@pytest.mark.parametrize("n_matrices,n_regions", [(10, 84), (10, 400)])
+def test_json_to_npy(measure, tmp_path, n_matrices, n_regions):
+    json_file = os.path.join(tmp_path, "matrices.json")
+    write_json_matrices(json_file, n_matrices, n_regions)
+    measure(json_to_npy, json_file, os.path.join(tmp_path, "npy"), items=n_matrices)
@@ -0,0 +1,45 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from generators import write_nifti, write_report_manifest
+from onsetpy.scripts.onset_epinsight_screenshots import render_screenshots
+
+
+@pytest.mark.parametrize("n_images", [1, 3])
+def test_render_screenshots(measure, tmp_path, n_images):
+    import matplotlib.pyplot as plt
+
+    paths = [
+        write_nifti(os.path.join(tmp_path, f"image_{i}.nii.gz"), seed=i)
+        for i in range(n_images)
+    ]
+
+    def _render():
+        figure = render_screenshots(
+            paths,
+            [f"Image {i}" for i in range(n_images)],
+            ["gray"] * n_images,
+            (91, 109, 91),
+        )
+        figure.savefig(os.path.join(tmp_path, "screenshot.png"))
+        plt.close(figure)
+
+    measure(_render, items=n_images)
+
+
+def test_report_to_pdf(measure, tmp_path):
+    try:
+        from onsetpy.reporting.report import EpinsightReport
+    except OSError as e:
+        pytest.skip(f"WeasyPrint libraries are not available: {e}")
+
+    manifest = write_report_manifest(tmp_path)
+
+    def _report():
+        report = EpinsightReport("Patient", "0001", datetime.now().strftime("%d-%m-%Y"))
+        report.render(**manifest)
+        report.to_pdf(os.path.join(tmp_path, "report.pdf"))
+
+    measure(_report)
@@ -0,0 +1,39 @@
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+# The generators module lives next to the benchmarks, which are not a package
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+@pytest.fixture
+def measure(benchmark):
+    """Benchmark a function and record its throughput and memory use.
+
+    The extra information saved with each benchmark run:
+        items_per_second: throughput, when the number of processed items is given.
+        peak_traced_mb: peak memory allocated during one call (Python and numpy).
+    """
+
+    def _measure(function, *args, items=None, **kwargs):
+        # Warm up first, so that lazy imports do not count in the peak memory
+        function(*args, **kwargs)
+        tracemalloc.start()
+        try:
+            function(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        result = benchmark(function, *args, **kwargs)
+
+        benchmark.extra_info["peak_traced_mb"] = peak / 2**20
+        if items is not None and benchmark.stats is not None:
+            benchmark.extra_info["items_per_second"] = (
+                items / benchmark.stats.stats.mean
+            )
+        return result
+
+    return _measure
@@ -0,0 +1,171 @@
+"""
+Synthetic data generators for the benchmarks.
+
+The data only has to look like the real inputs: the sizes and formats are realistic,
+the values are random.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from onsetpy.scripts.onset_evaluate_cortical_measures import ROI_MAPPING
+
+APARC_ROIS = [
+    roi for roi in ROI_MAPPING if roi.startswith(("G_", "S_", "Pole_", "Lat_"))
+]
+ASEG_ROIS = [
+    "Lateral-Ventricle",
+    "Inf-Lat-Vent",
+    "Cerebellum-White-Matter",
+    "Cerebellum-Cortex",
+    "Thalamus",
+    "Caudate",
+    "Putamen",
+    "Pallidum",
+    "Hippocampus",
+    "Amygdala",
+    "Accumbens-area",
+    "VentralDC",
+    "vessel",
+    "choroid-plexus",
+]
+
+
+def make_cohort(n_subjects, n_regions, seed=0):
+    """Generate a cohort of symmetric connectivity matrices.
+
+    Args:
+        n_subjects (int): Number of subjects.
+        n_regions (int): Number of regions of the parcellation.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+
+    Returns:
+        np.ndarray: Matrices of shape (n_subjects, n_regions, n_regions).
+    """
+    rng = np.random.default_rng(seed)
+    cohort = rng.gamma(2.0, 1.0, size=(n_subjects, n_regions, n_regions))
+    cohort += cohort.transpose(0, 2, 1)
+    cohort[:, np.arange(n_regions), np.arange(n_regions)] = 0
+    return cohort
+
+
+def write_cohort(directory, n_subjects, n_regions, seed=0):
+    """Write a cohort of connectivity matrices as .npy files.
+
+    Returns:
+        list: Paths of the matrices.
+    """
+    paths = []
+    for i, matrix in enumerate(make_cohort(n_subjects, n_regions, seed)):
+        path = os.path.join(directory, f"sub-{i:04d}.npy")
+        np.save(path, matrix)
+        paths.append(path)
+    return paths
+
+
+def write_json_matrices(path, n_matrices, n_regions, seed=0):
+    """Write connectivity matrices in the JSON format read by onset_json_to_npy."""
+    cohort = make_cohort(n_matrices, n_regions, seed)
+    with open(path, "w") as f:
+        json.dump(
+            {f"matrix_{i}": matrix.tolist() for i, matrix in enumerate(cohort)}, f
+        )
+
+
+def write_aparc_stats(path, seed=0):
+    """Write a FreeSurfer aparc.a2009s statistics file of one hemisphere."""
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write("# Table of FreeSurfer cortical parcellation anatomical statistics\n")
+        f.write(
+            "# ColHeaders StructName NumVert SurfArea GrayVol ThickAvg ThickStd ...\n"
+        )
+        for roi in APARC_ROIS:
+            f.write(
+                f"{roi:<32} {rng.integers(500, 5000):6d} {rng.uniform(300, 3000):7.1f} "
+                f"{rng.integers(1000, 10000):6d} {rng.uniform(1.5, 3.5):5.3f} 0.600 "
+                "0.130 0.035 14 1.6\n"
+            )
+
+
+def write_aseg_stats(path, seed=0):
+    """Write a FreeSurfer aseg statistics file."""
+    rng = np.random.default_rng(seed)
+    names = [f"{side}-{roi}" for roi in ASEG_ROIS for side in ("Left", "Right")]
+    names += ["3rd-Ventricle", "4th-Ventricle", "Brain-Stem", "CSF"]
+    with open(path, "w") as f:
+        f.write("# Title Segmentation Statistics\n")
+        f.write("# ColHeaders Index SegId NVoxels Volume_mm3 StructName ...\n")
+        for i, name in enumerate(names):
+            volume = rng.uniform(500, 15000)
+            f.write(
+                f"{i + 1:3d} {i + 2:4d} {int(volume):6d} {volume:9.1f} {name:<28} "
+                "80.0 10.0 20.0 120.0 100.0\n"
+            )
+
+
+def write_freesurfer_stats(directory, seed=0):
+    """Write the lh, rh and aseg statistics of a subject.
+
+    Returns:
+        tuple: Paths of the lh, rh and aseg statistics files.
+    """
+    paths = tuple(
+        os.path.join(directory, name)
+        for name in ("lh.aparc.a2009s.stats", "rh.aparc.a2009s.stats", "aseg.stats")
+    )
+    write_aparc_stats(paths[0], seed)
+    write_aparc_stats(paths[1], seed + 1)
+    write_aseg_stats(paths[2], seed)
+    return paths
+
+
+def write_nifti(path, shape=(182, 218, 182), seed=0):
+    """Write a NIfTI volume with a bright ellipsoid on a zero background."""
+    import nibabel as nib
+
+    rng = np.random.default_rng(seed)
+    grid = np.stack(np.meshgrid(*[np.linspace(-1, 1, n) for n in shape], indexing="ij"))
+    inside = (grid**2).sum(axis=0) < 0.8
+    data = np.where(inside, rng.uniform(50, 150, size=shape), 0).astype(np.float32)
+    nib.save(nib.Nifti1Image(data, np.eye(4)), path)
+    return path
+
+
+def write_report_manifest(directory, n_rois=20, n_map18_figures=2, seed=0):
+    """Write the inputs of an Epinsight report: asymmetry index and figures.
+
+    Returns:
+        dict: Arguments of EpinsightReport.render.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    rng = np.random.default_rng(seed)
+    figures = []
+    for name in (
+        ["asymmetry"] + [f"map18_{i}" for i in range(n_map18_figures)] + ["brain"]
+    ):
+        figure, ax = plt.subplots(figsize=(8, 6))
+        ax.imshow(rng.random((256, 256)), cmap="gray")
+        path = os.path.join(directory, f"{name}.png")
+        figure.savefig(path, dpi=100)
+        plt.close(figure)
+        figures.append(path)
+
+    asymmetry_index = [
+        {"roi": roi, "asymmetry_index": float(value)}
+        for roi, value in zip(APARC_ROIS[:n_rois], rng.uniform(-30, 30, n_rois))
+    ]
+    with open(os.path.join(directory, "asymmetry_index.json"), "w") as f:
+        json.dump(asymmetry_index, f)
+    return {
+        "asymmetry_index": asymmetry_index,
+        "asymmetry_figure": figures[0],
+        "map18_figures": figures[1:-1],
+        "brain_screenshot": figures[-1],
+    }
@@ -0,0 +1,390 @@
+"""
+Local daemon running the onset commands in processes forked from a warm parent.
+
+The daemon imports the heavy libraries and preloads the normative matrices once, then
+forks a child per job, so each job starts with everything loaded. The client sends its
+standard streams over the Unix socket: the job reads and writes them directly, as if it
+was running in the client process.
+"""
+
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import stat
+import sys
+import tempfile
+import time
+import traceback
+
+DEFAULT_PRELOAD = (
+    "numpy",
+    "pandas",
+    "matplotlib.pyplot",
+    "seaborn",
+    "nibabel",
+    "weasyprint",
+)
+
+
+class DaemonUnavailableError(ConnectionError):
+    """Raised when no daemon listens on the socket."""
+
+
+def _fallback_directory():
+    """Directory of the default socket when XDG_RUNTIME_DIR is not set."""
+    return os.path.join(tempfile.gettempdir(), f"onset-{os.getuid()}")
+
+
+def default_socket_path():
+    """Path of the daemon socket, from ONSET_DAEMON_SOCKET or in a private directory.
+
+    The private directory is XDG_RUNTIME_DIR, or a directory of the user in the temporary
+    directory, created by the daemon with mode 0700.
+
+    Returns:
+        str: Path of the Unix socket.
+    """
+    if os.environ.get("ONSET_DAEMON_SOCKET"):
+        return os.environ["ONSET_DAEMON_SOCKET"]
+    directory = os.environ.get("XDG_RUNTIME_DIR") or _fallback_directory()
+    return os.path.join(directory, "onset.sock")
+
+
+def _make_private_directory(directory):
+    """Create a directory only accessible to the user, or check an existing one.
+
+    Raises:
+        RuntimeError: If the directory exists but is not a directory owned by the user,
+            or other users can access it.
+    """
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    status = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(status.st_mode)
+        or status.st_uid != os.getuid()
+        or status.st_mode & 0o077
+    ):
+        raise RuntimeError(
+            f"{directory} must be a directory owned by the user with mode 0700."
+        )
+
+
+def _send(sock, message, fds=()):
+    """Send a JSON message, and optionally file descriptors, on a Unix socket."""
+    data = json.dumps(message).encode() + b"\n"
+    sent = socket.send_fds(sock, [data], list(fds)) if fds else 0
+    sock.sendall(data[sent:])
+
+
+def _receive(sock, max_fds=0):
+    """Receive a JSON message, and the file descriptors sent with it.
+
+    Returns:
+        tuple: The message and the list of file descriptors.
+    """
+    if max_fds:
+        data, fds, _, _ = socket.recv_fds(sock, 65536, max_fds)
+    else:
+        data, fds = sock.recv(65536), []
+    buffer = bytearray(data)
+    while not buffer.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("Connection closed before the end of the message.")
+        buffer += chunk
+    return json.loads(buffer), fds
+
+
+def _connect(socket_path, timeout=None):
+    """Connect to the daemon.
+
+    Raises:
+        DaemonUnavailableError: If no daemon listens on the socket.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        # The standard streams of the client are sent to the daemon, which must not be
+        # a socket planted by another user
+        if os.lstat(socket_path).st_uid != os.getuid():
+            raise PermissionError(f"{socket_path} is owned by another user")
+        sock.connect(socket_path)
+    except OSError as e:
+        sock.close()
+        raise DaemonUnavailableError(f"No daemon on {socket_path}: {e}") from e
+    return sock
+
+
+def _standard_fds():
+    """Standard stream file descriptors of the client, /dev/null replacing closed ones."""
+    fds = []
+    for fd in (0, 1, 2):
+        try:
+            os.fstat(fd)
+            fds.append(fd)
+        except OSError:
+            fds.append(os.open(os.devnull, os.O_RDWR))
+    return fds
+
+
+def submit(command, argv, socket_path=None):
+    """Run a command in the daemon and wait for its completion.
+
+    Args:
+        command (str): Name of the command (see onsetpy.cli.main.COMMANDS).
+        argv (list): Arguments of the command.
+        socket_path (str, optional): Path of the daemon socket. Defaults to
+            default_socket_path().
+
+    Returns:
+        int: The exit code of the command.
+
+    Raises:
+        DaemonUnavailableError: If no daemon listens on the socket. The command was not run.
+        ConnectionError: If the daemon closed the connection before the end of the job.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    with _connect(socket_path or default_socket_path()) as sock:
+        request = {
+            "command": command,
+            "argv": list(argv),
+            "cwd": os.getcwd(),
+            "env": dict(os.environ),
+        }
+        _send(sock, request, _standard_fds())
+        response, _ = _receive(sock)
+    return response["exit_code"]
+
+
+def ping(socket_path=None, timeout=1):
+    """Check whether a daemon listens on the socket.
+
+    Returns:
+        int or None: The PID of the daemon, or None if no daemon answers.
+    """
+    try:
+        with _connect(socket_path or default_socket_path(), timeout) as sock:
+            _send(sock, {"command": "ping"})
+            response, _ = _receive(sock)
+    except OSError:
+        return None
+    return response["pid"]
+
+
+def stop(socket_path=None, timeout=5):
+    """Stop the daemon. Running jobs are not interrupted.
+
+    Returns:
+        bool: Whether a daemon was stopped.
+    """
+    try:
+        with _connect(socket_path or default_socket_path(), timeout) as sock:
+            _send(sock, {"command": "stop"})
+            _receive(sock)
+    except OSError:
+        return False
+    return True
+
+
+def start(
+    socket_path=None,
+    modules=DEFAULT_PRELOAD,
+    matrices=(),
+    log_file=None,
+    timeout=120,
+):
+    """Start a daemon in the background and wait until it accepts jobs.
+
+    Args:
+        socket_path (str, optional): Path of the daemon socket.
+        modules (list, optional): Modules imported before accepting jobs.
+        matrices (list, optional): Connectivity matrices kept in memory.
+        log_file (str, optional): File receiving the logs of the daemon. Defaults to None
+            (discarded).
+        timeout (float, optional): Maximum time to wait for the daemon, in seconds.
+
+    Returns:
+        int: The PID of the daemon.
+
+    Raises:
+        RuntimeError: If the daemon exited or did not answer before the timeout.
+    """
+    socket_path = socket_path or default_socket_path()
+    command = [
+        sys.executable,
+        "-m",
+        "onsetpy.cli.main",
+        "daemon",
+        "start",
+        "--foreground",
+        "--socket",
+        socket_path,
+        "--preload_module",
+        *modules,
+    ]
+    if matrices:
+        command += ["--preload_matrix", *[os.path.abspath(m) for m in matrices]]
+
+    # The daemon is detached in its own session and outlives this process
+    log = os.open(log_file or os.devnull, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    process_id = os.fork()
+    if process_id == 0:
+        try:
+            os.setsid()
+            os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+            os.dup2(log, 1)
+            os.dup2(log, 2)
+            os.execv(sys.executable, command)
+        finally:
+            os._exit(1)
+    os.close(log)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pid = ping(socket_path)
+        if pid is not None:
+            return pid
+        exited, status = os.waitpid(process_id, os.WNOHANG)
+        if exited:
+            raise RuntimeError(
+                f"The onset daemon exited with code {os.waitstatus_to_exitcode(status)}."
+            )
+        time.sleep(0.05)
+    os.kill(process_id, signal.SIGTERM)
+    raise RuntimeError(f"The onset daemon did not start within {timeout} seconds.")
+
+
+def preload(modules=DEFAULT_PRELOAD, matrices=()):
+    """Import the modules and the commands, and keep the matrices in memory.
+
+    Args:
+        modules (list, optional): Modules to import. Modules which cannot be imported are
+            skipped with a warning.
+        matrices (list, optional): Connectivity matrices to keep in memory.
+    """
+    from onsetpy.cli.main import COMMANDS
+    from onsetpy.io.matrix import preload_matrix
+
+    for name in list(modules) + list(COMMANDS.values()):
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logging.warning(f"Could not preload {name}: {e}")
+    for matrix in matrices:
+        preload_matrix(matrix)
+        logging.info(f"Preloaded {matrix}")
+
+
+def _run_job(connection, request, fds):
+    """Run a job in the forked child. Never returns."""
+    exit_code = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+        from onsetpy.cli.main import run_command
+
+        exit_code = run_command(request["command"], request["argv"])
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            _send(connection, {"exit_code": exit_code})
+        finally:
+            os._exit(0)
+
+
+def _handle(server, connection):
+    """Handle a connection to the daemon.
+
+    Returns:
+        bool: Whether the daemon keeps running.
+    """
+    request, fds = _receive(connection, max_fds=3)
+    if request["command"] == "ping":
+        _send(connection, {"pid": os.getpid()})
+        return True
+    if request["command"] == "stop":
+        _send(connection, {"stopped": True})
+        return False
+
+    from onsetpy.cli.main import resolve_command
+
+    if resolve_command(request["command"]) is None:
+        for fd in fds:
+            os.close(fd)
+        _send(connection, {"exit_code": 2})
+        return True
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if os.fork() == 0:
+        server.close()
+        _run_job(connection, request, fds)
+    logging.info(f"{request['command']} {' '.join(request['argv'])}")
+    for fd in fds:
+        os.close(fd)
+    return True
+
+
+def serve(socket_path=None, modules=DEFAULT_PRELOAD, matrices=()):
+    """Run the daemon until it is stopped.
+
+    Args:
+        socket_path (str, optional): Path of the daemon socket.
+        modules (list, optional): Modules imported before accepting jobs.
+        matrices (list, optional): Connectivity matrices kept in memory.
+
+    Raises:
+        RuntimeError: If a daemon already listens on the socket.
+    """
+    socket_path = socket_path or default_socket_path()
+    if os.path.dirname(socket_path) == _fallback_directory():
+        _make_private_directory(_fallback_directory())
+    if os.path.exists(socket_path):
+        if ping(socket_path) is not None:
+            raise RuntimeError(f"An onset daemon already listens on {socket_path}")
+        os.remove(socket_path)
+
+    preload(modules, matrices)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # The socket is created with mode 0600, other users never get a window to connect
+    umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(umask)
+    server.listen(128)
+    # The jobs are reaped automatically, the daemon does not wait for them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    logging.info(f"onset daemon {os.getpid()} listening on {socket_path}")
+
+    try:
+        running = True
+        while running:
+            connection, _ = server.accept()
+            with connection:
+                try:
+                    running = _handle(server, connection)
+                except Exception as e:
+                    logging.warning(f"Invalid request: {e}")
+    finally:
+        server.close()
+        os.remove(socket_path)
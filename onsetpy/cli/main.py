@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Run the onsetpy commands from a single entry point.
+
+    onset <command> [arguments]
+    onset daemon {start,stop,status} [options]
+
+When the ONSET_DAEMON_SOCKET environment variable is set, commands are sent to the onset
+daemon listening on this socket, which keeps the heavy libraries and the normative
+matrices loaded between invocations. If the daemon cannot be reached, the command runs
+in the current process.
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import sys
+
+COMMANDS = {
+    "compare_connectivity_groups": "onsetpy.scripts.onset_compare_connectivity_groups",
+    "compute_graph_metrics": "onsetpy.scripts.onset_compute_graph_metrics",
+    "convert_fs_stats": "onsetpy.scripts.onset_convert_fs_stats",
+    "create_epinsight_report": "onsetpy.scripts.onset_create_epinsight_report",
+    "create_surgeryflow_report": "onsetpy.scripts.onset_create_surgeryflow_report",
+    "epinsight_pipeline": "onsetpy.scripts.onset_epinsight_pipeline",
+    "epinsight_screenshots": "onsetpy.scripts.onset_epinsight_screenshots",
+    "evaluate_cortical_measures": "onsetpy.scripts.onset_evaluate_cortical_measures",
+    "extract_patients_from_pacs": "onsetpy.scripts.onset_extract_patients_from_pacs",
+    "fit_normative_model": "onsetpy.scripts.onset_fit_normative_model",
+    "json_to_npy": "onsetpy.scripts.onset_json_to_npy",
+    "mean_std_connectivity_matrix": "onsetpy.scripts.onset_mean_std_connectivity_matrix",
+    "pandas_to_graph": "onsetpy.scripts.pandas_to_graph",
+    "zscore_connectivity_matrix": "onsetpy.scripts.onset_zscore_connectivity_matrix",
+}
+
+
+def resolve_command(name):
+    """Find the name of a command, which can be given with its onset_ script prefix.
+
+    Args:
+        name (str): Name of the command (e.g. zscore_connectivity_matrix or
+            onset_zscore_connectivity_matrix).
+
+    Returns:
+        str or None: The name of the command, or None if it does not exist.
+    """
+    name = name[len("onset_") :] if name.startswith("onset_") else name
+    return name if name in COMMANDS else None
+
+
+def run_command(name, argv):
+    """Run a command in the current process.
+
+    Args:
+        name (str): Name of the command.
+        argv (list): Arguments of the command.
+
+    Returns:
+        int: The exit code of the command.
+    """
+    from onsetpy.instrumentation import stop_profiling
+
+    module = importlib.import_module(COMMANDS[name])
+    saved_argv = sys.argv
+    sys.argv = [f"onset {name}"] + list(argv)
+    try:
+        module.main()
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    finally:
+        # Writes the --profile trace of the command, the process may not exit after it
+        stop_profiling()
+        sys.argv = saved_argv
+    return 0
+
+
+def _build_daemon_parser():
+    """Build the argparser of the daemon command.
+
+    Returns:
+        parser (ArgumentParser): Parser built.
+    """
+    from onsetpy.cli.daemon import DEFAULT_PRELOAD, default_socket_path
+
+    parser = argparse.ArgumentParser(
+        prog="onset daemon",
+        description="Manage the onset daemon, which runs the commands in processes forked "
+        "from a warm parent.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("action", choices=["start", "stop", "status"])
+    parser.add_argument(
+        "--socket",
+        default=default_socket_path(),
+        help="Path of the Unix socket [%(default)s].",
+    )
+    parser.add_argument(
+        "--preload_matrix",
+        nargs="+",
+        default=[],
+        help="Connectivity matrices (.npy) kept in memory, e.g. the normative mean and "
+        "std matrices.",
+    )
+    parser.add_argument(
+        "--preload_module",
+        nargs="+",
+        default=list(DEFAULT_PRELOAD),
+        help="Modules imported before accepting jobs [%(default)s].",
+    )
+    parser.add_argument(
+        "--log_file",
+        help="File receiving the logs of a daemon started in the background.",
+    )
+    parser.add_argument(
+        "--foreground",
+        action="store_true",
+        help="Run the daemon in the current process instead of the background.",
+    )
+    return parser
+
+
+def daemon_main(argv):
+    """Run the daemon command.
+
+    Args:
+        argv (list): Arguments of the daemon command.
+
+    Returns:
+        int: The exit code.
+    """
+    from onsetpy.cli import daemon
+
+    parser = _build_daemon_parser()
+    args = parser.parse_args(argv)
+
+    if args.action == "status":
+        pid = daemon.ping(args.socket)
+        if pid is None:
+            print(f"No onset daemon listening on {args.socket}")
+            return 1
+        print(f"onset daemon {pid} listening on {args.socket}")
+        return 0
+    if args.action == "stop":
+        if not daemon.stop(args.socket):
+            print(f"No onset daemon listening on {args.socket}")
+            return 1
+        return 0
+
+    if args.foreground:
+        logging.basicConfig(level=logging.INFO)
+        daemon.serve(args.socket, args.preload_module, args.preload_matrix)
+        return 0
+    pid = daemon.start(
+        args.socket, args.preload_module, args.preload_matrix, args.log_file
+    )
+    print(f"onset daemon {pid} listening on {args.socket}")
+    print(f"export ONSET_DAEMON_SOCKET={args.socket}")
+    return 0
+
+
+def _print_usage(file=sys.stdout):
+    """Print the usage and the list of commands."""
+    print(__doc__.strip(), file=file)
+    print("\nCommands:", file=file)
+    for name in COMMANDS:
+        print(f"    {name}", file=file)
+    print("    daemon", file=file)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        _print_usage()
+        sys.exit(0)
+    if argv[0] == "--version":
+        from onsetpy.io.utils import __version__
+
+        print(__version__)
+        sys.exit(0)
+    if argv[0] == "daemon":
+        sys.exit(daemon_main(argv[1:]))
+
+    name = resolve_command(argv[0])
+    if name is None:
+        print(f"onset: unknown command '{argv[0]}'\n", file=sys.stderr)
+        _print_usage(sys.stderr)
+        sys.exit(2)
+
+    socket_path = os.environ.get("ONSET_DAEMON_SOCKET")
+    if socket_path:
+        from onsetpy.cli.daemon import DaemonUnavailableError, submit
+
+        try:
+            sys.exit(submit(name, argv[1:], socket_path))
+        except DaemonUnavailableError as e:
+            logging.warning(f"onset daemon unavailable ({e}), running locally.")
+    sys.exit(run_command(name, argv[1:]))
+
+
+if __name__ == "__main__":
+    main()
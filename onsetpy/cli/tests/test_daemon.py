@@ -0,0 +1,118 @@
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from onsetpy.cli import daemon
+
+
+class TestDaemon(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.socket_path = os.path.join(cls.temp_dir.name, "onset.sock")
+        cls.mean = os.path.join(cls.temp_dir.name, "mean.npy")
+        cls.std = os.path.join(cls.temp_dir.name, "std.npy")
+        np.save(cls.mean, np.ones((3, 3)))
+        np.save(cls.std, np.full((3, 3), 2.0))
+        cls.pid = daemon.start(
+            cls.socket_path, modules=["numpy"], matrices=[cls.mean, cls.std]
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        daemon.stop(cls.socket_path)
+        cls.temp_dir.cleanup()
+
+    def _run_client(self, *args):
+        environment = dict(os.environ, ONSET_DAEMON_SOCKET=self.socket_path)
+        return subprocess.run(
+            [sys.executable, "-m", "onsetpy.cli.main", *args],
+            capture_output=True,
+            text=True,
+            env=environment,
+            cwd=self.temp_dir.name,
+        )
+
+    def test_ping(self):
+        self.assertEqual(daemon.ping(self.socket_path), self.pid)
+        self.assertIsNone(daemon.ping(os.path.join(self.temp_dir.name, "missing.sock")))
+
+    def test_submit(self):
+        np.save(os.path.join(self.temp_dir.name, "base.npy"), np.full((3, 3), 5.0))
+        # Relative paths are resolved in the working directory of the client
+        result = self._run_client(
+            "zscore_connectivity_matrix",
+            "--mean",
+            self.mean,
+            "--std",
+            self.std,
+            "base.npy",
+            "--out_prefix",
+            "z",
+            "-v",
+            "-f",
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Number of base matrices processed: 1", result.stderr)
+        np.testing.assert_array_equal(
+            np.load(os.path.join(self.temp_dir.name, "z_1.npy")), np.full((3, 3), 2.0)
+        )
+
+    def test_submit_error(self):
+        result = self._run_client(
+            "zscore_connectivity_matrix",
+            "--mean",
+            "missing.npy",
+            "--std",
+            self.std,
+            "x",
+        )
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("missing.npy does not exist", result.stderr)
+        self.assertEqual(daemon.ping(self.socket_path), self.pid)
+
+    def test_status(self):
+        result = self._run_client("daemon", "status", "--socket", self.socket_path)
+        self.assertEqual(result.returncode, 0)
+        self.assertIn(str(self.pid), result.stdout)
+
+    def test_socket_mode(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+
+
+class TestSocketPath(unittest.TestCase):
+    def test_default_socket_path(self):
+        with patch.dict(os.environ, {"XDG_RUNTIME_DIR": "/run/user/1000"}):
+            os.environ.pop("ONSET_DAEMON_SOCKET", None)
+            self.assertEqual(daemon.default_socket_path(), "/run/user/1000/onset.sock")
+
+            del os.environ["XDG_RUNTIME_DIR"]
+            self.assertEqual(
+                daemon.default_socket_path(),
+                os.path.join(
+                    tempfile.gettempdir(), f"onset-{os.getuid()}", "onset.sock"
+                ),
+            )
+
+    def test_private_directory(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            directory = os.path.join(temp_dir, "onset")
+            daemon._make_private_directory(directory)
+            self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+            # An existing private directory is reused
+            daemon._make_private_directory(directory)
+
+            os.chmod(directory, 0o755)
+            with self.assertRaises(RuntimeError):
+                daemon._make_private_directory(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
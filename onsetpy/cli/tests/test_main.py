@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import numpy as np
+
+from onsetpy.cli.main import COMMANDS, main, resolve_command, run_command
+
+
+class TestOnsetCli(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.mean = os.path.join(self.temp_dir.name, "mean.npy")
+        self.std = os.path.join(self.temp_dir.name, "std.npy")
+        self.base = os.path.join(self.temp_dir.name, "base.npy")
+        np.save(self.mean, np.ones((3, 3)))
+        np.save(self.std, np.full((3, 3), 2.0))
+        np.save(self.base, np.full((3, 3), 5.0))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_commands_have_main(self):
+        self.assertEqual(len(COMMANDS), 14)
+        for module in COMMANDS.values():
+            self.assertTrue(hasattr(__import__(module, fromlist=["main"]), "main"))
+
+    def test_resolve_command(self):
+        self.assertEqual(resolve_command("json_to_npy"), "json_to_npy")
+        self.assertEqual(resolve_command("onset_json_to_npy"), "json_to_npy")
+        self.assertIsNone(resolve_command("unknown"))
+
+    def test_run_command(self):
+        prefix = os.path.join(self.temp_dir.name, "z")
+        exit_code = run_command(
+            "zscore_connectivity_matrix",
+            ["--mean", self.mean, "--std", self.std, self.base, "--out_prefix", prefix],
+        )
+        self.assertEqual(exit_code, 0)
+        np.testing.assert_array_equal(np.load(f"{prefix}_1.npy"), np.full((3, 3), 2.0))
+
+    def test_run_command_profile(self):
+        prefix = os.path.join(self.temp_dir.name, "z")
+        trace_path = os.path.join(self.temp_dir.name, "trace.json")
+        exit_code = run_command(
+            "zscore_connectivity_matrix",
+            [
+                "--mean",
+                self.mean,
+                "--std",
+                self.std,
+                self.base,
+                "--out_prefix",
+                prefix,
+                "--profile",
+                trace_path,
+            ],
+        )
+        self.assertEqual(exit_code, 0)
+
+        with open(trace_path) as f:
+            trace = json.load(f)
+        stages = [e["name"] for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(stages.count("load_matrix"), 3)
+        self.assertEqual(stages.count("calculate_z_scores"), 1)
+        self.assertEqual(stages.count("save_matrix"), 1)
+        self.assertEqual(
+            trace["otherData"]["counters"]["bytes_read"], 3 * os.path.getsize(self.base)
+        )
+
+    def test_run_command_error(self):
+        exit_code = run_command(
+            "zscore_connectivity_matrix",
+            ["--mean", "missing.npy", "--std", self.std, self.base],
+        )
+        self.assertEqual(exit_code, 2)
+
+    def test_main_unknown_command(self):
+        with self.assertRaises(SystemExit) as context:
+            main(["unknown"])
+        self.assertEqual(context.exception.code, 2)
+
+    def test_main_falls_back_without_daemon(self):
+        prefix = os.path.join(self.temp_dir.name, "z")
+        socket_path = os.path.join(self.temp_dir.name, "missing.sock")
+        with unittest.mock.patch.dict(os.environ, {"ONSET_DAEMON_SOCKET": socket_path}):
+            with self.assertRaises(SystemExit) as context:
+                main(
+                    [
+                        "onset_zscore_connectivity_matrix",
+                        "--mean",
+                        self.mean,
+                        "--std",
+                        self.std,
+                        self.base,
+                        "--out_prefix",
+                        prefix,
+                    ]
+                )
+        self.assertEqual(context.exception.code, 0)
+        self.assertTrue(os.path.exists(f"{prefix}_1.npy"))
+
+
+if __name__ == "__main__":
+    unittest.main()
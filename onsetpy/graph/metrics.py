@@ -0,0 +1,371 @@
+"""
+Graph-theory metrics computed over whole cohorts of connectivity matrices.
+
+Every metric takes a stacked (N, R, R) cohort of undirected weighted connectomes, or a
+single (R, R) matrix, and returns one value per subject and node (N, R) or per subject
+(N,). The diagonal is ignored and zero entries are not edges.
+
+The metrics are computed for all the subjects at once with batched matrix operations.
+The path-based metrics use the connection lengths 1 / w, so strong connections are
+short. Their all-pairs shortest paths are computed with a Floyd-Warshall algorithm
+vectorized over the subjects, and the most expensive ones (local efficiency and
+betweenness) can be spread over a process pool.
+
+Conventions follow the Brain Connectivity Toolbox (Rubinov & Sporns, 2010):
+
+    - clustering: weighted clustering coefficient of Onnela et al. (2005), on the
+      weights normalized by the largest weight of each subject,
+    - global_efficiency: mean inverse shortest path length between all pairs of nodes,
+    - local_efficiency: weighted local efficiency, on the normalized weights,
+    - betweenness: number of shortest paths between other nodes going through each node,
+      each pair of nodes being counted once.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from onsetpy.instrumentation import timed
+
+NODE_METRICS = ("degree", "strength", "clustering", "local_efficiency", "betweenness")
+SUBJECT_METRICS = ("global_efficiency",)
+METRICS = NODE_METRICS + SUBJECT_METRICS
+
+# Maximum number of float64 in the temporaries of the batched algorithms (128 MiB)
+_MAX_BATCH_ITEMS = 16 * 2**20
+# Relative tolerance used to compare the lengths of two paths
+_PATH_RTOL = 1e-10
+
+
+def _as_cohort(cohort: np.ndarray) -> np.ndarray:
+    """Validates a cohort and returns it as a (N, R, R) float array with a zero diagonal.
+
+    Raises:
+        ValueError: If the matrices are not square, or have negative or NaN weights.
+    """
+    cohort = np.array(cohort, dtype=float)
+    if cohort.ndim == 2:
+        cohort = cohort[np.newaxis]
+    if cohort.ndim != 3 or cohort.shape[1] != cohort.shape[2]:
+        raise ValueError(
+            f"Expected a (N, R, R) cohort or a (R, R) matrix, got shape {cohort.shape}."
+        )
+    if np.isnan(cohort).any():
+        raise ValueError("The connectivity matrices contain NaN weights.")
+    if (cohort < 0).any():
+        raise ValueError("The graph metrics are only defined for positive weights.")
+    diagonal = np.arange(cohort.shape[1])
+    cohort[:, diagonal, diagonal] = 0
+    return cohort
+
+
+def _normalize(cohort: np.ndarray) -> np.ndarray:
+    """Divides the weights of each subject by its largest weight."""
+    maxima = cohort.max(axis=(1, 2), keepdims=True)
+    return np.divide(cohort, maxima, out=np.zeros_like(cohort), where=maxima > 0)
+
+
+def _lengths(weights: np.ndarray) -> np.ndarray:
+    """Connection lengths 1 / w, infinite where there is no edge and 0 on the diagonal."""
+    with np.errstate(divide="ignore"):
+        lengths = np.where(weights > 0, 1 / weights, np.inf)
+    diagonal = np.arange(weights.shape[-1])
+    lengths[..., diagonal, diagonal] = 0
+    return lengths
+
+
+def _floyd_warshall(distances: np.ndarray) -> np.ndarray:
+    """All-pairs shortest paths of a batch of (R, R) length matrices, in place."""
+    for k in range(distances.shape[-1]):
+        np.minimum(
+            distances,
+            distances[..., :, k, np.newaxis] + distances[..., np.newaxis, k, :],
+            out=distances,
+        )
+    return distances
+
+
+def _map_subjects(function, cohort, processes):
+    """Applies a per-subject function to a cohort, in a process pool if requested."""
+    if processes == 1 or len(cohort) == 1:
+        return np.array([function(matrix) for matrix in cohort])
+    workers = processes or os.cpu_count()
+    chunksize = max(1, len(cohort) // (4 * workers))
+    with ProcessPoolExecutor(workers) as executor:
+        return np.array(list(executor.map(function, cohort, chunksize=chunksize)))
+
+
+# Each metric has a private version taking a cohort already validated by _as_cohort, so
+# that compute_metrics validates (and copies) the cohort once for all the metrics
+@timed("degree")
+def _degree(cohort: np.ndarray) -> np.ndarray:
+    return np.count_nonzero(cohort, axis=2)
+
+
+def degree(cohort: np.ndarray) -> np.ndarray:
+    """Number of edges of each node.
+
+    Args:
+        cohort (np.ndarray): (N, R, R) connectivity matrices.
+
+    Returns:
+        np.ndarray: (N, R) degrees.
+    """
+    return _degree(_as_cohort(cohort))
+
+
+@timed("strength")
+def _strength(cohort: np.ndarray) -> np.ndarray:
+    return cohort.sum(axis=2)
+
+
+def strength(cohort: np.ndarray) -> np.ndarray:
+    """Sum of the edge weights of each node.
+
+    Args:
+        cohort (np.ndarray): (N, R, R) connectivity matrices.
+
+    Returns:
+        np.ndarray: (N, R) strengths.
+    """
+    return _strength(_as_cohort(cohort))
+
+
+@timed("clustering")
+def _clustering(cohort: np.ndarray) -> np.ndarray:
+    cube_roots = np.cbrt(_normalize(cohort))
+    triangles = np.einsum("nij,nij->ni", cube_roots @ cube_roots, cube_roots)
+    k = np.count_nonzero(cohort, axis=2)
+    possible = k * (k - 1)
+    return np.divide(
+        triangles, possible, out=np.zeros_like(triangles), where=possible > 0
+    )
+
+
+def clustering(cohort: np.ndarray) -> np.ndarray:
+    """Weighted clustering coefficient of each node (Onnela et al., 2005).
+
+    The geometric mean of the normalized weights of the triangles around a node, divided
+    by the number of possible triangles. The weighted triangles of all the subjects are
+    counted with one batched matrix product.
+
+    Args:
+        cohort (np.ndarray): (N, R, R) connectivity matrices.
+
+    Returns:
+        np.ndarray: (N, R) clustering coefficients, 0 for nodes with less than 2 edges.
+    """
+    return _clustering(_as_cohort(cohort))
+
+
+@timed("shortest_path_lengths")
+def _shortest_path_lengths(cohort: np.ndarray) -> np.ndarray:
+    distances = _lengths(cohort)
+    n_subjects, n_nodes = cohort.shape[:2]
+    batch_size = max(1, _MAX_BATCH_ITEMS // n_nodes**2)
+    for start in range(0, n_subjects, batch_size):
+        _floyd_warshall(distances[start : start + batch_size])
+    return distances
+
+
+def shortest_path_lengths(cohort: np.ndarray) -> np.ndarray:
+    """Weighted shortest path length between all pairs of nodes, with lengths 1 / w.
+
+    Args:
+        cohort (np.ndarray): (N, R, R) connectivity matrices.
+
+    Returns:
+        np.ndarray: (N, R, R) distances, infinite between disconnected nodes.
+    """
+    return _shortest_path_lengths(_as_cohort(cohort))
+
+
+@timed("global_efficiency")
+def _global_efficiency(cohort: np.ndarray) -> np.ndarray:
+    distances = _shortest_path_lengths(cohort)
+    n_nodes = distances.shape[1]
+    if n_nodes < 2:
+        return np.zeros(len(distances))
+    with np.errstate(divide="ignore"):
+        inverse = 1 / distances
+    diagonal = np.arange(n_nodes)
+    inverse[:, diagonal, diagonal] = 0
+    return inverse.sum(axis=(1, 2)) / (n_nodes * (n_nodes - 1))
+
+
+def global_efficiency(cohort: np.ndarray) -> np.ndarray:
+    """Mean inverse shortest path length between all pairs of distinct nodes.
+
+    Args:
+        cohort (np.ndarray): (N, R, R) connectivity matrices.
+
+    Returns:
+        np.ndarray: (N,) global efficiencies.
+    """
+    return _global_efficiency(_as_cohort(cohort))
+
+
+def _local_efficiency_subject(weights: np.ndarray) -> np.ndarray:
+    """Weighted local efficiency of the nodes of one subject, on normalized weights."""
+    cube_roots = np.cbrt(weights)
+    efficiency = np.zeros(len(weights))
+    for node in range(len(weights)):
+        neighbors = np.flatnonzero(weights[node])
+        k = len(neighbors)
+        if k < 2:
+            continue
+        distances = _floyd_warshall(_lengths(weights[np.ix_(neighbors, neighbors)]))
+        with np.errstate(divide="ignore"):
+            inverse = 1 / distances
+        np.fill_diagonal(inverse, 0)
+        around = cube_roots[node, neighbors]
+        efficiency[node] = np.sum(np.outer(around, around) * np.cbrt(inverse)) / (
+            k * (k - 1)
+        )
+    return efficiency
+
+
+@timed("local_efficiency")
+def _local_efficiency(cohort: np.ndarray, processes: int = 1) -> np.ndarray:
+    return _map_subjects(_local_efficiency_subject, _normalize(cohort), processes)
+
+
+def local_efficiency(cohort: np.ndarray, processes: int = 1) -> np.ndarray:
+    """Weighted local efficiency of each node (Rubinov & Sporns, 2010).
+
+    The efficiency of the subgraph of the neighbours of a node once the node is removed,
+    each path being weighted by the normalized weights of its two ends to the node.
+
+    Args:
+        cohort (np.ndarray): (N, R, R) connectivity matrices.
+        processes (int, optional): Number of worker processes, None for one per CPU.
+            Defaults to 1 (computed in the current process).
+
+    Returns:
+        np.ndarray: (N, R) local efficiencies, 0 for nodes with less than 2 edges.
+    """
+    return _local_efficiency(_as_cohort(cohort), processes)
+
+
+def _betweenness_subject(weights: np.ndarray) -> np.ndarray:
+    """Betweenness of the nodes of one subject, with lengths 1 / w.
+
+    Brandes' algorithm, with the single-source shortest paths read from the all-pairs
+    distances and the path counting vectorized over a block of sources at a time.
+    """
+    n_nodes = len(weights)
+    lengths = _lengths(weights)
+    distances = _floyd_warshall(lengths.copy())
+    edges = np.isfinite(lengths)
+    np.fill_diagonal(edges, False)
+    # Nodes in order of distance from each source, the source first
+    order = np.argsort(distances, axis=1, kind="stable")
+
+    betweenness = np.zeros(n_nodes)
+    block = max(1, _MAX_BATCH_ITEMS // n_nodes**2)
+    for start in range(0, n_nodes, block):
+        sources = np.arange(start, min(start + block, n_nodes))
+        rows = np.arange(len(sources))
+        source_distances = distances[sources]
+        # predecessors[i, v, w]: v precedes w on a shortest path from sources[i]
+        with np.errstate(invalid="ignore"):
+            predecessors = np.isclose(
+                source_distances[:, :, np.newaxis] + lengths,
+                source_distances[:, np.newaxis, :],
+                rtol=_PATH_RTOL,
+                atol=0,
+            )
+        predecessors &= edges
+        predecessors &= np.isfinite(source_distances)[:, :, np.newaxis]
+
+        # Number of shortest paths from each source, nearest nodes first
+        paths = np.zeros((len(sources), n_nodes))
+        paths[rows, sources] = 1
+        for rank in range(1, n_nodes):
+            targets = order[sources, rank]
+            paths[rows, targets] = np.einsum(
+                "iv,iv->i", paths, predecessors[rows, :, targets]
+            )
+
+        # Dependencies of each source on the other nodes, farthest nodes first
+        dependencies = np.zeros((len(sources), n_nodes))
+        for rank in range(n_nodes - 1, 0, -1):
+            targets = order[sources, rank]
+            target_paths = paths[rows, targets]
+            coefficients = np.divide(
+                1 + dependencies[rows, targets],
+                target_paths,
+                out=np.zeros(len(sources)),
+                where=target_paths > 0,
+            )
+            dependencies += (
+                predecessors[rows, :, targets] * paths * coefficients[:, np.newaxis]
+            )
+        dependencies[rows, sources] = 0
+        betweenness += dependencies.sum(axis=0)
+
+    # Each undirected pair of nodes was counted from both ends
+    return betweenness / 2
+
+
+@timed("betweenness")
+def _betweenness(cohort: np.ndarray, processes: int = 1) -> np.ndarray:
+    return _map_subjects(_betweenness_subject, cohort, processes)
+
+
+def betweenness(cohort: np.ndarray, processes: int = 1) -> np.ndarray:
+    """Weighted betweenness centrality of each node, with lengths 1 / w.
+
+    The sum over all the pairs of other nodes of the fraction of their shortest paths
+    going through the node. The values are not normalized.
+
+    Args:
+        cohort (np.ndarray): (N, R, R) connectivity matrices.
+        processes (int, optional): Number of worker processes, None for one per CPU.
+            Defaults to 1 (computed in the current process).
+
+    Returns:
+        np.ndarray: (N, R) betweenness centralities.
+    """
+    return _betweenness(_as_cohort(cohort), processes)
+
+
+def compute_metrics(
+    cohort: np.ndarray,
+    metrics: Optional[Sequence[str]] = None,
+    processes: int = 1,
+) -> Dict[str, np.ndarray]:
+    """Computes several metrics over a cohort.
+
+    Args:
+        cohort (np.ndarray): (N, R, R) connectivity matrices.
+        metrics (Sequence[str], optional): Names of the metrics, from METRICS. Defaults
+            to all of them.
+        processes (int, optional): Number of worker processes used by local_efficiency
+            and betweenness. Defaults to 1.
+
+    Returns:
+        Dict[str, np.ndarray]: The values of each metric, (N, R) for the node metrics and
+        (N,) for global_efficiency.
+
+    Raises:
+        ValueError: If a metric is unknown.
+    """
+    metrics = METRICS if metrics is None else metrics
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}")
+
+    # Validated (and copied) once, rather than by each metric
+    cohort = _as_cohort(cohort)
+    functions = {
+        "degree": _degree,
+        "strength": _strength,
+        "clustering": _clustering,
+        "global_efficiency": _global_efficiency,
+        "local_efficiency": lambda c: _local_efficiency(c, processes),
+        "betweenness": lambda c: _betweenness(c, processes),
+    }
+    return {metric: functions[metric](cohort) for metric in metrics}
@@ -0,0 +1,461 @@
+"""
+Compressed sparse row (CSR) connectome graphs.
+
+High-resolution parcellations give connectomes with a few percent of non-zero edges, so
+storing them as dense matrices wastes most of the memory and makes every traversal visit
+all the n² entries. SparseGraph keeps only the edges, in CSR layout: the neighbours of node
+i are indices[indptr[i]:indptr[i + 1]] and the weights of these edges are the same slice
+of data.
+
+Undirected graphs store both directions of each edge, so the neighbours of a node are
+always a single contiguous slice. The diagonal (self-connections) is never stored.
+"""
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from onsetpy.instrumentation import BYTES_READ, BYTES_WRITTEN, count_file, stage
+
+GRAPH_FORMAT = "onsetpy.csr.1"
+
+
+def _index_dtype(n: int) -> np.dtype:
+    """Smallest index dtype able to address n entries."""
+    return np.dtype(np.int32) if n < np.iinfo(np.int32).max else np.dtype(np.int64)
+
+
+def _edge_list(keys: np.ndarray, n_nodes: int) -> list:
+    """First (source, target) pairs of edges given by their linear index, for messages."""
+    sources, targets = np.divmod(keys[:10], n_nodes)
+    return list(zip(sources.tolist(), targets.tolist()))
+
+
+class SparseGraph:
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        labels: Optional[Sequence[str]] = None,
+        directed: bool = False,
+    ):
+        """
+        Initializes a graph from its CSR arrays. Use the from_* constructors to build a
+        graph from a matrix or an edge list.
+
+        Args:
+            indptr (np.ndarray): Offsets of the rows, of length n_nodes + 1.
+            indices (np.ndarray): Target node of each edge, sorted within each row.
+            data (np.ndarray): Weight of each edge.
+            labels (Sequence[str], optional): Name of each node. Defaults to the node
+                indices.
+            directed (bool, optional): Whether the graph is directed. Undirected graphs
+                must store both directions of each edge. Defaults to False.
+
+        Raises:
+            ValueError: If the arrays are inconsistent.
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices)
+        self.data = np.asarray(data)
+        n_nodes = len(self.indptr) - 1
+        if labels is None:
+            labels = [str(i) for i in range(n_nodes)]
+        self.labels = np.asarray(labels, dtype=str)
+        self.directed = bool(directed)
+
+        if n_nodes < 0 or self.indptr[0] != 0 or np.any(np.diff(self.indptr) < 0):
+            raise ValueError("indptr must start at 0 and be non-decreasing.")
+        if len(self.indices) != self.indptr[-1] or len(self.data) != len(self.indices):
+            raise ValueError("indices and data must have indptr[-1] entries.")
+        if len(self.labels) != n_nodes:
+            raise ValueError(f"Expected {n_nodes} labels, got {len(self.labels)}.")
+        if len(self.indices) and (
+            self.indices.min() < 0 or self.indices.max() >= n_nodes
+        ):
+            raise ValueError("Edge indices out of range.")
+
+    @classmethod
+    def from_dense(
+        cls,
+        matrix: np.ndarray,
+        labels: Optional[Sequence[str]] = None,
+        directed: Optional[bool] = None,
+    ) -> "SparseGraph":
+        """Builds a graph from a dense connectivity matrix.
+
+        Args:
+            matrix (np.ndarray): Square connectivity matrix. Zero and NaN entries are not
+                edges.
+            labels (Sequence[str], optional): Name of each node.
+            directed (bool, optional): Whether the graph is directed. Defaults to None
+                (directed if the matrix is not symmetric). An undirected graph is built
+                from the upper triangle of the matrix.
+
+        Returns:
+            SparseGraph: The graph.
+        """
+        matrix = np.asarray(matrix)
+        if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+            raise ValueError(f"Expected a square matrix, got shape {matrix.shape}.")
+        if directed is None:
+            directed = not np.array_equal(matrix, matrix.T, equal_nan=True)
+
+        mask = (matrix != 0) & ~np.isnan(matrix)
+        np.fill_diagonal(mask, False)
+        if not directed:
+            mask = np.triu(mask)
+        rows, cols = np.nonzero(mask)
+        return cls.from_edges(
+            rows, cols, matrix[rows, cols], len(matrix), labels, directed
+        )
+
+    @classmethod
+    def from_edges(
+        cls,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+        n_nodes: Optional[int] = None,
+        labels: Optional[Sequence[str]] = None,
+        directed: bool = False,
+        sum_duplicates: bool = False,
+    ) -> "SparseGraph":
+        """Builds a graph from an edge list.
+
+        Self-connections are dropped. For an undirected graph, the edge (i, j) and the edge
+        (j, i) are the same edge: it may be listed in both directions, as in the long table
+        of a symmetric matrix, as long as both rows have the same weight.
+
+        Args:
+            sources (np.ndarray): Source node index of each edge.
+            targets (np.ndarray): Target node index of each edge.
+            weights (np.ndarray, optional): Weight of each edge. Defaults to 1.
+            n_nodes (int, optional): Number of nodes. Defaults to the number of labels, or
+                to the largest index + 1.
+            labels (Sequence[str], optional): Name of each node.
+            directed (bool, optional): Whether the graph is directed. Defaults to False.
+            sum_duplicates (bool, optional): Sum the weights of the edges listed several
+                times in the same direction. Defaults to False.
+
+        Returns:
+            SparseGraph: The graph.
+
+        Raises:
+            ValueError: If an edge is listed several times in the same direction without
+                sum_duplicates, or an undirected edge has different weights in its two
+                directions.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        weights = (
+            np.ones(len(sources)) if weights is None else np.asarray(weights).ravel()
+        )
+        if not len(sources) == len(targets) == len(weights):
+            raise ValueError("sources, targets and weights must have the same length.")
+        if n_nodes is None:
+            if labels is not None:
+                n_nodes = len(labels)
+            else:
+                n_nodes = int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1
+
+        keep = sources != targets
+        sources, targets, weights = sources[keep], targets[keep], weights[keep]
+
+        # Find the duplicates on the linear index of the edges, which also sorts them
+        keys, inverse, counts = np.unique(
+            sources * n_nodes + targets, return_inverse=True, return_counts=True
+        )
+        if not sum_duplicates and np.any(counts > 1):
+            raise ValueError(
+                f"Duplicate edges: {_edge_list(keys[counts > 1], n_nodes)}. "
+                "Use sum_duplicates to sum their weights."
+            )
+        weights = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(
+            np.result_type(weights.dtype, np.float32)
+        )
+        sources, targets = np.divmod(keys, n_nodes)
+
+        if not directed:
+            # Fold the edges given as (j, i) onto (i, j), keeping one copy of the mirrored
+            # pairs
+            lower = sources > targets
+            sources[lower], targets[lower] = targets[lower], sources[lower]
+            keys, inverse = np.unique(sources * n_nodes + targets, return_inverse=True)
+            folded = np.zeros((2, len(keys)), dtype=weights.dtype)
+            folded[lower.astype(int), inverse] = weights
+            present = np.zeros((2, len(keys)), dtype=bool)
+            present[lower.astype(int), inverse] = True
+            mirrored = present.all(axis=0)
+            asymmetric = mirrored & ~np.isclose(folded[0], folded[1])
+            if np.any(asymmetric):
+                raise ValueError(
+                    "Undirected edges with different weights in both directions: "
+                    f"{_edge_list(keys[asymmetric], n_nodes)}."
+                )
+            weights = np.where(present[0], folded[0], folded[1])
+            sources, targets = np.divmod(keys, n_nodes)
+
+        return cls._from_sorted_edges(
+            sources, targets, weights, n_nodes, labels, directed
+        )
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df,
+        source: str = "source",
+        target: str = "target",
+        weight: Optional[str] = "weight",
+        labels: Optional[Sequence[str]] = None,
+        directed: bool = False,
+        sum_duplicates: bool = False,
+    ) -> "SparseGraph":
+        """Builds a graph from a long-format edge table, one row per edge.
+
+        Args:
+            df (pandas.DataFrame): Edge table.
+            source (str, optional): Column of the source node labels. Defaults to "source".
+            target (str, optional): Column of the target node labels. Defaults to "target".
+            weight (str, optional): Column of the edge weights. Defaults to "weight". If
+                None, all the edges have a weight of 1.
+            labels (Sequence[str], optional): Labels of all the nodes, in order. Defaults to
+                the sorted labels found in the table. Nodes without edges must be listed
+                here to be part of the graph.
+            directed (bool, optional): Whether the graph is directed. Defaults to False.
+            sum_duplicates (bool, optional): Sum the weights of the edges listed in several
+                rows (see from_edges). Defaults to False.
+
+        Returns:
+            SparseGraph: The graph.
+
+        Raises:
+            ValueError: If the table references a node missing from labels, or its edges
+                are inconsistent (see from_edges).
+        """
+        sources = df[source].astype(str).to_numpy()
+        targets = df[target].astype(str).to_numpy()
+        if labels is None:
+            labels = np.unique(np.concatenate([sources, targets]))
+        labels = np.asarray(labels, dtype=str)
+
+        order = np.argsort(labels, kind="stable")
+        sorted_labels = labels[order]
+        indices = []
+        for names in (sources, targets):
+            position = np.searchsorted(sorted_labels, names)
+            position[position == len(labels)] = 0
+            unknown = sorted_labels[position] != names
+            if np.any(unknown):
+                raise ValueError(f"Unknown nodes: {sorted(set(names[unknown]))[:10]}")
+            indices.append(order[position])
+
+        weights = None if weight is None else df[weight].to_numpy()
+        return cls.from_edges(
+            indices[0],
+            indices[1],
+            weights,
+            len(labels),
+            labels,
+            directed,
+            sum_duplicates,
+        )
+
+    @classmethod
+    def _from_sorted_edges(cls, sources, targets, weights, n_nodes, labels, directed):
+        """Builds the CSR arrays from edges sorted by source, then target.
+
+        Undirected edges must be given once, with source < target: they are mirrored.
+        """
+        if not directed:
+            sources, targets = (
+                np.concatenate([sources, targets]),
+                np.concatenate([targets, sources]),
+            )
+            weights = np.concatenate([weights, weights])
+            order = np.lexsort((targets, sources))
+            sources, targets, weights = sources[order], targets[order], weights[order]
+
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n_nodes), out=indptr[1:])
+        indices = targets.astype(_index_dtype(n_nodes))
+        return cls(indptr, indices, weights, labels, directed)
+
+    @property
+    def n_nodes(self) -> int:
+        """Number of nodes."""
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self) -> int:
+        """Number of edges, each undirected edge being counted once."""
+        nnz = len(self.indices)
+        return nnz if self.directed else nnz // 2
+
+    @property
+    def density(self) -> float:
+        """Fraction of the possible edges present in the graph."""
+        n = self.n_nodes
+        possible = n * (n - 1) if self.directed else n * (n - 1) // 2
+        return self.n_edges / possible if possible else 0.0
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the CSR arrays, in bytes."""
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def sources(self) -> np.ndarray:
+        """Source node of each stored edge, i.e. the row indices of the CSR arrays."""
+        return np.repeat(
+            np.arange(self.n_nodes, dtype=self.indices.dtype), np.diff(self.indptr)
+        )
+
+    def edges(self):
+        """Edge list of the graph, each undirected edge being listed once with i < j.
+
+        Returns:
+            tuple: The source indices, target indices and weights of the edges.
+        """
+        sources = self.sources()
+        if self.directed:
+            return sources, self.indices, self.data
+        upper = sources < self.indices
+        return sources[upper], self.indices[upper], self.data[upper]
+
+    def neighbors(self, node: int):
+        """Neighbours of a node.
+
+        Args:
+            node (int): Index of the node.
+
+        Returns:
+            tuple: The indices of the neighbours and the weights of the edges.
+        """
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def degree(self) -> np.ndarray:
+        """Number of edges of each node (out-degree for directed graphs)."""
+        return np.diff(self.indptr)
+
+    def strength(self) -> np.ndarray:
+        """Sum of the edge weights of each node (out-strength for directed graphs)."""
+        return np.bincount(self.sources(), weights=self.data, minlength=self.n_nodes)
+
+    def threshold(
+        self,
+        weight: Optional[float] = None,
+        density: Optional[float] = None,
+        absolute: bool = False,
+    ) -> "SparseGraph":
+        """Keeps the strongest edges of the graph.
+
+        Args:
+            weight (float, optional): Minimum weight of the edges kept.
+            density (float, optional): Fraction of the possible edges kept, the strongest
+                first. Ties at the cut are broken arbitrarily.
+            absolute (bool, optional): Compare the absolute values of the weights, to keep
+                strong negative edges. Defaults to False.
+
+        Returns:
+            SparseGraph: The thresholded graph, sharing the labels of this graph.
+        """
+        sources, targets, weights = self.edges()
+        strengths = np.abs(weights) if absolute else weights
+        keep = np.ones(len(weights), dtype=bool)
+        if weight is not None:
+            keep &= strengths >= weight
+        if density is not None:
+            if not 0 <= density <= 1:
+                raise ValueError(f"density must be between 0 and 1, got {density}.")
+            n = self.n_nodes
+            possible = n * (n - 1) if self.directed else n * (n - 1) // 2
+            n_kept = int(round(density * possible))
+            candidates = np.flatnonzero(keep)
+            if n_kept < len(candidates):
+                strongest = np.argpartition(-strengths[candidates], n_kept)[:n_kept]
+                keep[:] = False
+                keep[candidates[strongest]] = True
+        return self._from_sorted_edges(
+            sources[keep].astype(np.int64),
+            targets[keep].astype(np.int64),
+            weights[keep],
+            self.n_nodes,
+            self.labels,
+            self.directed,
+        )
+
+    def to_dense(self) -> np.ndarray:
+        """Dense connectivity matrix of the graph.
+
+        Returns:
+            np.ndarray: The n_nodes x n_nodes matrix, with zeros where there is no edge.
+        """
+        matrix = np.zeros((self.n_nodes, self.n_nodes), dtype=self.data.dtype)
+        matrix[self.sources(), self.indices] = self.data
+        return matrix
+
+    def save(self, output_name: str) -> None:
+        """Saves the graph in the onsetpy binary graph format (.npz).
+
+        Args:
+            output_name (str): Output filename.
+        """
+        with stage("save_graph", path=str(output_name)):
+            with open(output_name, "wb") as f:
+                np.savez(
+                    f,
+                    format=np.array(GRAPH_FORMAT),
+                    indptr=self.indptr,
+                    indices=self.indices,
+                    data=self.data,
+                    labels=self.labels,
+                    directed=np.array(self.directed),
+                )
+            count_file(BYTES_WRITTEN, output_name)
+
+    def __repr__(self):
+        kind = "directed" if self.directed else "undirected"
+        return (
+            f"SparseGraph({self.n_nodes} nodes, {self.n_edges} {kind} edges, "
+            f"density {self.density:.2%})"
+        )
+
+
+def load_graph(input_name: str) -> SparseGraph:
+    """Loads a graph saved by SparseGraph.save.
+
+    Args:
+        input_name (str): Graph filename.
+
+    Returns:
+        SparseGraph: The graph.
+
+    Raises:
+        ValueError: If the file is not an onsetpy graph.
+    """
+    with stage("load_graph", path=str(input_name)):
+        count_file(BYTES_READ, input_name)
+        f = np.load(input_name, allow_pickle=False)
+        if not isinstance(f, np.lib.npyio.NpzFile):
+            raise ValueError(f"{input_name} is not an onsetpy graph file.")
+        with f:
+            if "format" not in f or str(f["format"]) != GRAPH_FORMAT:
+                raise ValueError(f"{input_name} is not an onsetpy graph file.")
+            return SparseGraph(
+                f["indptr"], f["indices"], f["data"], f["labels"], bool(f["directed"])
+            )
+
+
+def read_labels(input_name: str) -> List[str]:
+    """Reads node labels from a text file, one label per line.
+
+    Args:
+        input_name (str): Labels filename.
+
+    Returns:
+        List[str]: The labels, blank lines being ignored.
+    """
+    with open(input_name) as f:
+        return [line.strip() for line in f if line.strip()]
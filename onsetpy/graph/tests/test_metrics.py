@@ -0,0 +1,213 @@
+import heapq
+import itertools
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from onsetpy.graph import metrics
+from onsetpy.scripts import onset_compute_graph_metrics
+
+
+def _random_cohort(n_subjects, n_nodes, density, seed=0):
+    """Symmetric positive matrices with the given fraction of edges."""
+    rng = np.random.default_rng(seed)
+    cohort = rng.random((n_subjects, n_nodes, n_nodes))
+    cohort *= rng.random((n_subjects, n_nodes, n_nodes)) < density
+    cohort = np.triu(cohort, k=1)
+    return cohort + cohort.transpose(0, 2, 1)
+
+
+def _dijkstra(weights, source, nodes=None):
+    """Shortest path lengths (1 / w) from a source, within a subset of nodes."""
+    nodes = set(range(len(weights))) if nodes is None else set(nodes)
+    distances = {source: 0.0}
+    queue = [(0.0, source)]
+    done = set()
+    while queue:
+        distance, node = heapq.heappop(queue)
+        if node in done:
+            continue
+        done.add(node)
+        for neighbor in nodes:
+            if weights[node][neighbor] > 0 and neighbor != node:
+                candidate = distance + 1 / weights[node][neighbor]
+                if candidate < distances.get(neighbor, np.inf):
+                    distances[neighbor] = candidate
+                    heapq.heappush(queue, (candidate, neighbor))
+    return distances
+
+
+def _naive_clustering(weights):
+    normalized = weights / weights.max()
+    n = len(weights)
+    result = np.zeros(n)
+    for i in range(n):
+        neighbors = [j for j in range(n) if normalized[i, j] > 0]
+        k = len(neighbors)
+        if k < 2:
+            continue
+        total = 0.0
+        for j, h in itertools.permutations(neighbors, 2):
+            total += (normalized[i, j] * normalized[i, h] * normalized[j, h]) ** (1 / 3)
+        result[i] = total / (k * (k - 1))
+    return result
+
+
+def _naive_global_efficiency(weights):
+    n = len(weights)
+    total = 0.0
+    for source in range(n):
+        for target, distance in _dijkstra(weights, source).items():
+            if target != source:
+                total += 1 / distance
+    return total / (n * (n - 1))
+
+
+def _naive_local_efficiency(weights):
+    normalized = weights / weights.max()
+    n = len(weights)
+    result = np.zeros(n)
+    for i in range(n):
+        neighbors = [j for j in range(n) if normalized[i, j] > 0]
+        k = len(neighbors)
+        if k < 2:
+            continue
+        total = 0.0
+        for j in neighbors:
+            distances = _dijkstra(normalized, j, neighbors)
+            for h in neighbors:
+                if h != j and h in distances:
+                    total += (normalized[i, j] * normalized[i, h] / distances[h]) ** (
+                        1 / 3
+                    )
+        result[i] = total / (k * (k - 1))
+    return result
+
+
+def _naive_betweenness(weights, rtol=1e-10):
+    """Sum over the pairs (s, t) of the fraction of their shortest paths through v."""
+    n = len(weights)
+    distances = [_dijkstra(weights, source) for source in range(n)]
+
+    def _count_paths(source, target):
+        # Number of shortest paths, by recursion on the last edge
+        if source == target:
+            return 1
+        count = 0
+        for v in range(n):
+            if v != target and weights[v][target] > 0 and v in distances[source]:
+                if np.isclose(
+                    distances[source][v] + 1 / weights[v][target],
+                    distances[source][target],
+                    rtol=rtol,
+                    atol=0,
+                ):
+                    count += _count_paths(source, v)
+        return count
+
+    result = np.zeros(n)
+    for s, t in itertools.combinations(range(n), 2):
+        if t not in distances[s]:
+            continue
+        total = _count_paths(s, t)
+        for v in range(n):
+            if v in (s, t) or v not in distances[s] or t not in distances[v]:
+                continue
+            if np.isclose(
+                distances[s][v] + distances[v][t], distances[s][t], rtol=rtol, atol=0
+            ):
+                result[v] += _count_paths(s, v) * _count_paths(v, t) / total
+    return result
+
+
+class TestGraphMetrics(unittest.TestCase):
+    def setUp(self):
+        self.cohort = _random_cohort(4, 12, 0.4)
+
+    def test_degree_strength(self):
+        for matrix, degree, strength in zip(
+            self.cohort, metrics.degree(self.cohort), metrics.strength(self.cohort)
+        ):
+            np.testing.assert_array_equal(degree, (matrix > 0).sum(axis=1))
+            np.testing.assert_allclose(strength, matrix.sum(axis=1))
+
+    def test_clustering(self):
+        expected = [_naive_clustering(matrix) for matrix in self.cohort]
+        np.testing.assert_allclose(metrics.clustering(self.cohort), expected)
+
+    def test_global_efficiency(self):
+        expected = [_naive_global_efficiency(matrix) for matrix in self.cohort]
+        np.testing.assert_allclose(metrics.global_efficiency(self.cohort), expected)
+
+    def test_local_efficiency(self):
+        expected = [_naive_local_efficiency(matrix) for matrix in self.cohort]
+        np.testing.assert_allclose(metrics.local_efficiency(self.cohort), expected)
+
+    def test_betweenness(self):
+        expected = [_naive_betweenness(matrix) for matrix in self.cohort]
+        np.testing.assert_allclose(metrics.betweenness(self.cohort), expected)
+
+    def test_betweenness_ties(self):
+        # A square 0-1-3-2 with a tail 3-4: the opposite corners have two shortest paths
+        matrix = np.zeros((5, 5))
+        for i, j in [(0, 1), (0, 2), (1, 3), (2, 3), (3, 4)]:
+            matrix[i, j] = matrix[j, i] = 1
+        np.testing.assert_allclose(
+            metrics.betweenness(matrix)[0], _naive_betweenness(matrix)
+        )
+        np.testing.assert_allclose(metrics.betweenness(matrix)[0], [0.5, 1, 1, 3.5, 0])
+
+    def test_disconnected(self):
+        matrix = np.zeros((4, 4))
+        matrix[0, 1] = matrix[1, 0] = 2
+        matrix[2, 3] = matrix[3, 2] = 1
+        np.testing.assert_allclose(
+            metrics.global_efficiency(matrix), [_naive_global_efficiency(matrix)]
+        )
+        np.testing.assert_array_equal(metrics.betweenness(matrix), np.zeros((1, 4)))
+        np.testing.assert_array_equal(metrics.clustering(matrix), np.zeros((1, 4)))
+
+    def test_process_pool(self):
+        np.testing.assert_allclose(
+            metrics.betweenness(self.cohort, processes=2),
+            metrics.betweenness(self.cohort),
+        )
+        np.testing.assert_allclose(
+            metrics.local_efficiency(self.cohort, processes=2),
+            metrics.local_efficiency(self.cohort),
+        )
+
+    def test_compute_metrics(self):
+        results = metrics.compute_metrics(self.cohort)
+        self.assertEqual(set(results), set(metrics.METRICS))
+        for name in metrics.NODE_METRICS:
+            self.assertEqual(results[name].shape, (4, 12))
+        self.assertEqual(results["global_efficiency"].shape, (4,))
+
+        with self.assertRaises(ValueError):
+            metrics.compute_metrics(self.cohort, ["diameter"])
+
+    def test_compute_metrics_validates_once(self):
+        with mock.patch.object(
+            metrics, "_as_cohort", wraps=metrics._as_cohort
+        ) as as_cohort:
+            results = metrics.compute_metrics(self.cohort)
+        as_cohort.assert_called_once()
+        for name in metrics.METRICS:
+            np.testing.assert_array_equal(
+                results[name], getattr(metrics, name)(self.cohort)
+            )
+
+    def test_script_metrics(self):
+        self.assertEqual(set(onset_compute_graph_metrics.METRICS), set(metrics.METRICS))
+
+    def test_invalid_weights(self):
+        with self.assertRaises(ValueError):
+            metrics.degree(-self.cohort)
+        with self.assertRaises(ValueError):
+            metrics.degree(np.zeros((2, 3, 4)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from onsetpy.graph.sparse import SparseGraph, load_graph
+
+
+def _random_connectome(n, density, seed=0):
+    """Symmetric matrix with the given fraction of non-zero edges."""
+    rng = np.random.default_rng(seed)
+    matrix = np.triu(rng.random((n, n)) * (rng.random((n, n)) < density), k=1)
+    return matrix + matrix.T
+
+
+class TestSparseGraph(unittest.TestCase):
+    def test_from_dense_round_trip(self):
+        matrix = _random_connectome(50, 0.05)
+        graph = SparseGraph.from_dense(matrix)
+
+        self.assertFalse(graph.directed)
+        self.assertEqual(graph.n_edges, np.count_nonzero(np.triu(matrix)))
+        np.testing.assert_array_equal(graph.to_dense(), matrix)
+        np.testing.assert_array_equal(graph.degree(), np.count_nonzero(matrix, axis=1))
+        np.testing.assert_allclose(graph.strength(), matrix.sum(axis=1))
+        self.assertLess(graph.nbytes, matrix.nbytes)
+
+    def test_from_dense_directed(self):
+        matrix = np.array([[5.0, 1, 0], [0, 0, 2], [3, 0, 0]])
+        graph = SparseGraph.from_dense(matrix, labels=["a", "b", "c"])
+
+        self.assertTrue(graph.directed)
+        self.assertEqual(graph.n_edges, 3)
+        neighbors, weights = graph.neighbors(0)
+        np.testing.assert_array_equal(neighbors, [1])
+        np.testing.assert_array_equal(weights, [1])
+        # The diagonal is dropped
+        np.testing.assert_array_equal(graph.to_dense(), matrix - np.diag([5.0, 0, 0]))
+
+    def test_from_edges_sums_duplicates(self):
+        sources, targets, weights = [0, 0, 1, 2, 2], [1, 1, 0, 2, 3], [1, 2, 3, 9, 4.0]
+        with self.assertRaises(ValueError):
+            SparseGraph.from_edges(sources, targets, weights)
+        graph = SparseGraph.from_edges(
+            sources, targets, weights, directed=True, sum_duplicates=True
+        )
+
+        self.assertEqual(graph.n_nodes, 4)
+        self.assertEqual(graph.n_edges, 3)
+        dense = graph.to_dense()
+        self.assertEqual(dense[0, 1], 3)
+        self.assertEqual(dense[1, 0], 3)
+        self.assertEqual(dense[2, 2], 0)
+
+    def test_from_edges_mirrored(self):
+        with self.assertRaises(ValueError):
+            SparseGraph.from_edges([0, 1], [1, 0], [1.0, 2.0])
+
+        graph = SparseGraph.from_edges([0, 1, 2], [1, 0, 1], [2.0, 2.0, 5.0])
+        self.assertEqual(graph.n_edges, 2)
+        np.testing.assert_array_equal(
+            graph.to_dense(), [[0, 2, 0], [2, 0, 5], [0, 5, 0]]
+        )
+
+    def test_from_symmetric_long_table(self):
+        matrix = _random_connectome(20, 0.2)
+        sources, targets = np.nonzero(matrix)
+        labels = [f"roi_{i:02d}" for i in range(len(matrix))]
+        df = pd.DataFrame(
+            {
+                "source": np.asarray(labels)[sources],
+                "target": np.asarray(labels)[targets],
+                "weight": matrix[sources, targets],
+            }
+        )
+        graph = SparseGraph.from_dataframe(df, labels=labels)
+
+        # Every edge is listed in both directions, its weight must not double
+        self.assertEqual(graph.n_edges, len(df) // 2)
+        np.testing.assert_array_equal(graph.to_dense(), matrix)
+
+    def test_from_dataframe(self):
+        df = pd.DataFrame(
+            {
+                "source": ["ctx-lh-insula", "ctx-rh-insula"],
+                "target": ["ctx-rh-insula", "Left-Thalamus"],
+                "weight": [0.5, 2.0],
+            }
+        )
+        graph = SparseGraph.from_dataframe(df)
+        self.assertEqual(
+            list(graph.labels), ["Left-Thalamus", "ctx-lh-insula", "ctx-rh-insula"]
+        )
+        self.assertEqual(graph.to_dense()[1, 2], 0.5)
+
+        labels = ["ctx-lh-insula", "ctx-rh-insula", "Left-Thalamus", "isolated"]
+        graph = SparseGraph.from_dataframe(df, labels=labels, directed=True)
+        self.assertEqual(graph.n_nodes, 4)
+        self.assertEqual(graph.to_dense()[1, 2], 2.0)
+        self.assertEqual(graph.to_dense()[2, 1], 0)
+
+        with self.assertRaises(ValueError):
+            SparseGraph.from_dataframe(df, labels=["ctx-lh-insula"])
+
+    def test_threshold(self):
+        matrix = np.array(
+            [
+                [0, 1.0, -5.0, 3.0],
+                [1.0, 0, 2.0, 0],
+                [-5.0, 2.0, 0, 4.0],
+                [3.0, 0, 4.0, 0],
+            ]
+        )
+        graph = SparseGraph.from_dense(matrix)
+
+        by_weight = graph.threshold(weight=2.5)
+        self.assertEqual(by_weight.n_edges, 2)
+        self.assertEqual(by_weight.to_dense()[2, 3], 4.0)
+
+        by_density = graph.threshold(density=2 / 6, absolute=True)
+        np.testing.assert_array_equal(
+            np.argwhere(np.triu(by_density.to_dense())), [[0, 2], [2, 3]]
+        )
+        self.assertAlmostEqual(by_density.density, 2 / 6)
+
+    def test_save_load(self):
+        graph = SparseGraph.from_dense(
+            _random_connectome(30, 0.1), labels=[f"roi{i}" for i in range(30)]
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, "graph.npz")
+            graph.save(filename)
+            loaded = load_graph(filename)
+
+            np.save(os.path.join(temp_dir, "other.npz"), np.zeros(3))
+            with self.assertRaises(ValueError):
+                load_graph(os.path.join(temp_dir, "other.npz.npy"))
+
+        np.testing.assert_array_equal(loaded.indptr, graph.indptr)
+        np.testing.assert_array_equal(loaded.indices, graph.indices)
+        np.testing.assert_array_equal(loaded.data, graph.data)
+        np.testing.assert_array_equal(loaded.labels, graph.labels)
+        self.assertEqual(loaded.directed, graph.directed)
+
+
+if __name__ == "__main__":
+    unittest.main()
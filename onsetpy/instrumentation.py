@@ -0,0 +1,364 @@
+"""
+Stage timers, memory sampling and I/O counters for the onset commands.
+
+The instrumentation is inactive until a profiler is started, usually by the --profile
+option of the scripts (see onsetpy.io.utils.add_profile_arg). While inactive, stage and
+count return immediately, so the library functions can be instrumented unconditionally.
+
+The profiler writes a Chrome trace-event file (chrome://tracing, Perfetto):
+
+    - one complete event ("ph": "X") per stage, with the counters incremented by its thread
+      while it ran (e.g. the bytes read and written) and the peak resident memory of the
+      process at the end of the stage in its arguments,
+    - counter events ("ph": "C") for the resident memory, sampled periodically, and for
+      the cumulative I/O counters,
+    - a summary of the run in "otherData" (command, wall time, peak memory, counter totals
+      and total time per stage), which can be aggregated across runs without replaying the
+      events.
+"""
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BYTES_READ = "bytes_read"
+BYTES_WRITTEN = "bytes_written"
+
+# Profiler receiving the events, None when the instrumentation is inactive
+_PROFILER = None
+
+
+def _now_us():
+    """Monotonic time, in microseconds."""
+    return time.perf_counter_ns() // 1000
+
+
+def current_rss():
+    """Resident memory of the process.
+
+    Returns:
+        int or None: The resident memory in bytes, or None where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    """Peak resident memory of the process since it started.
+
+    Returns:
+        int or None: The peak resident memory in bytes, or None if it is unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Profiler:
+    def __init__(self, filename=None, name=None, sample_interval=0.05):
+        """
+        Initializes a profiler collecting trace events.
+
+        Args:
+            filename (str, optional): File where the trace is written when the profiler is
+                stopped by stop_profiling. Defaults to None (the trace is not written).
+            name (str, optional): Name of the profiled process, shown in the trace viewers.
+                Defaults to the name of the running script.
+            sample_interval (float, optional): Interval between two samples of the resident
+                memory, in seconds. Use 0 to disable the sampling. Defaults to 0.05.
+
+        Attributes:
+            filename (str or None): File where the trace is written.
+            name (str): Name of the profiled process.
+            events (list): Trace events, in Chrome trace-event format.
+            counters (dict): Totals of the counters, indexed by name.
+            stage_totals (dict): Total time spent in each stage, in seconds.
+        """
+        self.filename = filename
+        self.name = name or os.path.basename(sys.argv[0]) or "python"
+        self.sample_interval = sample_interval
+        self.events = []
+        self.counters = {}
+        self.stage_totals = {}
+        self._pid = os.getpid()
+        self._start = _now_us()
+        self._start_time = time.time()
+        self._peak_rss = current_rss() or 0
+        self._lock = threading.Lock()
+        # Counters of the stages open in each thread, innermost last
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        """Starts the memory sampler thread."""
+        if self.sample_interval > 0 and self._sampler is None:
+            self._sampler = threading.Thread(
+                target=self._sample, name="onset-memory-sampler", daemon=True
+            )
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        """Stops the memory sampler thread and takes a last sample."""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        self.sample_memory()
+
+    def _sample(self):
+        """Samples the resident memory until the profiler is stopped."""
+        while not self._stop.wait(self.sample_interval):
+            self.sample_memory()
+
+    def _event(self, event):
+        """Adds an event, filling the process and thread identifiers."""
+        event.setdefault("pid", self._pid)
+        event.setdefault("tid", threading.get_ident())
+        with self._lock:
+            self.events.append(event)
+
+    def sample_memory(self):
+        """Records the resident memory as a counter event."""
+        rss = current_rss()
+        if rss is None:
+            return
+        self._peak_rss = max(self._peak_rss, rss)
+        self._event(
+            {
+                "name": "memory",
+                "ph": "C",
+                "ts": _now_us() - self._start,
+                "args": {"rss_mb": round(rss / 2**20, 3)},
+            }
+        )
+
+    def _open_stages(self):
+        """Counters of the stages open in the calling thread, innermost last."""
+        stages = getattr(self._local, "stages", None)
+        if stages is None:
+            stages = self._local.stages = []
+        return stages
+
+    def count(self, name, value=1):
+        """Increments a counter and records its new total.
+
+        The increment is also attributed to the stages open in the calling thread.
+
+        Args:
+            name (str): Name of the counter (e.g. BYTES_READ).
+            value (int, optional): Increment. Defaults to 1.
+        """
+        for counters in self._open_stages():
+            counters[name] = counters.get(name, 0) + value
+        with self._lock:
+            total = self.counters[name] = self.counters.get(name, 0) + value
+        self._event(
+            {
+                "name": name,
+                "ph": "C",
+                "ts": _now_us() - self._start,
+                "args": {name: total},
+            }
+        )
+
+    @contextlib.contextmanager
+    def stage(self, name, **args):
+        """Times a stage of the run.
+
+        The counters incremented while the stage runs are attributed to the stage,
+        including those of its nested stages. Only the increments of the thread which
+        opened the stage count, so the stages of concurrent threads (e.g. the workers of a
+        thread pool) each get their own I/O.
+
+        Args:
+            name (str): Name of the stage.
+            **args: Details of the stage (e.g. the path of the file loaded), stored in the
+                arguments of the event. They must be JSON serializable.
+        """
+        counters = {}
+        stages = self._open_stages()
+        stages.append(counters)
+        start = _now_us()
+        try:
+            yield
+        finally:
+            end = _now_us()
+            stages.pop()
+            args.update((name, value) for name, value in counters.items() if value)
+            peak = peak_rss()
+            if peak is not None:
+                args["peak_rss_mb"] = round(peak / 2**20, 3)
+            with self._lock:
+                self.stage_totals[name] = (
+                    self.stage_totals.get(name, 0) + (end - start) / 1e6
+                )
+            self._event(
+                {
+                    "name": name,
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": start - self._start,
+                    "dur": end - start,
+                    "args": args,
+                }
+            )
+
+    def summary(self):
+        """Summary of the run, for aggregation across runs.
+
+        Returns:
+            dict: The command, start time, wall time, peak memory, counter totals and total
+                  time per stage.
+        """
+        peak = peak_rss()
+        return {
+            "command": self.name,
+            "argv": sys.argv[1:],
+            "started_at": self._start_time,
+            "wall_time_s": (_now_us() - self._start) / 1e6,
+            "peak_rss_mb": round(max(peak or 0, self._peak_rss) / 2**20, 3),
+            "counters": dict(self.counters),
+            "stages_s": dict(self.stage_totals),
+        }
+
+    def to_trace(self):
+        """Builds the Chrome trace-event document.
+
+        Returns:
+            dict: The trace, with the events and the summary of the run.
+        """
+        metadata = {
+            "name": "process_name",
+            "ph": "M",
+            "pid": self._pid,
+            "tid": 0,
+            "args": {"name": self.name},
+        }
+        with self._lock:
+            events = [metadata] + list(self.events)
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": self.summary(),
+        }
+
+    def write(self, filename):
+        """Writes the trace in Chrome trace-event format.
+
+        Args:
+            filename (str): Output JSON file.
+        """
+        with open(filename, "w") as f:
+            json.dump(self.to_trace(), f)
+
+
+def get_profiler():
+    """Returns the active profiler, or None if the instrumentation is inactive."""
+    return _PROFILER
+
+
+def start_profiling(filename=None, **kwargs):
+    """Activates the instrumentation.
+
+    Args:
+        filename (str, optional): File where the trace is written when the process exits
+            or when stop_profiling is called. Defaults to None (the trace is not written).
+        **kwargs: Arguments passed to Profiler.
+
+    Returns:
+        Profiler: The active profiler.
+    """
+    global _PROFILER
+    stop_profiling()
+    _PROFILER = Profiler(filename, **kwargs).start()
+    # The forked jobs of the onset daemon exit without running the atexit handlers, their
+    # trace is written by onsetpy.cli.main.run_command
+    atexit.register(stop_profiling)
+    return _PROFILER
+
+
+def stop_profiling():
+    """Deactivates the instrumentation and writes the trace, if a file was requested.
+
+    Returns:
+        Profiler or None: The profiler which was active.
+    """
+    global _PROFILER
+    profiler, _PROFILER = _PROFILER, None
+    if profiler is not None:
+        atexit.unregister(stop_profiling)
+        profiler.stop()
+        if profiler.filename:
+            profiler.write(profiler.filename)
+    return profiler
+
+
+def stage(name, **args):
+    """Times a stage in the active profiler. See Profiler.stage.
+
+    Usage:
+        with stage("load_matrix", path=filename):
+            ...
+    """
+    if _PROFILER is None:
+        return contextlib.nullcontext()
+    return _PROFILER.stage(name, **args)
+
+
+def timed(name=None):
+    """Decorator timing each call of a function as a stage.
+
+    Args:
+        name (str, optional): Name of the stage. Defaults to the name of the function.
+    """
+
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _PROFILER is None:
+                return function(*args, **kwargs)
+            with _PROFILER.stage(stage_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, value=1):
+    """Increments a counter in the active profiler. See Profiler.count."""
+    if _PROFILER is not None:
+        _PROFILER.count(name, value)
+
+
+def count_file(counter, filename):
+    """Adds the size of a file to a byte counter of the active profiler.
+
+    Args:
+        counter (str): BYTES_READ or BYTES_WRITTEN.
+        filename (str): Path of the file read or written.
+    """
+    if _PROFILER is not None:
+        try:
+            _PROFILER.count(counter, os.path.getsize(filename))
+        except OSError:
+            pass
@@ -0,0 +1,327 @@
+"""
+Content-addressed cache of the outputs of the scripts.
+
+A script run is identified by a key hashing together the command, the version of onsetpy,
+the arguments and the contents of the input files. Output paths only contribute their
+extension (which can select the output format), so the same inputs processed into
+another directory are still a hit. On a hit, the outputs of the previous run are restored
+(by hardlink, or copy across filesystems) and the script skips its work.
+
+Each entry is a directory of the cache holding the outputs and a manifest. Entries are
+written to a temporary directory and renamed, so concurrent runs never see a partial
+entry. The cache is bounded in size: the least recently used entries (by the mtime of
+their manifest, refreshed on every hit) are evicted once the total size goes over the
+limit.
+
+Restored outputs share their inode with the cache when hardlinked, so the manifest also
+records the size and mtime of each cached file: an output modified in place afterwards
+invalidates the entry instead of being restored.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from typing import Dict, List, Optional, Sequence
+
+from onsetpy.instrumentation import count, stage
+
+DEFAULT_MAX_SIZE_MB = 10240
+MANIFEST = "manifest.json"
+# Options which never change the outputs of a script
+_IGNORED_ARGS = {
+    "overwrite",
+    "verbose",
+    "profile",
+    "cache",
+    "cache_max_size",
+    "cache_fast",
+    "workers",
+}
+_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(filename: str, fast: bool = False) -> str:
+    """Hash of a file.
+
+    Args:
+        filename (str): Filename.
+        fast (bool, optional): Hash the path, size and mtime of the file instead of its
+            contents. Defaults to False.
+
+    Returns:
+        str: Hexadecimal digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if fast:
+        stat = os.stat(filename)
+        digest.update(
+            f"{os.path.realpath(filename)}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        )
+    else:
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(
+        self,
+        directory: str,
+        max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+        fast: bool = False,
+    ):
+        """
+        Initializes a cache in a directory, created if needed.
+
+        Args:
+            directory (str): Cache directory.
+            max_size_mb (float, optional): Maximum total size of the cached outputs, in
+                MB. Defaults to DEFAULT_MAX_SIZE_MB.
+            fast (bool, optional): Identify the input files by path, size and mtime
+                instead of hashing their contents. Defaults to False.
+        """
+        self.directory = directory
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.fast = fast
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(
+        self,
+        command: str,
+        args: Dict[str, object],
+        inputs: Sequence[str],
+        outputs: Sequence[str],
+    ) -> str:
+        """Key of a script run.
+
+        Args:
+            command (str): Name of the command.
+            args (Dict[str, object]): Arguments of the command.
+            inputs (Sequence[str]): Input files, identified by their contents (missing
+                files by their absence).
+            outputs (Sequence[str]): Output files, identified by their extension.
+
+        Returns:
+            str: Hexadecimal key.
+        """
+        from onsetpy.io import utils
+
+        with stage("cache_key"):
+            hashes = {
+                path: hash_file(path, self.fast) if os.path.isfile(path) else None
+                for path in inputs
+            }
+            extensions = {path: os.path.splitext(path)[1] for path in outputs}
+
+            def _identify(value):
+                if isinstance(value, (list, tuple)):
+                    return [_identify(v) for v in value]
+                if isinstance(value, str) and value in hashes:
+                    return {"input": hashes[value]}
+                if isinstance(value, str) and value in extensions:
+                    return {"output": extensions[value]}
+                return value
+
+            description = {
+                "command": command,
+                "version": utils.__version__,
+                "args": {
+                    name: _identify(value)
+                    for name, value in sorted(args.items())
+                    if name not in _IGNORED_ARGS
+                },
+            }
+            encoded = json.dumps(description, sort_keys=True, default=str).encode()
+            return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def restore(self, key: str, outputs: Sequence[str]) -> bool:
+        """Restores the outputs of a cached run.
+
+        Args:
+            key (str): Key of the run.
+            outputs (Sequence[str]): Paths of the outputs, in the order they were stored.
+
+        Returns:
+            bool: Whether the run was cached and its outputs were restored.
+        """
+        entry = self._entry(key)
+        manifest_path = os.path.join(entry, MANIFEST)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        files = manifest["files"]
+        if len(files) != len(outputs) or not all(
+            _unchanged(os.path.join(entry, str(i)), stat)
+            for i, stat in enumerate(files)
+        ):
+            logging.warning(f"Cache entry {key} was modified, evicting it.")
+            shutil.rmtree(entry, ignore_errors=True)
+            return False
+
+        with stage("cache_restore"):
+            for i, output in enumerate(outputs):
+                _link_or_copy(os.path.join(entry, str(i)), output)
+            os.utime(manifest_path)
+        count("cache_hits")
+        return True
+
+    def store(self, key: str, outputs: Sequence[str]) -> None:
+        """Stores the outputs of a run, then evicts entries over the size limit.
+
+        Args:
+            key (str): Key of the run.
+            outputs (Sequence[str]): Paths of the outputs.
+        """
+        entry = self._entry(key)
+        if os.path.exists(entry) or not all(os.path.isfile(o) for o in outputs):
+            return
+        with stage("cache_store"):
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            staging = tempfile.mkdtemp(dir=os.path.dirname(entry), prefix=".tmp-")
+            files = []
+            for i, output in enumerate(outputs):
+                cached = os.path.join(staging, str(i))
+                _link_or_copy(output, cached)
+                stat = os.stat(cached)
+                files.append({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+            with open(os.path.join(staging, MANIFEST), "w") as f:
+                json.dump({"files": files, "created": time.time()}, f)
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # Stored meanwhile by a concurrent run
+                shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> List[Dict[str, object]]:
+        """Entries of the cache, from the least to the most recently used.
+
+        Returns:
+            List[Dict[str, object]]: Path, size and last use time of each entry.
+        """
+        entries = []
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name.startswith("."):
+                    continue
+                manifest_path = os.path.join(entry.path, MANIFEST)
+                try:
+                    with open(manifest_path) as f:
+                        manifest = json.load(f)
+                    used = os.stat(manifest_path).st_mtime
+                except (OSError, ValueError):
+                    continue
+                size = sum(stat["size"] for stat in manifest["files"])
+                entries.append({"path": entry.path, "size": size, "used": used})
+        return sorted(entries, key=lambda entry: entry["used"])
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the cache fits in its size."""
+        entries = self.entries()
+        total = sum(entry["size"] for entry in entries)
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry["path"], ignore_errors=True)
+            total -= entry["size"]
+
+
+def _unchanged(filename: str, stat: Dict[str, int]) -> bool:
+    try:
+        current = os.stat(filename)
+    except OSError:
+        return False
+    return (current.st_size, current.st_mtime_ns) == (stat["size"], stat["mtime_ns"])
+
+
+def _link_or_copy(source: str, destination: str):
+    """Hardlinks source to destination, replacing it, or copies it across filesystems."""
+    if os.path.lexists(destination):
+        os.unlink(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+class CachedRun:
+    def __init__(
+        self,
+        cache: Optional[ResultCache],
+        key: Optional[str],
+        outputs: Sequence[str],
+    ):
+        """
+        A script run looked up in the cache. Use cached_run to create it.
+
+        Args:
+            cache (ResultCache, optional): The cache, None when caching is disabled.
+            key (str, optional): Key of the run.
+            outputs (Sequence[str]): Paths of the outputs.
+        """
+        self.cache = cache
+        self.key = key
+        self.outputs = list(outputs)
+
+    def restore(self) -> bool:
+        """Restores the outputs if the run is cached.
+
+        Returns:
+            bool: Whether the outputs were restored, the script having nothing left to
+                do.
+        """
+        if self.cache is None or not self.cache.restore(self.key, self.outputs):
+            return False
+        logging.info(f"Outputs restored from the cache ({self.key}).")
+        return True
+
+    def store(self) -> None:
+        """Stores the outputs of the run in the cache."""
+        if self.cache is not None:
+            self.cache.store(self.key, self.outputs)
+
+
+def cached_run(
+    parser: ArgumentParser,
+    args: Namespace,
+    inputs: Sequence[Optional[str]],
+    outputs: Sequence[Optional[str]],
+    **extra: object,
+) -> CachedRun:
+    """Looks up a script run in the cache given by the --cache option (see
+    onsetpy.io.utils.add_cache_arg).
+
+    Args:
+        parser (ArgumentParser): Parser of the script, naming the command.
+        args (Namespace): Parsed arguments.
+        inputs (Sequence[Optional[str]]): Input files, None entries being ignored.
+        outputs (Sequence[Optional[str]]): Output files, None entries being ignored.
+        **extra: Values other than the arguments which change the outputs, e.g. the
+            date printed in a report.
+
+    Returns:
+        CachedRun: The run, to restore before doing the work and to store after.
+    """
+    inputs = [path for path in inputs if path is not None]
+    outputs = [path for path in outputs if path is not None]
+    if not getattr(args, "cache", None):
+        return CachedRun(None, None, outputs)
+    cache = ResultCache(args.cache, args.cache_max_size, args.cache_fast)
+    # "onset <command>" and "onset_<command>" are the same command
+    command = parser.prog.replace(" ", "_")
+    key = cache.key(command, {**vars(args), **extra}, inputs, outputs)
+    return CachedRun(cache, key, outputs)
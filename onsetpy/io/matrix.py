@@ -1,9 +1,61 @@
+import os
+
 import numpy as np
 from typing import Union, List
 
+from onsetpy.instrumentation import BYTES_READ, BYTES_WRITTEN, count_file, stage
+
+# Matrices kept in memory by preload_matrix, indexed by absolute path
+_PRELOADED = {}
+
+
+def preload_matrix(input_name: str) -> np.ndarray:
+    """Load a connectivity matrix once and keep it in memory.
+
+    Later load_matrix calls on the same file return the preloaded matrix, as long as the
+    file is not modified. The onset daemon uses it for the normative matrices, its forked
+    jobs getting a copy-on-write view of them.
+
+    The forked jobs cannot corrupt the matrix of the daemon, since their writes go to
+    private copies of the pages. The matrix is still read-only because, within a
+    process, every later load returns this same array rather than a fresh one: a caller
+    modifying it in place would change the matrix seen by the other callers, and the
+    write would also copy the shared pages into the job.
+
+    Args:
+        input_name (str): Connectivity filename.
+
+    Returns:
+        np.ndarray: Read-only connectivity matrix.
+    """
+    stat = os.stat(input_name)
+    matrix = np.load(input_name)
+    matrix.flags.writeable = False
+    _PRELOADED[os.path.abspath(input_name)] = (stat.st_mtime_ns, stat.st_size, matrix)
+    return matrix
+
+
+def _load(input_name: str) -> np.ndarray:
+    """Load a connectivity matrix, from memory if it was preloaded and is unchanged.
+
+    Args:
+        input_name (str): Connectivity filename.
+
+    Returns:
+        np.ndarray: Connectivity matrix.
+    """
+    preloaded = _PRELOADED.get(os.path.abspath(input_name))
+    if preloaded is not None:
+        stat = os.stat(input_name)
+        if (stat.st_mtime_ns, stat.st_size) == preloaded[:2]:
+            return preloaded[2]
+    with stage("load_matrix", path=str(input_name)):
+        count_file(BYTES_READ, input_name)
+        return np.load(input_name)
+
 
 def load_matrix(
-    input_names: Union[str, List[str]]
+    input_names: Union[str, List[str]],
 ) -> Union[np.ndarray, List[np.ndarray]]:
     """Load one or multiple connectivity matrices.
 
@@ -14,9 +66,9 @@ def load_matrix(
         Union[np.ndarray, List[np.ndarray]]: Connectivity matrices.
     """
     if isinstance(input_names, str):
-        return np.load(input_names)
+        return _load(input_names)
     else:
-        return [np.load(file) for file in input_names]
+        return [_load(file) for file in input_names]
 
 
 def save_matrix(matrix: np.ndarray, output_name: str) -> None:
@@ -26,4 +78,6 @@ def save_matrix(matrix: np.ndarray, output_name: str) -> None:
         matrix (np.ndarray): Connectivity matrix
         output_name (str): Output filename
     """
-    np.save(output_name, matrix)
+    with stage("save_matrix", path=str(output_name)):
+        np.save(output_name, matrix)
+        count_file(BYTES_WRITTEN, output_name)
@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from onsetpy.cli.main import run_command
+from onsetpy.io.cache import ResultCache, hash_file
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self._path("cache"))
+        self.input = self._write("input.txt", "input")
+        self.output = self._path("output.csv")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def _write(self, name, content):
+        with open(self._path(name), "w") as f:
+            f.write(content)
+        return self._path(name)
+
+    def _key(self, args=None, inputs=None, outputs=None):
+        inputs = inputs or [self.input]
+        outputs = outputs or [self.output]
+        args = args or {"input": inputs[0], "output": outputs[0], "threshold": 2}
+        return self.cache.key("onset_test", args, inputs, outputs)
+
+    def test_hash_file(self):
+        copy = self._write("copy.txt", "input")
+        self.assertEqual(hash_file(self.input), hash_file(copy))
+        self.assertNotEqual(
+            hash_file(self.input, fast=True), hash_file(copy, fast=True)
+        )
+
+    def test_key(self):
+        key = self._key()
+        # Identified by the contents of the inputs and the extension of the outputs
+        copy = self._write("copy.txt", "input")
+        other_output = self._path("other/output.csv")
+        self.assertEqual(key, self._key(inputs=[copy], outputs=[other_output]))
+        self.assertNotEqual(key, self._key(outputs=[self._path("output.json")]))
+        args = {"input": self.input, "output": self.output, "threshold": 3}
+        self.assertNotEqual(key, self._key(args=args))
+        args = {"input": self.input, "output": self.output, "threshold": 2}
+        self.assertEqual(key, self._key(args={**args, "overwrite": True}))
+
+        self._write("input.txt", "changed")
+        self.assertNotEqual(key, self._key())
+
+    def test_store_restore(self):
+        key = self._key()
+        self.assertFalse(self.cache.restore(key, [self.output]))
+        self._write("output.csv", "result")
+        self.cache.store(key, [self.output])
+
+        os.remove(self.output)
+        self.assertTrue(self.cache.restore(key, [self.output]))
+        with open(self.output) as f:
+            self.assertEqual(f.read(), "result")
+        # Restoring over an existing output
+        self.assertTrue(self.cache.restore(key, [self.output]))
+
+    def test_modified_entry(self):
+        key = self._key()
+        self._write("output.csv", "result")
+        self.cache.store(key, [self.output])
+        # The output is hardlinked to the cache, so modifying it modifies the entry
+        time.sleep(0.01)
+        self._write("output.csv", "modified")
+        self.assertFalse(self.cache.restore(key, [self.output]))
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_eviction(self):
+        self.cache.max_size = 25
+        keys = []
+        for i in range(3):
+            key = self._key(args={"index": i})
+            self._write("output.csv", "0123456789")
+            self.cache.store(key, [self.output])
+            keys.append(key)
+            if i == 1:
+                time.sleep(0.01)
+                # Using the first entry makes the second one the least recently used
+                self.assertTrue(self.cache.restore(keys[0], [self.output]))
+            time.sleep(0.01)
+            os.remove(self.output)
+
+        self.assertEqual(len(self.cache.entries()), 2)
+        self.assertTrue(self.cache.restore(keys[0], [self.output]))
+        self.assertFalse(self.cache.restore(keys[1], [self.output]))
+        self.assertTrue(self.cache.restore(keys[2], [self.output]))
+
+
+class TestCachedScript(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.inputs = []
+        for i in range(3):
+            self.inputs.append(os.path.join(self.temp_dir.name, f"matrix_{i}.npy"))
+            np.save(self.inputs[-1], np.full((3, 3), float(i)))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _run(self, out_dir):
+        os.makedirs(os.path.join(self.temp_dir.name, out_dir), exist_ok=True)
+        trace = os.path.join(self.temp_dir.name, out_dir, "trace.json")
+        exit_code = run_command(
+            "mean_std_connectivity_matrix",
+            self.inputs
+            + [
+                "--out_mean",
+                os.path.join(self.temp_dir.name, out_dir, "mean.npy"),
+                "--out_std",
+                os.path.join(self.temp_dir.name, out_dir, "std.npy"),
+                "--cache",
+                os.path.join(self.temp_dir.name, "cache"),
+                "--profile",
+                trace,
+            ],
+        )
+        self.assertEqual(exit_code, 0)
+        with open(trace) as f:
+            return json.load(f)["otherData"]["counters"]
+
+    def test_second_run_is_restored(self):
+        counters = self._run("first")
+        self.assertNotIn("cache_hits", counters)
+        counters = self._run("second")
+        self.assertEqual(counters["cache_hits"], 1)
+        for name in ("mean.npy", "std.npy"):
+            np.testing.assert_array_equal(
+                np.load(os.path.join(self.temp_dir.name, "first", name)),
+                np.load(os.path.join(self.temp_dir.name, "second", name)),
+            )
+
+        np.save(self.inputs[0], np.full((3, 3), 10.0))
+        shutil.rmtree(os.path.join(self.temp_dir.name, "second"))
+        self.assertNotIn("cache_hits", self._run("second"))
+        mean = np.load(os.path.join(self.temp_dir.name, "second", "mean.npy"))
+        np.testing.assert_allclose(mean, np.full((3, 3), 13 / 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
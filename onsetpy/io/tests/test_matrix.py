@@ -1,7 +1,7 @@
 import unittest
 import numpy as np
 import os
-from onsetpy.io.matrix import load_matrix, save_matrix
+from onsetpy.io.matrix import load_matrix, preload_matrix, save_matrix, _PRELOADED
 
 
 class TestMatrixFunctions(unittest.TestCase):
@@ -38,6 +38,24 @@ class TestMatrixFunctions(unittest.TestCase):
         np.testing.assert_array_equal(loaded_matrix, self.test_matrix)
         os.remove(output_file)
 
+    def test_preload_matrix(self):
+        preloaded = preload_matrix(self.single_file)
+        try:
+            self.assertIs(load_matrix(self.single_file), preloaded)
+            self.assertIs(load_matrix([self.single_file])[0], preloaded)
+            # Shared by all the loads, so it cannot be modified in place
+            with self.assertRaises(ValueError):
+                load_matrix(self.single_file)[0, 0] = 0
+
+            # A modified file is read again
+            np.save(self.single_file, self.test_matrix * 2)
+            os.utime(self.single_file, ns=(0, 0))
+            loaded_matrix = load_matrix(self.single_file)
+            self.assertIsNot(loaded_matrix, preloaded)
+            np.testing.assert_array_equal(loaded_matrix, self.test_matrix * 2)
+        finally:
+            _PRELOADED.clear()
+
 
 if __name__ == "__main__":
     unittest.main()
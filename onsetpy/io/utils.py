@@ -1,11 +1,26 @@
-import importlib.metadata
 import os
-from typing import Union, List
+from typing import TYPE_CHECKING, Union, List
 
-from argparse import ArgumentParser, Namespace
-import numpy as np
+from argparse import Action, ArgumentParser, Namespace, SUPPRESS
 
-__version__ = importlib.metadata.version("onsetpy")
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def __getattr__(name: str):
+    """Resolve ``__version__`` on first access, importlib.metadata being slow to import.
+
+    Args:
+        name (str): Name of the attribute.
+
+    Returns:
+        str: The version of onsetpy.
+    """
+    if name == "__version__":
+        import importlib.metadata
+
+        return importlib.metadata.version("onsetpy")
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 def add_verbose_arg(parser: ArgumentParser) -> None:
@@ -133,7 +148,7 @@ def assert_outputs_exist(
         check(optional_file)
 
 
-def assert_matrices_compatible(parser: ArgumentParser, matrices: np.ndarray) -> None:
+def assert_matrices_compatible(parser: ArgumentParser, matrices: "np.ndarray") -> None:
     """Check if matrices have the same shape.
 
     Args:
@@ -148,6 +163,70 @@ def assert_matrices_compatible(parser: ArgumentParser, matrices: np.ndarray) ->
             )
 
 
+def add_profile_arg(parser: ArgumentParser) -> None:
+    """Add the profiling option to the parser.
+
+    The profiler starts as soon as the option is parsed, and the trace is written when the
+    script exits (see onsetpy.instrumentation).
+
+    Args:
+        parser (ArgumentParser): Parser.
+    """
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        action=_ProfileAction,
+        help="Write a trace of the stages of the script (timings, memory and I/O) to\n"
+        "this JSON file, in Chrome trace-event format.",
+    )
+
+
+class _ProfileAction(Action):
+    """Start the profiler writing its trace to the given file."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from onsetpy.instrumentation import start_profiling
+
+        setattr(namespace, self.dest, values)
+        start_profiling(values)
+
+
+def add_cache_arg(parser: ArgumentParser) -> None:
+    """Add the result cache options to the parser.
+
+    With a cache directory (--cache, or the ONSETPY_CACHE_DIR environment variable), a
+    script whose command, arguments and input contents were already processed restores
+    its previous outputs instead of running again (see onsetpy.io.cache).
+
+    Args:
+        parser (ArgumentParser): Parser.
+    """
+    from onsetpy.io.cache import DEFAULT_MAX_SIZE_MB
+
+    group = parser.add_argument_group("Cache")
+    group.add_argument(
+        "--cache",
+        metavar="DIR",
+        default=os.environ.get("ONSETPY_CACHE_DIR"),
+        help="Directory of the result cache, disabled by default\n"
+        "[$ONSETPY_CACHE_DIR].",
+    )
+    group.add_argument(
+        "--cache_max_size",
+        metavar="MB",
+        type=float,
+        default=DEFAULT_MAX_SIZE_MB,
+        help="Maximum size of the cache, the least recently used results being\n"
+        "evicted first [%(default)s].",
+    )
+    group.add_argument(
+        "--cache_fast",
+        action="store_true",
+        help="Identify the inputs by path, size and modification time instead of\n"
+        "hashing their contents.",
+    )
+
+
 def add_version_arg(parser: ArgumentParser) -> None:
     """
     Adds a version argument to the given argument parser.
@@ -159,4 +238,21 @@ def add_version_arg(parser: ArgumentParser) -> None:
         parser (argparse.ArgumentParser): The argument parser to which the
         version argument will be added.
     """
-    parser.add_argument("--version", action="version", version=__version__)
+    parser.add_argument("--version", action=_VersionAction)
+
+
+class _VersionAction(Action):
+    """Print the version of onsetpy and exit, resolving it only when requested."""
+
+    def __init__(self, option_strings, dest=SUPPRESS, default=SUPPRESS, help=None):
+        super().__init__(
+            option_strings=option_strings,
+            dest=dest,
+            default=default,
+            nargs=0,
+            help=help or "show program's version number and exit",
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(__getattr__("__version__"))
+        parser.exit()
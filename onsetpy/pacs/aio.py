@@ -0,0 +1,467 @@
+import asyncio
+import base64
+import json
+import logging
+import threading
+
+import aiohttp
+
+from onsetpy.pacs.archive import CHUNK_SIZE
+from onsetpy.pacs.client import RETRY_STATUSES
+from onsetpy.pacs.exceptions import (
+    OrthancConnectionError,
+    OrthancHTTPError,
+    OrthancJobError,
+    OrthancNotFoundError,
+    OrthancTimeoutError,
+    StudyNotFoundError,
+)
+
+
+async def _read_chunk(response, chunk_size):
+    """
+    Reads the next chunk of a streamed response.
+
+    Returns:
+        bytes: At most chunk_size bytes, empty once the whole body has been read.
+
+    Raises:
+        OrthancConnectionError: If the transfer is interrupted.
+    """
+    try:
+        return await response.content.read(chunk_size)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise OrthancConnectionError(
+            f"Transfer of {response.url} interrupted: {e!r}"
+        ) from e
+
+
+async def _release(response):
+    """Releases a response in the event loop it belongs to."""
+    response.release()
+
+
+class AsyncOrthancClient:
+    def __init__(
+        self,
+        url,
+        username=None,
+        password=None,
+        max_connections=100,
+        retries=3,
+        backoff_factor=0.5,
+        timeout=60,
+    ):
+        """
+        Initializes an asyncio client for the Orthanc REST API.
+
+        All the requests of the client share one aiohttp session, so thousands of queries
+        can be in flight from a single thread, the number of open connections being
+        bounded by max_connections. Like OrthancClient, requests failing on a connection
+        error or a transient server error (5xx) are retried with an exponential backoff.
+        Errors are raised as OrthancError subclasses.
+
+        The session is created on first use, in the running event loop. Use the client as
+        an async context manager, or call close, to release the connections.
+
+        Args:
+            url (str): The base URL of your Orthanc server (e.g., "http://localhost:8042").
+            username (str, optional): Username for Orthanc authentication.
+            password (str, optional): Password for Orthanc authentication.
+            max_connections (int, optional): Maximum number of connections open at once.
+                Defaults to 100.
+            retries (int, optional): Maximum number of retries per request. Defaults to 3.
+            backoff_factor (float, optional): Backoff factor between retries, in seconds.
+                Defaults to 0.5.
+            timeout (float, optional): Connection and read timeout, in seconds. Defaults to 60.
+
+        Attributes:
+            url (str): The base URL of the Orthanc server.
+        """
+        self.url = url.rstrip("/")
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._headers = {}
+        if username and password:
+            credentials = base64.b64encode(f"{username}:{password}".encode("utf-8"))
+            self._headers["Authorization"] = f"Basic {credentials.decode('ascii')}"
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """Closes the connections of the session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        """Returns the session, creating it in the running event loop if needed."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers=self._headers,
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.timeout, sock_read=self.timeout
+                ),
+            )
+        return self._session
+
+    async def _send(self, method, path, **kwargs):
+        """
+        Sends a request, retrying on connection errors and transient server errors.
+
+        Returns:
+            aiohttp.ClientResponse: The response, whose body has not been read yet. The
+                caller must release it.
+        """
+        session = self._get_session()
+        for attempt in range(self.retries + 1):
+            try:
+                response = await session.request(method, f"{self.url}{path}", **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise OrthancConnectionError(
+                        f"Could not connect to Orthanc at {self.url}: {e!r}"
+                    ) from e
+            else:
+                if response.status < 400:
+                    return response
+                body = await response.text()
+                response.release()
+                if response.status not in RETRY_STATUSES or attempt == self.retries:
+                    error = (
+                        OrthancNotFoundError
+                        if response.status == 404
+                        else OrthancHTTPError
+                    )
+                    raise error(method, path, response.status, body)
+            await asyncio.sleep(self.backoff_factor * 2**attempt)
+
+    async def request(self, method, path, json_body=None):
+        """
+        Sends a request to the Orthanc server and decodes its JSON response.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The path of the route (e.g., "/tools/find").
+            json_body (dict, optional): The body of the request, encoded in JSON.
+
+        Returns:
+            The decoded response, or None if the response is empty.
+
+        Raises:
+            OrthancHTTPError: If the server returns an error status code.
+            OrthancConnectionError: If the server cannot be reached.
+        """
+        kwargs = {}
+        if json_body is not None:
+            kwargs["data"] = json.dumps(json_body)
+            kwargs["headers"] = {"Content-Type": "application/json"}
+        response = await self._send(method, path, **kwargs)
+        async with response:
+            data = await response.read()
+        return json.loads(data) if data else None
+
+    async def find(self, accession_number):
+        """
+        Finds the studies stored in Orthanc with the given accession number.
+
+        Args:
+            accession_number (str): The accession number of the studies.
+
+        Returns:
+            list: The details of the matching studies, empty if no study is found.
+        """
+        query = {
+            "Level": "Study",
+            "Query": {"AccessionNumber": accession_number},
+            "Expand": True,
+        }
+        return await self.request("POST", "/tools/find", query)
+
+    async def find_many(self, accession_numbers, concurrency=100):
+        """
+        Finds the studies of many accession numbers concurrently.
+
+        Args:
+            accession_numbers (list): The accession numbers to look up.
+            concurrency (int, optional): Maximum number of queries in flight. Defaults to 100.
+
+        Returns:
+            dict: The details of the matching studies, indexed by accession number.
+                Accession numbers whose lookup failed are left out of the index.
+        """
+        accession_numbers = list(dict.fromkeys(accession_numbers))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _find(accession_number):
+            async with semaphore:
+                return await self.find(accession_number)
+
+        results = await asyncio.gather(
+            *(_find(an) for an in accession_numbers), return_exceptions=True
+        )
+        index = {}
+        for accession_number, studies in zip(accession_numbers, results):
+            if isinstance(studies, Exception):
+                logging.warning(f"Lookup of {accession_number} failed: {studies}")
+            else:
+                index[accession_number] = studies
+        return index
+
+    async def retrieve(self, remote_aet_name, accession_number, target_aet=None):
+        """
+        Queries a remote modality (C-FIND) and submits the retrieval of the study as an
+        Orthanc job (C-MOVE).
+
+        Args:
+            remote_aet_name (str): The name of the remote modality configured in Orthanc.
+            accession_number (str): The accession number of the study.
+            target_aet (str, optional): The AET to retrieve the study to. If None, Orthanc
+                retrieves it to itself.
+
+        Returns:
+            str: The ID of the retrieve job (see wait_for_job).
+
+        Raises:
+            StudyNotFoundError: If the remote modality has no study with this accession
+                number.
+        """
+        query = {"Level": "Study", "Query": {"AccessionNumber": accession_number}}
+        remote_query = await self.request(
+            "POST", f"/modalities/{remote_aet_name}/query", query
+        )
+        answers = await self.request("GET", f"{remote_query['Path']}/answers")
+        if not answers:
+            raise StudyNotFoundError(accession_number, remote_aet_name)
+
+        move_query = {"Asynchronous": True}
+        if target_aet:
+            move_query["TargetAet"] = target_aet
+        job = await self.request("POST", f"{remote_query['Path']}/retrieve", move_query)
+        return job["ID"]
+
+    async def wait_for_job(self, job_id, timeout=3600, initial_delay=0.5, max_delay=10):
+        """
+        Polls an Orthanc job until it completes, with an exponential backoff between requests.
+
+        Args:
+            job_id (str): The ID of the Orthanc job.
+            timeout (float, optional): Maximum time to wait for the job, in seconds.
+            initial_delay (float, optional): Delay before the first poll, in seconds.
+            max_delay (float, optional): Maximum delay between two polls, in seconds.
+
+        Returns:
+            dict: The description of the job once it succeeded.
+
+        Raises:
+            OrthancJobError: If the job failed.
+            OrthancTimeoutError: If the job did not complete before the timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = initial_delay
+
+        while True:
+            await asyncio.sleep(min(delay, max(deadline - loop.time(), 0)))
+            job = await self.request("GET", f"/jobs/{job_id}")
+
+            if job["State"] == "Success":
+                return job
+            if job["State"] == "Failure":
+                raise OrthancJobError(job)
+            if loop.time() >= deadline:
+                raise OrthancTimeoutError(job, timeout)
+            delay = min(delay * 2, max_delay)
+
+    async def open_archive(self, study_id, offset=0):
+        """
+        Opens the ZIP archive of a study, without reading it.
+
+        Args:
+            study_id (str): The internal Orthanc ID of the study.
+            offset (int, optional): Offset of the first byte to transfer, requested with
+                an HTTP Range header. Servers ignoring the header answer with the whole
+                archive (status 200 instead of 206). Defaults to 0.
+
+        Returns:
+            aiohttp.ClientResponse: The response, whose body has not been read yet. The
+                caller must release it.
+        """
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        return await self._send("GET", f"/studies/{study_id}/archive", headers=headers)
+
+    async def iter_archive(self, study_id, chunk_size=CHUNK_SIZE):
+        """
+        Streams the ZIP archive of a study.
+
+        Args:
+            study_id (str): The internal Orthanc ID of the study.
+            chunk_size (int, optional): Maximum size of the chunks, in bytes.
+                Defaults to 4 MiB.
+
+        Yields:
+            bytes: The successive chunks of the archive.
+
+        Raises:
+            OrthancConnectionError: If the transfer is interrupted.
+        """
+        response = await self.open_archive(study_id)
+        async with response:
+            while True:
+                chunk = await _read_chunk(response, chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def delete_study(self, study_id):
+        """
+        Deletes a study from Orthanc.
+
+        Args:
+            study_id (str): The internal Orthanc ID of the study.
+        """
+        await self.request("DELETE", f"/studies/{study_id}")
+
+
+class BlockingOrthancClient:
+    def __init__(self, *args, **kwargs):
+        """
+        Initializes a blocking wrapper around AsyncOrthancClient, for synchronous code.
+
+        The asynchronous client runs in an event loop owned by a background thread, so the
+        wrapper can be shared by several threads while all their requests are multiplexed on
+        the same connections.
+
+        Args:
+            *args, **kwargs: Arguments passed to AsyncOrthancClient.
+
+        Attributes:
+            client (AsyncOrthancClient): The wrapped client.
+        """
+        self.client = AsyncOrthancClient(*args, **kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run(self, coroutine):
+        """Runs a coroutine in the event loop of the wrapper and waits for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def close(self):
+        """Closes the connections and stops the event loop."""
+        if self._loop.is_closed():
+            return
+        self._run(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def find(self, accession_number):
+        """See AsyncOrthancClient.find."""
+        return self._run(self.client.find(accession_number))
+
+    def find_many(self, accession_numbers, concurrency=100):
+        """See AsyncOrthancClient.find_many."""
+        return self._run(self.client.find_many(accession_numbers, concurrency))
+
+    def retrieve(self, remote_aet_name, accession_number, target_aet=None):
+        """See AsyncOrthancClient.retrieve."""
+        return self._run(
+            self.client.retrieve(remote_aet_name, accession_number, target_aet)
+        )
+
+    def wait_for_job(self, job_id, **kwargs):
+        """See AsyncOrthancClient.wait_for_job."""
+        return self._run(self.client.wait_for_job(job_id, **kwargs))
+
+    def open_archive(self, study_id, offset=0):
+        """
+        See AsyncOrthancClient.open_archive.
+
+        Returns:
+            BlockingResponse: The response, to use as a context manager.
+        """
+        return BlockingResponse(
+            self._run(self.client.open_archive(study_id, offset)), self._run
+        )
+
+    def iter_archive(self, study_id, chunk_size=CHUNK_SIZE):
+        """See AsyncOrthancClient.iter_archive."""
+        chunks = self.client.iter_archive(study_id, chunk_size)
+        try:
+            while True:
+                try:
+                    yield self._run(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(chunks.aclose())
+
+    def delete_study(self, study_id):
+        """See AsyncOrthancClient.delete_study."""
+        return self._run(self.client.delete_study(study_id))
+
+
+class BlockingResponse:
+    def __init__(self, response, run):
+        """
+        Blocking view of a streamed response of BlockingOrthancClient.
+
+        Args:
+            response (aiohttp.ClientResponse): The response, whose body has not been read
+                yet.
+            run (callable): Function running a coroutine in the event loop of the client
+                and returning its result.
+
+        Attributes:
+            status (int): The status code of the response.
+            headers (multidict.CIMultiDictProxy): The headers of the response.
+        """
+        self.status = response.status
+        self.headers = response.headers
+        self._response = response
+        self._run = run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """
+        Reads the body of the response.
+
+        Args:
+            chunk_size (int, optional): Maximum size of the chunks, in bytes.
+                Defaults to 4 MiB.
+
+        Yields:
+            bytes: The successive chunks of the body.
+
+        Raises:
+            OrthancConnectionError: If the transfer is interrupted.
+        """
+        while True:
+            chunk = self._run(_read_chunk(self._response, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        """Releases the connection of the response."""
+        self._run(_release(self._response))
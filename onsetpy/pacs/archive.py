@@ -0,0 +1,133 @@
+import os
+import re
+import zipfile
+
+from onsetpy.instrumentation import BYTES_READ, BYTES_WRITTEN, count
+from onsetpy.pacs.exceptions import OrthancConnectionError, OrthancHTTPError
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class CorruptArchiveError(IOError):
+    """Raised when a downloaded archive is truncated or is not a valid ZIP file."""
+
+
+def _expected_size(response, offset):
+    """
+    Computes the total size of the archive announced by the server.
+
+    Args:
+        response (BlockingResponse): The response of the server.
+        offset (int): The offset of the first byte of the response.
+
+    Returns:
+        int or None: The size in bytes, or None if the server did not announce it.
+    """
+    content_range = re.match(
+        r"bytes \d+-\d+/(\d+)", response.headers.get("Content-Range", "")
+    )
+    if content_range:
+        return int(content_range.group(1))
+    if "Content-Length" in response.headers:
+        return offset + int(response.headers["Content-Length"])
+    return None
+
+
+def verify_archive(filename, expected_size=None):
+    """
+    Verifies that a downloaded archive is complete.
+
+    Args:
+        filename (str): The path of the archive.
+        expected_size (int, optional): The size announced by the server, in bytes.
+
+    Raises:
+        CorruptArchiveError: If the size does not match or the ZIP central directory cannot be
+            read.
+    """
+    size = os.path.getsize(filename)
+    if expected_size is not None and size != expected_size:
+        raise CorruptArchiveError(
+            f"{filename} has {size} bytes, {expected_size} were expected."
+        )
+    try:
+        with zipfile.ZipFile(filename) as archive:
+            archive.infolist()
+    except zipfile.BadZipFile as e:
+        raise CorruptArchiveError(f"{filename} is not a valid ZIP file: {e}") from e
+
+
+def download_archive(
+    client,
+    study_id,
+    output_filename,
+    chunk_size=CHUNK_SIZE,
+    max_resumes=3,
+    on_downloaded=None,
+):
+    """
+    Downloads the ZIP archive of a study from Orthanc, resuming interrupted transfers.
+
+    The archive is written to ``<output_filename>.part`` and only renamed to output_filename
+    once it has been verified, so an existing output_filename is always complete. If the
+    transfer is interrupted, it is resumed with an HTTP Range request; a ``.part`` file left
+    by a previous run is resumed as well. Servers ignoring the Range header restart the
+    transfer from the beginning.
+
+    Args:
+        client (BlockingOrthancClient): The client of your Orthanc server.
+        study_id (str): The internal Orthanc ID of the study.
+        output_filename (str): The path of the ZIP file to save.
+        chunk_size (int, optional): Size of the chunks written to disk, in bytes.
+            Defaults to 4 MiB.
+        max_resumes (int, optional): Maximum number of times an interrupted transfer is
+            resumed. Defaults to 3.
+        on_downloaded (callable, optional): Function called without arguments once the
+            transfer is complete, before the archive is verified.
+
+    Returns:
+        str: The full path to the downloaded file.
+
+    Raises:
+        CorruptArchiveError: If the downloaded archive is invalid. The partial file is
+            removed.
+        OrthancConnectionError: If the transfer failed more than max_resumes times.
+        OrthancHTTPError: If the server returned an error.
+    """
+    part_filename = f"{output_filename}.part"
+    expected_size = None
+
+    for attempt in range(max_resumes + 1):
+        offset = os.path.getsize(part_filename) if os.path.exists(part_filename) else 0
+        try:
+            with client.open_archive(study_id, offset) as response:
+                if response.status != 206:
+                    offset = 0
+                expected_size = _expected_size(response, offset)
+
+                with open(part_filename, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_chunks(chunk_size):
+                        f.write(chunk)
+                        count(BYTES_READ, len(chunk))
+                        count(BYTES_WRITTEN, len(chunk))
+            break
+        except OrthancHTTPError as e:
+            # The partial file already holds the whole archive
+            if e.status == 416 and offset:
+                break
+            raise
+        except OrthancConnectionError:
+            if attempt == max_resumes:
+                raise
+
+    if on_downloaded is not None:
+        on_downloaded()
+
+    try:
+        verify_archive(part_filename, expected_size)
+    except CorruptArchiveError:
+        os.remove(part_filename)
+        raise
+
+    os.replace(part_filename, output_filename)
+    return os.path.abspath(output_filename)
@@ -0,0 +1,104 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class OrthancClient:
+    def __init__(
+        self,
+        url,
+        username=None,
+        password=None,
+        pool_size=10,
+        retries=3,
+        backoff_factor=0.5,
+        timeout=60,
+    ):
+        """
+        Initializes a client for the Orthanc REST API.
+
+        The client owns a requests session: connections are kept alive and pooled between
+        requests, the credentials are set once, and requests failing on a connection error or
+        a transient server error (5xx) are retried with an exponential backoff. All the
+        Orthanc routes used by onsetpy can safely be repeated, so POST requests are retried
+        as well.
+
+        Args:
+            url (str): The base URL of your Orthanc server (e.g., "http://localhost:8042").
+            username (str, optional): Username for Orthanc authentication.
+            password (str, optional): Password for Orthanc authentication.
+            pool_size (int, optional): Maximum number of connections kept open. Should be at
+                least the number of threads sharing the client. Defaults to 10.
+            retries (int, optional): Maximum number of retries per request. Defaults to 3.
+            backoff_factor (float, optional): Backoff factor between retries, in seconds.
+                Defaults to 0.5.
+            timeout (float, optional): Connection and read timeout, in seconds. Defaults to 60.
+
+        Attributes:
+            url (str): The base URL of the Orthanc server.
+            timeout (float): Connection and read timeout, in seconds.
+            session (requests.Session): The HTTP session.
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if username and password:
+            self.session.auth = (username, password)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Closes the connections of the session."""
+        self.session.close()
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request to the Orthanc server.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The path of the route (e.g., "/tools/find").
+            **kwargs: Additional arguments passed to requests.Session.request.
+
+        Returns:
+            requests.Response: The response of the server.
+
+        Raises:
+            requests.exceptions.HTTPError: If the server returns an error status code.
+            requests.exceptions.ConnectionError: If the server cannot be reached.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        response = self.session.request(method, f"{self.url}{path}", **kwargs)
+        response.raise_for_status()
+        return response
+
+    def get(self, path, **kwargs):
+        """Sends a GET request. See request."""
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        """Sends a POST request. See request."""
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        """Sends a DELETE request. See request."""
+        return self.request("DELETE", path, **kwargs)
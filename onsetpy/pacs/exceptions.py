@@ -0,0 +1,78 @@
+class OrthancError(Exception):
+    """Base class of the errors raised by the Orthanc clients."""
+
+
+class OrthancConnectionError(OrthancError):
+    """Raised when the Orthanc server cannot be reached."""
+
+
+class OrthancHTTPError(OrthancError):
+    def __init__(self, method, path, status, body=""):
+        """
+        Raised when the Orthanc server answers with an error status code.
+
+        Args:
+            method (str): The HTTP method of the request.
+            path (str): The path of the route.
+            status (int): The status code of the response.
+            body (str, optional): The body of the response, which contains the Orthanc
+                error details.
+        """
+        super().__init__(f"{method} {path} failed with status {status}: {body}")
+        self.method = method
+        self.path = path
+        self.status = status
+        self.body = body
+
+
+class OrthancNotFoundError(OrthancHTTPError):
+    """Raised when the requested Orthanc resource does not exist (404)."""
+
+
+class StudyNotFoundError(OrthancError):
+    def __init__(self, accession_number, modality=None):
+        """
+        Raised when no study matches an accession number.
+
+        Args:
+            accession_number (str): The accession number of the study.
+            modality (str, optional): The remote modality that was queried, or None if the
+                study was looked up in Orthanc.
+        """
+        where = f"on '{modality}'" if modality else "in Orthanc"
+        super().__init__(
+            f"No study found {where} for AccessionNumber {accession_number}"
+        )
+        self.accession_number = accession_number
+        self.modality = modality
+
+
+class OrthancJobError(OrthancError):
+    def __init__(self, job):
+        """
+        Raised when an Orthanc job fails.
+
+        Args:
+            job (dict): The description of the job returned by /jobs/{id}.
+        """
+        super().__init__(
+            f"Job {job['ID']} failed: {job.get('ErrorDescription', 'unknown error')}"
+        )
+        self.job = job
+
+
+class OrthancTimeoutError(OrthancError, TimeoutError):
+    def __init__(self, job, timeout):
+        """
+        Raised when an Orthanc job does not complete in time.
+
+        Args:
+            job (dict): The last description of the job returned by /jobs/{id}.
+            timeout (float): The time waited, in seconds.
+        """
+        super().__init__(
+            f"Job {job['ID']} did not complete after {timeout} seconds "
+            f"(state: {job['State']}, progress: {job.get('Progress', 0)}%)."
+        )
+        self.job = job
+        self.timeout = timeout
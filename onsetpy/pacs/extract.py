@@ -0,0 +1,403 @@
+import csv
+import os
+import struct
+import zlib
+
+from onsetpy.instrumentation import BYTES_READ, BYTES_WRITTEN, count
+from onsetpy.pacs.archive import CHUNK_SIZE, CorruptArchiveError
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_LOCAL_HEADER_SIGNATURE = 0x04034B50
+_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+_END_SIGNATURES = (0x02014B50, 0x06054B50, 0x06064B50)
+_LONG_VRS = (
+    b"OB",
+    b"OD",
+    b"OF",
+    b"OL",
+    b"OV",
+    b"OW",
+    b"SQ",
+    b"UC",
+    b"UN",
+    b"UR",
+    b"UT",
+)
+_HEAD_SIZE = 16 * 1024
+
+MANIFEST_COLUMNS = ("series", "filename", "sop_instance_uid")
+
+
+def read_sop_instance_uid(head):
+    """
+    Reads the SOP Instance UID in the file meta information of a DICOM file.
+
+    Args:
+        head (bytes): The first bytes of the DICOM file.
+
+    Returns:
+        str or None: The Media Storage SOP Instance UID (0002,0003), or None if it is not
+            found in head.
+    """
+    if head[128:132] != b"DICM":
+        return None
+
+    position = 132
+    while position + 8 <= len(head):
+        group, element = struct.unpack_from("<HH", head, position)
+        if group != 0x0002:
+            break
+        vr = bytes(head[position + 4 : position + 6])
+        if vr in _LONG_VRS:
+            (length,) = struct.unpack_from("<I", head, position + 8)
+            value_position = position + 12
+        else:
+            (length,) = struct.unpack_from("<H", head, position + 6)
+            value_position = position + 8
+        if element == 0x0003:
+            value = bytes(head[value_position : value_position + length])
+            return value.rstrip(b"\x00 ").decode("ascii")
+        position = value_position + length
+    return None
+
+
+def _safe_name(name):
+    """Makes an archive path component safe to use as a file or directory name."""
+    name = name.replace(os.sep, "_").strip()
+    return "_" if name in ("", ".", "..") else name
+
+
+class StreamingZipExtractor:
+    def __init__(self, output_dir, write_files=True):
+        """
+        Initializes an extractor writing the DICOM files of a ZIP archive as its bytes arrive.
+
+        The archive is parsed from its local file headers, so it never needs to be stored on
+        disk. Entries using data descriptors, as produced by Orthanc when streaming archives,
+        are supported for deflated and stored files. Each file is written to
+        ``output_dir/<series>/<filename>``, where series is the name of the directory of the
+        file in the archive (Orthanc archives are organised as patient/study/series).
+
+        Args:
+            output_dir (str): The directory where the series folders are written.
+            write_files (bool, optional): If False, the files are only parsed to build the
+                manifest. Defaults to True.
+
+        Attributes:
+            manifest (list): A (series, filename, sop_instance_uid) tuple per extracted file.
+        """
+        self.output_dir = output_dir
+        self.write_files = write_files
+        self.manifest = []
+        self._buffer = bytearray()
+        self._state = "header"
+        self._entry = None
+
+    def feed(self, data):
+        """
+        Processes the next bytes of the archive.
+
+        Args:
+            data (bytes): The next bytes of the archive.
+
+        Raises:
+            CorruptArchiveError: If the archive is invalid or uses an unsupported feature.
+        """
+        self._buffer += data
+        while self._step():
+            pass
+
+    def close(self):
+        """
+        Checks that the whole archive was processed.
+
+        Raises:
+            CorruptArchiveError: If the archive is truncated.
+        """
+        if self._state != "done":
+            self._abort_entry()
+            raise CorruptArchiveError("The archive is truncated.")
+
+    def _step(self):
+        """Processes the buffer. Returns whether progress was made."""
+        if self._state == "header":
+            return self._read_header()
+        if self._state == "data":
+            return self._read_data()
+        if self._state == "descriptor":
+            return self._read_descriptor()
+        # Nothing is needed after the local entries (central directory)
+        self._buffer.clear()
+        return False
+
+    def _read_header(self):
+        """Parses a local file header."""
+        if len(self._buffer) < 4:
+            return False
+        (signature,) = struct.unpack_from("<I", self._buffer)
+        if signature in _END_SIGNATURES:
+            self._state = "done"
+            return True
+        if signature != _LOCAL_HEADER_SIGNATURE:
+            raise CorruptArchiveError("Invalid local file header signature.")
+        if len(self._buffer) < _LOCAL_HEADER.size:
+            return False
+
+        (
+            _,
+            _,
+            flags,
+            method,
+            _,
+            _,
+            crc,
+            compressed_size,
+            _,
+            name_length,
+            extra_length,
+        ) = _LOCAL_HEADER.unpack_from(self._buffer)
+        header_size = _LOCAL_HEADER.size + name_length + extra_length
+        if len(self._buffer) < header_size:
+            return False
+
+        raw_name = bytes(
+            self._buffer[_LOCAL_HEADER.size : _LOCAL_HEADER.size + name_length]
+        )
+        extra = bytes(self._buffer[_LOCAL_HEADER.size + name_length : header_size])
+        del self._buffer[:header_size]
+
+        zip64 = False
+        position = 0
+        while position + 4 <= len(extra):
+            header_id, size = struct.unpack_from("<HH", extra, position)
+            if header_id == 0x0001:
+                zip64 = True
+                if compressed_size == 0xFFFFFFFF and size >= 16:
+                    (compressed_size,) = struct.unpack_from("<Q", extra, position + 12)
+            position += 4 + size
+
+        if method not in (0, 8):
+            raise CorruptArchiveError(f"Unsupported compression method: {method}")
+
+        name = raw_name.decode("utf-8" if flags & 0x800 else "cp437")
+        self._entry = {
+            "name": name,
+            "crc": crc,
+            "zip64": zip64,
+            "descriptor": bool(flags & 0x08),
+            "remaining": None if flags & 0x08 else compressed_size,
+            "decompressor": zlib.decompressobj(-15) if method == 8 else None,
+            "computed_crc": 0,
+            "size": 0,
+            "head": bytearray(),
+            "file": None,
+        }
+        self._open_entry()
+        self._state = "data"
+        return True
+
+    def _open_entry(self):
+        """Opens the output of the current entry."""
+        entry = self._entry
+        if entry["name"].endswith("/"):
+            return
+
+        parts = [part for part in entry["name"].split("/") if part]
+        entry["series"] = _safe_name(parts[-2]) if len(parts) > 1 else ""
+        entry["filename"] = _safe_name(parts[-1])
+        if self.write_files:
+            directory = os.path.join(self.output_dir, entry["series"])
+            os.makedirs(directory, exist_ok=True)
+            entry["path"] = os.path.join(directory, entry["filename"])
+            entry["file"] = open(f"{entry['path']}.part", "wb")
+
+    def _write(self, data):
+        """Writes uncompressed data of the current entry."""
+        entry = self._entry
+        if not data:
+            return
+        entry["computed_crc"] = zlib.crc32(data, entry["computed_crc"])
+        entry["size"] += len(data)
+        if len(entry["head"]) < _HEAD_SIZE:
+            entry["head"] += data[: _HEAD_SIZE - len(entry["head"])]
+        if entry["file"] is not None:
+            entry["file"].write(data)
+            count(BYTES_WRITTEN, len(data))
+
+    def _read_data(self):
+        """Processes the data of the current entry."""
+        entry = self._entry
+        if not self._buffer:
+            return False
+
+        if entry["remaining"] is not None:
+            data = bytes(self._buffer[: entry["remaining"]])
+            del self._buffer[: len(data)]
+            entry["remaining"] -= len(data)
+            if entry["decompressor"] is not None:
+                data = entry["decompressor"].decompress(data)
+            self._write(data)
+            if entry["remaining"] == 0:
+                if entry["decompressor"] is not None:
+                    self._write(entry["decompressor"].flush())
+                if entry["descriptor"]:
+                    self._state = "descriptor"
+                else:
+                    self._finish_entry(entry["crc"])
+            return True
+
+        if entry["decompressor"] is not None:
+            decompressor = entry["decompressor"]
+            self._write(decompressor.decompress(bytes(self._buffer)))
+            self._buffer.clear()
+            if decompressor.eof:
+                self._buffer += decompressor.unused_data
+                self._state = "descriptor"
+            return True
+
+        return self._scan_stored_data()
+
+    def _scan_stored_data(self):
+        """
+        Processes stored data of unknown size, which ends at the data descriptor whose CRC
+        and size match the data read so far.
+        """
+        entry = self._entry
+        size_format = "<QQ" if entry["zip64"] else "<II"
+        descriptor_size = 4 + 4 + struct.calcsize(size_format)
+
+        start = 0
+        while True:
+            index = self._buffer.find(_DESCRIPTOR_SIGNATURE, start)
+            if index < 0:
+                # Keep the bytes which could be the beginning of a signature
+                flushed = max(len(self._buffer) - 3, 0)
+                break
+            if len(self._buffer) < index + descriptor_size:
+                flushed = index
+                break
+
+            (crc,) = struct.unpack_from("<I", self._buffer, index + 4)
+            compressed_size, _ = struct.unpack_from(
+                size_format, self._buffer, index + 8
+            )
+            data_crc = zlib.crc32(self._buffer[:index], entry["computed_crc"])
+            if crc == data_crc and compressed_size == entry["size"] + index:
+                self._write(bytes(self._buffer[:index]))
+                del self._buffer[: index + descriptor_size]
+                self._finish_entry(crc)
+                return True
+            start = index + 1
+
+        if flushed == 0:
+            return False
+        self._write(bytes(self._buffer[:flushed]))
+        del self._buffer[:flushed]
+        return True
+
+    def _read_descriptor(self):
+        """Parses the data descriptor following the current entry."""
+        entry = self._entry
+        size_format = "<QQ" if entry["zip64"] else "<II"
+        offset = 4 if self._buffer[:4] == _DESCRIPTOR_SIGNATURE else 0
+        descriptor_size = offset + 4 + struct.calcsize(size_format)
+        if len(self._buffer) < max(descriptor_size, 4):
+            return False
+
+        (crc,) = struct.unpack_from("<I", self._buffer, offset)
+        del self._buffer[:descriptor_size]
+        self._finish_entry(crc)
+        return True
+
+    def _finish_entry(self, crc):
+        """Verifies the CRC of the current entry and publishes it."""
+        entry = self._entry
+        self._entry = None
+        self._state = "header"
+        if entry["file"] is not None:
+            entry["file"].close()
+
+        if entry["computed_crc"] != crc:
+            if entry["file"] is not None:
+                os.remove(f"{entry['path']}.part")
+            raise CorruptArchiveError(f"CRC mismatch for {entry['name']}.")
+        if entry["name"].endswith("/"):
+            return
+
+        if entry["file"] is not None:
+            os.replace(f"{entry['path']}.part", entry["path"])
+        self.manifest.append(
+            (entry["series"], entry["filename"], read_sop_instance_uid(entry["head"]))
+        )
+
+    def _abort_entry(self):
+        """Removes the partial output of the current entry."""
+        entry = self._entry
+        self._entry = None
+        if entry is not None and entry["file"] is not None:
+            entry["file"].close()
+            os.remove(f"{entry['path']}.part")
+
+
+def write_manifest(manifest, filename):
+    """
+    Writes the manifest of an extracted archive in CSV format.
+
+    Args:
+        manifest (list): (series, filename, sop_instance_uid) tuples.
+        filename (str): The path of the CSV file. Written atomically.
+    """
+    with open(f"{filename}.part", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(MANIFEST_COLUMNS)
+        writer.writerows(manifest)
+    os.replace(f"{filename}.part", filename)
+
+
+def extract_archive(
+    client,
+    study_id,
+    output_dir,
+    manifest_filename=None,
+    write_files=True,
+    chunk_size=CHUNK_SIZE,
+):
+    """
+    Streams the ZIP archive of a study from Orthanc straight into per-series folders.
+
+    No intermediate ZIP file is written. The CRC of every file is verified, and the manifest
+    is only written once the whole archive has been extracted, so it marks a complete
+    extraction.
+
+    Args:
+        client (BlockingOrthancClient): The client of your Orthanc server.
+        study_id (str): The internal Orthanc ID of the study.
+        output_dir (str): The directory where the series folders are written.
+        manifest_filename (str, optional): Path of the CSV manifest listing the series,
+            filename and SOP Instance UID of each file. Defaults to None (no manifest).
+        write_files (bool, optional): If False, only the manifest is produced.
+            Defaults to True.
+        chunk_size (int, optional): Size of the chunks read from the network, in bytes.
+            Defaults to 4 MiB.
+
+    Returns:
+        list: (series, filename, sop_instance_uid) tuples of the extracted files.
+
+    Raises:
+        CorruptArchiveError: If the archive is invalid or truncated.
+        OrthancError: If the transfer failed.
+    """
+    extractor = StreamingZipExtractor(output_dir, write_files=write_files)
+    try:
+        with client.open_archive(study_id) as response:
+            for chunk in response.iter_chunks(chunk_size):
+                extractor.feed(chunk)
+                count(BYTES_READ, len(chunk))
+        extractor.close()
+    except Exception:
+        extractor._abort_entry()
+        raise
+
+    if manifest_filename is not None:
+        write_manifest(extractor.manifest, manifest_filename)
+    return extractor.manifest
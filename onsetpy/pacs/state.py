@@ -0,0 +1,137 @@
+from datetime import datetime, timezone
+import sqlite3
+import threading
+
+STATUSES = ("found", "moved", "downloaded", "verified", "deleted")
+# Status of a study whose extraction failed before its first step, e.g. on its lookup
+PENDING = "pending"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    accession_number TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    orthanc_id TEXT,
+    output_file TEXT,
+    error TEXT,
+    {timestamps},
+    updated_at TEXT NOT NULL
+)
+""".format(timestamps=",\n    ".join(f"{status}_at TEXT" for status in STATUSES))
+
+
+class ExtractionState:
+    def __init__(self, filename):
+        """
+        Initializes the SQLite store recording the extraction progress of each study.
+
+        The status of a study goes through STATUSES in order: found in Orthanc, moved from
+        the remote PACS (skipped if the study was already in Orthanc), downloaded, verified and
+        deleted from Orthanc. Each status is recorded with its timestamp, so an interrupted
+        extraction can resume from the last completed step. The store can be shared between
+        threads.
+
+        Args:
+            filename (str): Path to the SQLite database. Created if it does not exist.
+        """
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            filename, check_same_thread=False, isolation_level=None
+        )
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Closes the database."""
+        self._connection.close()
+
+    def get(self, accession_number):
+        """
+        Returns the record of a study.
+
+        Args:
+            accession_number (str): The accession number of the study.
+
+        Returns:
+            dict or None: The record of the study, or None if it was never recorded.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM studies WHERE accession_number = ?", (accession_number,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def is_complete(self, accession_number):
+        """
+        Returns whether a study was fully extracted.
+
+        Args:
+            accession_number (str): The accession number of the study.
+
+        Returns:
+            bool: True if the study was downloaded, verified and deleted from Orthanc.
+        """
+        record = self.get(accession_number)
+        return record is not None and record["status"] == "deleted"
+
+    def update(self, accession_number, status, orthanc_id=None, output_file=None):
+        """
+        Records a new status for a study. The error of the study, if any, is cleared.
+
+        Args:
+            accession_number (str): The accession number of the study.
+            status (str): The new status, one of STATUSES.
+            orthanc_id (str, optional): The Orthanc ID of the study. Kept if None.
+            output_file (str, optional): The path of the archive. Kept if None.
+
+        Raises:
+            ValueError: If the status is unknown.
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status: {status}")
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._connection.execute(
+                f"""
+                INSERT INTO studies
+                    (accession_number, status, orthanc_id, output_file, {status}_at,
+                     updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (accession_number) DO UPDATE SET
+                    status = excluded.status,
+                    orthanc_id = COALESCE(excluded.orthanc_id, orthanc_id),
+                    output_file = COALESCE(excluded.output_file, output_file),
+                    error = NULL,
+                    {status}_at = excluded.{status}_at,
+                    updated_at = excluded.updated_at
+                """,
+                (accession_number, status, orthanc_id, output_file, now, now),
+            )
+
+    def record_error(self, accession_number, error):
+        """
+        Records the last error of a study, without changing its status. A study not
+        recorded yet is recorded with the PENDING status.
+
+        Args:
+            accession_number (str): The accession number of the study.
+            error (str): The description of the error.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT INTO studies (accession_number, status, error, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (accession_number) DO UPDATE SET
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+                """,
+                (accession_number, PENDING, str(error), now),
+            )
@@ -0,0 +1,94 @@
+"""Minimal HTTP server standing in for Orthanc in the tests."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        status, payload, headers = self.server.stub.respond(self, body)
+
+        self.send_response(status)
+        headers.setdefault("Content-Length", str(len(payload)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_DELETE = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class StubOrthanc:
+    def __init__(self):
+        """
+        HTTP server answering the registered routes with canned responses.
+
+        Attributes:
+            url (str): The base URL of the server.
+            requests (list): The requests received, as dictionaries with the method, path,
+                headers, body and client port.
+        """
+        self.routes = {}
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        )
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add(self, method, path, *responses):
+        """
+        Registers the responses of a route. The responses are returned in order, and the last
+        one is repeated.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The path of the route.
+            *responses: Responses, either (status, body[, headers]) tuples or callables
+                receiving the request dictionary and returning such a tuple. Dictionaries and
+                lists bodies are encoded in JSON.
+        """
+        self.routes[(method, path)] = list(responses)
+
+    def respond(self, handler, body):
+        """Builds the response of a request received by the handler."""
+        request = {
+            "method": handler.command,
+            "path": handler.path,
+            "headers": dict(handler.headers),
+            "body": body,
+            "port": handler.client_address[1],
+        }
+        self.requests.append(request)
+
+        responses = self.routes.get((handler.command, handler.path))
+        if not responses:
+            return 404, b"", {}
+        response = responses.pop(0) if len(responses) > 1 else responses[0]
+        if callable(response):
+            response = response(request)
+
+        status, payload = response[:2]
+        headers = dict(response[2]) if len(response) > 2 else {}
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode()
+            headers.setdefault("Content-Type", "application/json")
+        return status, payload, headers
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import unittest
+
+from onsetpy.pacs.aio import AsyncOrthancClient, BlockingOrthancClient
+from onsetpy.pacs.exceptions import (
+    OrthancConnectionError,
+    OrthancHTTPError,
+    OrthancJobError,
+    OrthancNotFoundError,
+    OrthancTimeoutError,
+    StudyNotFoundError,
+)
+from onsetpy.pacs.tests.orthanc_stub import StubOrthanc
+
+
+class TestAsyncOrthancClient(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubOrthanc().__enter__()
+
+    def tearDown(self):
+        self.stub.__exit__()
+
+    def _run(self, method, *args, **kwargs):
+        async def _call():
+            async with AsyncOrthancClient(self.stub.url, backoff_factor=0) as client:
+                return await getattr(client, method)(*args, **kwargs)
+
+        return asyncio.run(_call())
+
+    def test_find(self):
+        self.stub.add("POST", "/tools/find", (200, [{"ID": "study"}]))
+        self.assertEqual(self._run("find", "AN1"), [{"ID": "study"}])
+        query = json.loads(self.stub.requests[0]["body"])
+        self.assertEqual(query["Query"], {"AccessionNumber": "AN1"})
+        # Expanded, so the details of the studies come in the same round trip
+        self.assertTrue(query["Expand"])
+
+    def test_find_many(self):
+        def _answer(request):
+            accession_number = json.loads(request["body"])["Query"]["AccessionNumber"]
+            if accession_number == "BROKEN":
+                return 400, b"Bad request"
+            if accession_number == "MISSING":
+                return 200, []
+            return 200, [{"ID": accession_number}]
+
+        self.stub.add("POST", "/tools/find", _answer)
+        index = self._run(
+            "find_many", ["AN1", "AN2", "MISSING", "BROKEN", "AN1"], concurrency=2
+        )
+        self.assertEqual(
+            index, {"AN1": [{"ID": "AN1"}], "AN2": [{"ID": "AN2"}], "MISSING": []}
+        )
+        # Duplicated accession numbers are only looked up once
+        self.assertEqual(len(self.stub.requests), 4)
+
+    def test_retrieve(self):
+        self.stub.add(
+            "POST", "/modalities/PACS/query", (200, {"ID": "q", "Path": "/queries/q"})
+        )
+        self.stub.add("GET", "/queries/q/answers", (200, ["0"]))
+        self.stub.add("POST", "/queries/q/retrieve", (200, {"ID": "job"}))
+
+        self.assertEqual(self._run("retrieve", "PACS", "AN1", target_aet="ME"), "job")
+        self.assertEqual(
+            json.loads(self.stub.requests[-1]["body"]),
+            {"Asynchronous": True, "TargetAet": "ME"},
+        )
+
+    def test_retrieve_not_found(self):
+        self.stub.add(
+            "POST", "/modalities/PACS/query", (200, {"ID": "q", "Path": "/queries/q"})
+        )
+        self.stub.add("GET", "/queries/q/answers", (200, []))
+        with self.assertRaises(StudyNotFoundError) as context:
+            self._run("retrieve", "PACS", "AN1")
+        self.assertEqual(context.exception.modality, "PACS")
+
+    def test_wait_for_job(self):
+        self.stub.add(
+            "GET",
+            "/jobs/job",
+            (200, {"ID": "job", "State": "Running"}),
+            (200, {"ID": "job", "State": "Success"}),
+        )
+        job = self._run("wait_for_job", "job", initial_delay=0.01)
+        self.assertEqual(job["State"], "Success")
+
+    def test_wait_for_failed_job(self):
+        failed = {"ID": "job", "State": "Failure", "ErrorDescription": "C-MOVE refused"}
+        self.stub.add("GET", "/jobs/job", (200, failed))
+        with self.assertRaises(OrthancJobError) as context:
+            self._run("wait_for_job", "job", initial_delay=0.01)
+        self.assertEqual(context.exception.job, failed)
+
+    def test_wait_for_job_timeout(self):
+        self.stub.add("GET", "/jobs/job", (200, {"ID": "job", "State": "Running"}))
+        with self.assertRaises(OrthancTimeoutError):
+            self._run("wait_for_job", "job", timeout=0.05, initial_delay=0.01)
+
+    def test_iter_archive(self):
+        archive = bytes(range(256)) * 100
+        self.stub.add("GET", "/studies/s/archive", (200, archive))
+
+        async def _read():
+            async with AsyncOrthancClient(self.stub.url) as client:
+                return [
+                    chunk async for chunk in client.iter_archive("s", chunk_size=1000)
+                ]
+
+        chunks = asyncio.run(_read())
+        self.assertEqual(b"".join(chunks), archive)
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+
+    def test_delete_not_found(self):
+        with self.assertRaises(OrthancNotFoundError) as context:
+            self._run("delete_study", "missing")
+        self.assertEqual(context.exception.status, 404)
+
+    def test_retry_server_errors(self):
+        self.stub.add("POST", "/tools/find", (503, b"Busy"), (200, []))
+        self.assertEqual(self._run("find", "AN1"), [])
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_retries_exhausted(self):
+        self.stub.add("POST", "/tools/find", (500, b"Internal error"))
+        with self.assertRaises(OrthancHTTPError) as context:
+            self._run("find", "AN1")
+        self.assertEqual(context.exception.body, "Internal error")
+        self.assertEqual(len(self.stub.requests), 4)
+
+    def test_credentials(self):
+        self.stub.add("POST", "/tools/find", (200, []))
+
+        async def _call():
+            async with AsyncOrthancClient(
+                self.stub.url, username="user", password="pass:word"
+            ) as client:
+                await client.find("AN1")
+
+        asyncio.run(_call())
+        self.assertEqual(
+            self.stub.requests[0]["headers"]["Authorization"],
+            "Basic dXNlcjpwYXNzOndvcmQ=",
+        )
+
+    def test_connection_error(self):
+        async def _call():
+            async with AsyncOrthancClient(
+                "http://127.0.0.1:1", retries=1, backoff_factor=0
+            ) as client:
+                await client.find("AN1")
+
+        with self.assertRaises(OrthancConnectionError):
+            asyncio.run(_call())
+
+
+class TestBlockingOrthancClient(unittest.TestCase):
+    def test_blocking_calls(self):
+        with StubOrthanc() as stub, BlockingOrthancClient(stub.url) as client:
+            stub.add("POST", "/tools/find", (200, [{"ID": "study"}]))
+            stub.add("GET", "/studies/study/archive", (200, b"archive"))
+            stub.add("DELETE", "/studies/study", (200, {}))
+
+            self.assertEqual(client.find("AN1"), [{"ID": "study"}])
+            self.assertEqual(b"".join(client.iter_archive("study")), b"archive")
+            with client.open_archive("study") as response:
+                self.assertEqual(response.status, 200)
+                self.assertEqual(b"".join(response.iter_chunks(3)), b"archive")
+            client.delete_study("study")
+            with self.assertRaises(OrthancNotFoundError):
+                client.delete_study("missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
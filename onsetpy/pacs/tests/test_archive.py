@@ -0,0 +1,96 @@
+import io
+import os
+import re
+import tempfile
+import unittest
+import zipfile
+
+from onsetpy.pacs.aio import BlockingOrthancClient
+from onsetpy.pacs.archive import CorruptArchiveError, download_archive
+from onsetpy.pacs.tests.orthanc_stub import StubOrthanc
+
+
+def _make_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for i in range(3):
+            archive.writestr(f"PATIENT/STUDY/SERIES/IM{i}.dcm", os.urandom(1000))
+    return buffer.getvalue()
+
+
+class TestDownloadArchive(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubOrthanc().__enter__()
+        self.client = BlockingOrthancClient(self.stub.url, backoff_factor=0)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.temp_dir.name, "study.zip")
+        self.archive = _make_zip()
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.__exit__()
+        self.temp_dir.cleanup()
+
+    def _range_response(self, request):
+        requested = request["headers"].get("Range", "bytes=0-")
+        start = int(re.match(r"bytes=(\d+)-", requested).group(1))
+        content_range = f"bytes {start}-{len(self.archive) - 1}/{len(self.archive)}"
+        return 206, self.archive[start:], {"Content-Range": content_range}
+
+    def test_download(self):
+        self.stub.add("GET", "/studies/1/archive", (200, self.archive))
+        path = download_archive(self.client, "1", self.output)
+
+        self.assertEqual(path, os.path.abspath(self.output))
+        with open(self.output, "rb") as f:
+            self.assertEqual(f.read(), self.archive)
+        self.assertFalse(os.path.exists(self.output + ".part"))
+
+    def test_resume_existing_part(self):
+        with open(self.output + ".part", "wb") as f:
+            f.write(self.archive[:100])
+        self.stub.add("GET", "/studies/1/archive", self._range_response)
+        download_archive(self.client, "1", self.output)
+
+        self.assertEqual(self.stub.requests[0]["headers"]["Range"], "bytes=100-")
+        with open(self.output, "rb") as f:
+            self.assertEqual(f.read(), self.archive)
+
+    def test_range_not_supported(self):
+        with open(self.output + ".part", "wb") as f:
+            f.write(b"stale content")
+        self.stub.add("GET", "/studies/1/archive", (200, self.archive))
+        download_archive(self.client, "1", self.output)
+
+        with open(self.output, "rb") as f:
+            self.assertEqual(f.read(), self.archive)
+
+    def test_resume_interrupted_transfer(self):
+        truncated = (
+            200,
+            self.archive[:500],
+            {"Content-Length": str(len(self.archive)), "Connection": "close"},
+        )
+        self.stub.add("GET", "/studies/1/archive", truncated, self._range_response)
+        download_archive(self.client, "1", self.output, chunk_size=100)
+
+        # The bytes received before the connection closed may be dropped, so the
+        # transfer resumes from at most the truncated length
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertLessEqual(
+            int(self.stub.requests[1]["headers"].get("Range", "bytes=0-")[6:-1]), 500
+        )
+        with open(self.output, "rb") as f:
+            self.assertEqual(f.read(), self.archive)
+
+    def test_corrupt_archive(self):
+        self.stub.add("GET", "/studies/1/archive", (200, b"not a zip file"))
+        with self.assertRaises(CorruptArchiveError):
+            download_archive(self.client, "1", self.output)
+
+        self.assertFalse(os.path.exists(self.output))
+        self.assertFalse(os.path.exists(self.output + ".part"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import base64
+import unittest
+
+import requests
+
+from onsetpy.pacs.client import OrthancClient
+from onsetpy.pacs.tests.orthanc_stub import StubOrthanc
+
+
+class TestOrthancClient(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubOrthanc().__enter__()
+        self.client = OrthancClient(
+            self.stub.url, username="user", password="secret", backoff_factor=0
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.__exit__()
+
+    def test_get_json(self):
+        self.stub.add("GET", "/studies/1", (200, {"ID": "1"}))
+        self.assertEqual(self.client.get("/studies/1").json(), {"ID": "1"})
+
+    def test_auth_set_once(self):
+        self.stub.add("GET", "/system", (200, {}))
+        self.client.get("/system")
+        expected = "Basic " + base64.b64encode(b"user:secret").decode()
+        self.assertEqual(self.stub.requests[0]["headers"]["Authorization"], expected)
+
+    def test_connection_reused(self):
+        self.stub.add("GET", "/system", (200, {}))
+        for _ in range(3):
+            self.client.get("/system")
+        self.assertEqual(len({request["port"] for request in self.stub.requests}), 1)
+
+    def test_retry_on_server_error(self):
+        self.stub.add("POST", "/tools/find", (503, b""), (502, b""), (200, ["1"]))
+        response = self.client.post("/tools/find", data="{}")
+        self.assertEqual(response.json(), ["1"])
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_retries_exhausted(self):
+        self.stub.add("DELETE", "/studies/1", (500, b""))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.client.delete("/studies/1")
+        self.assertEqual(len(self.stub.requests), 4)
+
+    def test_no_retry_on_client_error(self):
+        self.stub.add("GET", "/studies/1", (404, b""))
+        with self.assertRaises(requests.exceptions.HTTPError) as context:
+            self.client.get("/studies/1")
+        self.assertEqual(context.exception.response.status_code, 404)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_connection_error(self):
+        client = OrthancClient("http://127.0.0.1:1", retries=0)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.get("/system")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import csv
+import io
+import os
+import struct
+import tempfile
+import unittest
+import zipfile
+
+from onsetpy.pacs.archive import CorruptArchiveError
+from onsetpy.pacs.aio import BlockingOrthancClient
+from onsetpy.pacs.extract import (
+    StreamingZipExtractor,
+    extract_archive,
+    read_sop_instance_uid,
+)
+from onsetpy.pacs.tests.orthanc_stub import StubOrthanc
+
+
+def _make_dicom(sop_instance_uid, size=2000):
+    uid = sop_instance_uid.encode("ascii")
+    if len(uid) % 2:
+        uid += b"\x00"
+    meta = (
+        struct.pack("<HH2sH", 0x0002, 0x0001, b"OB", 0)
+        + struct.pack("<I", 2)
+        + b"\x00\x01"
+    )
+    meta += struct.pack("<HH2sH", 0x0002, 0x0003, b"UI", len(uid)) + uid
+    group_length = struct.pack("<HH2sHI", 0x0002, 0x0000, b"UL", 4, len(meta))
+    header = b"\x00" * 128 + b"DICM" + group_length + meta
+    # Include descriptor signatures in the content to exercise the stored-data scan
+    return header + (b"PK\x07\x08" + os.urandom(60)) * (size // 64)
+
+
+class _Unseekable(io.RawIOBase):
+    """Forces zipfile to write data descriptors, like a streaming Orthanc archive."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def _make_zip(files, compression=zipfile.ZIP_DEFLATED, streamed=False):
+    output = _Unseekable() if streamed else io.BytesIO()
+    with zipfile.ZipFile(output, "w", compression=compression) as archive:
+        archive.writestr("PATIENT/STUDY/", b"")
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return (output.buffer if streamed else output).getvalue()
+
+
+class TestStreamingZipExtractor(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.files = {
+            "PATIENT/STUDY/MR T1/IM0.dcm": _make_dicom("1.2.3.1"),
+            "PATIENT/STUDY/MR T1/IM1.dcm": _make_dicom("1.2.3.2"),
+            "PATIENT/STUDY/MR DWI/IM0.dcm": _make_dicom("1.2.3.3", size=5000),
+        }
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _extract(self, archive, chunk_size, write_files=True):
+        extractor = StreamingZipExtractor(self.temp_dir.name, write_files=write_files)
+        for i in range(0, len(archive), chunk_size):
+            extractor.feed(archive[i : i + chunk_size])
+        extractor.close()
+        return extractor.manifest
+
+    def _assert_extracted(self, manifest):
+        self.assertEqual(
+            manifest,
+            [
+                ("MR T1", "IM0.dcm", "1.2.3.1"),
+                ("MR T1", "IM1.dcm", "1.2.3.2"),
+                ("MR DWI", "IM0.dcm", "1.2.3.3"),
+            ],
+        )
+        for name, data in self.files.items():
+            series, filename = name.split("/")[-2:]
+            with open(os.path.join(self.temp_dir.name, series, filename), "rb") as f:
+                self.assertEqual(f.read(), data)
+
+    def test_extract(self):
+        for compression in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+            for streamed in (False, True):
+                archive = _make_zip(self.files, compression, streamed)
+                for chunk_size in (1, 7, 4096, len(archive)):
+                    with self.subTest(
+                        compression=compression,
+                        streamed=streamed,
+                        chunk_size=chunk_size,
+                    ):
+                        self._assert_extracted(self._extract(archive, chunk_size))
+
+    def test_manifest_only(self):
+        archive = _make_zip(self.files, streamed=True)
+        manifest = self._extract(archive, 1000, write_files=False)
+
+        self.assertEqual(
+            [uid for _, _, uid in manifest], ["1.2.3.1", "1.2.3.2", "1.2.3.3"]
+        )
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_truncated_archive(self):
+        archive = _make_zip(self.files, streamed=True)
+        extractor = StreamingZipExtractor(self.temp_dir.name)
+        extractor.feed(archive[: len(archive) // 2])
+        with self.assertRaises(CorruptArchiveError):
+            extractor.close()
+
+        leftovers = [f for _, _, files in os.walk(self.temp_dir.name) for f in files]
+        self.assertFalse([f for f in leftovers if f.endswith(".part")])
+
+    def test_crc_mismatch(self):
+        archive = bytearray(_make_zip(self.files, zipfile.ZIP_STORED))
+        archive[500] ^= 0xFF
+        with self.assertRaises(CorruptArchiveError):
+            self._extract(bytes(archive), 4096)
+
+    def test_invalid_archive(self):
+        with self.assertRaises(CorruptArchiveError):
+            self._extract(b"not a zip archive", 4096)
+
+
+class TestReadSopInstanceUid(unittest.TestCase):
+    def test_read(self):
+        self.assertEqual(
+            read_sop_instance_uid(_make_dicom("1.2.840.10008.1")), "1.2.840.10008.1"
+        )
+
+    def test_not_dicom(self):
+        self.assertIsNone(read_sop_instance_uid(b"\x00" * 200))
+
+
+class TestExtractArchive(unittest.TestCase):
+    def test_extract_archive(self):
+        files = {"P/S/SERIES/IM0.dcm": _make_dicom("1.2.3.1")}
+        archive = _make_zip(files, streamed=True)
+        with StubOrthanc() as stub, BlockingOrthancClient(stub.url) as client:
+            stub.add("GET", "/studies/1/archive", (200, archive))
+            with tempfile.TemporaryDirectory() as temp_dir:
+                manifest_filename = os.path.join(temp_dir, "manifest.csv")
+                extract_archive(client, "1", temp_dir, manifest_filename)
+
+                self.assertTrue(
+                    os.path.exists(os.path.join(temp_dir, "SERIES", "IM0.dcm"))
+                )
+                with open(manifest_filename, newline="") as f:
+                    rows = list(csv.reader(f))
+                self.assertEqual(
+                    rows,
+                    [
+                        ["series", "filename", "sop_instance_uid"],
+                        ["SERIES", "IM0.dcm", "1.2.3.1"],
+                    ],
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,303 @@
+import csv
+from functools import lru_cache
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from onsetpy.cli.main import run_command
+from onsetpy.pacs.state import PENDING, ExtractionState
+from onsetpy.pacs.tests.orthanc_stub import StubOrthanc
+from onsetpy.pacs.tests.test_extract import _make_dicom, _make_zip
+
+STORED = "AN000000000001"
+REMOTE = "AN000000000002"
+OTHER_REMOTE = "AN000000000003"
+UNKNOWN = "AN000000000004"
+REFUSED = "AN000000000005"
+
+
+@lru_cache(maxsize=None)
+def _archive(accession_number):
+    return _make_zip(
+        {f"P/{accession_number}/SERIES/IM0.dcm": _make_dicom(f"1.2.{accession_number}")}
+    )
+
+
+class _Orthanc:
+    def __init__(self, stub, stored=(), remote=(), refused=()):
+        """
+        Orthanc answering the routes used by the extraction, with a remote PACS to C-MOVE
+        studies from.
+
+        Args:
+            stub (StubOrthanc): The stub server.
+            stored (iterable): Accession numbers of the studies already in Orthanc.
+            remote (iterable): Accession numbers of the studies on the remote PACS, stored
+                once their retrieve job succeeded.
+            refused (iterable): Accession numbers of the studies whose retrieve job fails.
+
+        Attributes:
+            max_moves (int): Maximum number of retrieve jobs seen running at once.
+        """
+        self.stub = stub
+        self.stored = set(stored)
+        self.max_moves = 0
+        self._moves = 0
+        self._lock = threading.Lock()
+        stub.add("POST", "/tools/find", self._find)
+        stub.add("POST", "/modalities/PACS/query", self._query)
+        for accession_number in self.stored | set(remote) | set(refused):
+            study_id = f"id-{accession_number}"
+            stub.add(
+                "GET", f"/studies/{study_id}/archive", (200, _archive(accession_number))
+            )
+            stub.add("DELETE", f"/studies/{study_id}", (200, {}))
+        for accession_number in set(remote) | set(refused):
+            query = f"/queries/{accession_number}"
+            stub.add("GET", f"{query}/answers", (200, ["0"]))
+            stub.add("POST", f"{query}/retrieve", self._retrieve(accession_number))
+            stub.add(
+                "GET",
+                f"/jobs/job-{accession_number}",
+                (200, {"ID": f"job-{accession_number}", "State": "Running"}),
+                self._complete(accession_number, accession_number not in refused),
+            )
+        stub.add("GET", f"/queries/{UNKNOWN}/answers", (200, []))
+
+    def _find(self, request):
+        accession_number = json.loads(request["body"])["Query"]["AccessionNumber"]
+        with self._lock:
+            stored = accession_number in self.stored
+        return 200, [{"ID": f"id-{accession_number}"}] if stored else []
+
+    def _query(self, request):
+        accession_number = json.loads(request["body"])["Query"]["AccessionNumber"]
+        return 200, {"ID": accession_number, "Path": f"/queries/{accession_number}"}
+
+    def _retrieve(self, accession_number):
+        def _answer(request):
+            with self._lock:
+                self._moves += 1
+                self.max_moves = max(self.max_moves, self._moves)
+            return 200, {"ID": f"job-{accession_number}"}
+
+        return _answer
+
+    def _complete(self, accession_number, success):
+        def _answer(request):
+            with self._lock:
+                self._moves -= 1
+                if success:
+                    self.stored.add(accession_number)
+            state = "Success" if success else "Failure"
+            return 200, {"ID": f"job-{accession_number}", "State": state}
+
+        return _answer
+
+    def count(self, method, path):
+        """Number of requests received on a route."""
+        return sum(
+            request["method"] == method and request["path"] == path
+            for request in self.stub.requests
+        )
+
+
+class TestExtractPatientsFromPacs(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_folder = os.path.join(self.temp_dir.name, "output")
+        self.stub = StubOrthanc().__enter__()
+
+    def tearDown(self):
+        self.stub.__exit__()
+        self.temp_dir.cleanup()
+
+    def _run(self, rows, *args, expected_exit_code=0):
+        csv_path = os.path.join(self.temp_dir.name, "patients.csv")
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Patient Name", "session", "AccessionNumber"])
+            writer.writerows(rows)
+        exit_code = run_command(
+            "extract_patients_from_pacs",
+            [
+                csv_path,
+                self.output_folder,
+                "--orthanc_url",
+                self.stub.url,
+                "--orthanc_username",
+                "user",
+                "--orthanc_password",
+                "password",
+                "--remote_aet_name",
+                "PACS",
+                "--my_orthanc_aet",
+                "ME",
+                *args,
+            ],
+        )
+        self.assertEqual(exit_code, expected_exit_code)
+
+    def _output(self, patient, session, accession_number, extension="zip"):
+        return os.path.join(
+            self.output_folder, patient, session, f"{accession_number}.{extension}"
+        )
+
+    def _state(self):
+        return ExtractionState(
+            os.path.join(self.output_folder, ".extraction_state.sqlite")
+        )
+
+    def test_extract(self):
+        orthanc = _Orthanc(self.stub, stored=[STORED], remote=[REMOTE])
+        self._run(
+            [["P1", "S1", STORED], ["P1", "S1", REMOTE], ["P2", "S1", STORED]],
+            "--workers",
+            "3",
+        )
+
+        for output in (
+            self._output("P1", "S1", STORED),
+            self._output("P2", "S1", STORED),
+            self._output("P1", "S1", REMOTE),
+        ):
+            with open(output, "rb") as f:
+                self.assertEqual(f.read(), _archive(os.path.basename(output)[:14]))
+        # The study listed twice is extracted once, then copied
+        self.assertEqual(orthanc.count("GET", f"/studies/id-{STORED}/archive"), 1)
+        self.assertEqual(orthanc.count("DELETE", f"/studies/id-{STORED}"), 1)
+        # The retrieved study is only looked up once its job succeeded
+        self.assertEqual(orthanc.count("GET", f"/jobs/job-{REMOTE}"), 2)
+        self.assertEqual(orthanc.count("DELETE", f"/studies/id-{REMOTE}"), 1)
+        with self._state() as state:
+            self.assertTrue(state.is_complete(STORED))
+            self.assertEqual(state.get(REMOTE)["orthanc_id"], f"id-{REMOTE}")
+            self.assertIsNotNone(state.get(REMOTE)["moved_at"])
+            self.assertTrue(state.is_complete(REMOTE))
+
+    def test_duplicated_study_series_layout(self):
+        _Orthanc(self.stub, stored=[STORED])
+        self._run([["P1", "S1", STORED], ["P2", "S2", STORED]], "--layout", "series")
+
+        for patient, session in (("P1", "S1"), ("P2", "S2")):
+            manifest = self._output(patient, session, f"{STORED}_manifest", "csv")
+            with open(manifest, newline="") as f:
+                self.assertEqual(list(csv.reader(f))[1][:2], ["SERIES", "IM0.dcm"])
+            self.assertTrue(
+                os.path.exists(
+                    os.path.join(os.path.dirname(manifest), "SERIES", "IM0.dcm")
+                )
+            )
+
+    def test_max_moves(self):
+        orthanc = _Orthanc(self.stub, remote=[REMOTE, OTHER_REMOTE])
+        self._run(
+            [["P1", "S1", REMOTE], ["P2", "S1", OTHER_REMOTE]],
+            "--workers",
+            "2",
+            "--max_moves",
+            "1",
+        )
+
+        self.assertTrue(os.path.exists(self._output("P1", "S1", REMOTE)))
+        self.assertTrue(os.path.exists(self._output("P2", "S1", OTHER_REMOTE)))
+        self.assertEqual(orthanc.max_moves, 1)
+
+    def test_existing_output_skipped(self):
+        orthanc = _Orthanc(self.stub, stored=[STORED])
+        output = self._output("P1", "S1", STORED)
+        os.makedirs(os.path.dirname(output))
+        with open(output, "wb") as f:
+            f.write(b"existing")
+        self._run([["P1", "S1", STORED]])
+
+        with open(output, "rb") as f:
+            self.assertEqual(f.read(), b"existing")
+        self.assertEqual(orthanc.count("POST", "/tools/find"), 0)
+        self.assertEqual(orthanc.count("DELETE", f"/studies/id-{STORED}"), 0)
+
+    def test_failed_studies(self):
+        _Orthanc(self.stub, stored=[STORED], refused=[REFUSED])
+        self._run(
+            [["P1", "S1", UNKNOWN], ["P1", "S1", REFUSED], ["P1", "S1", STORED]],
+            "--workers",
+            "3",
+        )
+
+        # The other studies are still extracted
+        self.assertTrue(os.path.exists(self._output("P1", "S1", STORED)))
+        self.assertFalse(os.path.exists(self._output("P1", "S1", UNKNOWN)))
+        self.assertFalse(os.path.exists(self._output("P1", "S1", REFUSED)))
+        # The errors are recorded although the studies never reached a status
+        with self._state() as state:
+            for accession_number in (UNKNOWN, REFUSED):
+                record = state.get(accession_number)
+                self.assertEqual(record["status"], PENDING)
+                self.assertEqual(record["error"], "Extraction failed")
+
+        # A study with only an error recorded starts over on the next run
+        self.stub.requests.clear()
+        self._run([["P1", "S1", UNKNOWN]])
+        self.assertEqual(
+            json.loads(self.stub.requests[0]["body"])["Query"],
+            {"AccessionNumber": UNKNOWN},
+        )
+
+    def _seed_state(self, accession_number, *statuses, **kwargs):
+        os.makedirs(self.output_folder, exist_ok=True)
+        with self._state() as state:
+            for status in statuses:
+                state.update(accession_number, status, **kwargs)
+
+    def test_resume_deleted(self):
+        _Orthanc(self.stub, stored=[STORED])
+        output = self._output("P1", "S1", STORED)
+        self._seed_state(STORED, "found", "deleted", orthanc_id=f"id-{STORED}")
+        self._run([["P1", "S1", STORED]])
+
+        self.assertEqual(self.stub.requests, [])
+        self.assertFalse(os.path.exists(output))
+
+    def test_resume_verified(self):
+        _Orthanc(self.stub, stored=[STORED])
+        output = self._output("P1", "S1", STORED)
+        os.makedirs(os.path.dirname(output))
+        with open(output, "wb") as f:
+            f.write(_archive(STORED))
+        self._seed_state(
+            STORED, "found", "verified", orthanc_id=f"id-{STORED}", output_file=output
+        )
+        self._run([["P1", "S1", STORED]])
+
+        # Only the deletion from Orthanc was left
+        self.assertEqual(
+            [(r["method"], r["path"]) for r in self.stub.requests],
+            [("DELETE", f"/studies/id-{STORED}")],
+        )
+        with self._state() as state:
+            self.assertTrue(state.is_complete(STORED))
+
+    def test_resume_found_or_moved(self):
+        orthanc = _Orthanc(self.stub, stored=[STORED, REMOTE])
+        self._seed_state(STORED, "found", orthanc_id=f"id-{STORED}")
+        self._seed_state(REMOTE, "moved", orthanc_id=f"id-{REMOTE}")
+        self._run([["P1", "S1", STORED], ["P1", "S1", REMOTE]])
+
+        # The recorded Orthanc IDs are downloaded without a new lookup or C-MOVE
+        self.assertEqual(orthanc.count("POST", "/tools/find"), 0)
+        self.assertEqual(orthanc.count("POST", "/modalities/PACS/query"), 0)
+        for accession_number in (STORED, REMOTE):
+            with open(self._output("P1", "S1", accession_number), "rb") as f:
+                self.assertEqual(f.read(), _archive(accession_number))
+            self.assertEqual(
+                orthanc.count("DELETE", f"/studies/id-{accession_number}"), 1
+            )
+
+    def test_invalid_workers(self):
+        self._run([["P1", "S1", STORED]], "--workers", "0", expected_exit_code=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
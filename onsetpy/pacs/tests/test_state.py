@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+from onsetpy.pacs.state import PENDING, ExtractionState
+
+
+class TestExtractionState(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, "state.sqlite")
+        self.state = ExtractionState(self.filename)
+
+    def tearDown(self):
+        self.state.close()
+        self.temp_dir.cleanup()
+
+    def test_unknown_study(self):
+        self.assertIsNone(self.state.get("A1"))
+        self.assertFalse(self.state.is_complete("A1"))
+
+    def test_status_progression(self):
+        self.state.update("A1", "moved", orthanc_id="id-1")
+        self.state.update("A1", "downloaded")
+        self.state.update("A1", "verified", output_file="/data/A1.zip")
+
+        record = self.state.get("A1")
+        self.assertEqual(record["status"], "verified")
+        self.assertEqual(record["orthanc_id"], "id-1")
+        self.assertEqual(record["output_file"], "/data/A1.zip")
+        self.assertIsNotNone(record["moved_at"])
+        self.assertIsNotNone(record["verified_at"])
+        self.assertIsNone(record["found_at"])
+        self.assertFalse(self.state.is_complete("A1"))
+
+        self.state.update("A1", "deleted")
+        self.assertTrue(self.state.is_complete("A1"))
+
+    def test_record_error(self):
+        self.state.update("A1", "found", orthanc_id="id-1")
+        self.state.record_error("A1", "Connection reset")
+        self.assertEqual(self.state.get("A1")["error"], "Connection reset")
+
+        self.state.update("A1", "downloaded")
+        self.assertIsNone(self.state.get("A1")["error"])
+
+    def test_record_error_before_first_status(self):
+        self.state.record_error("A1", "Lookup failed")
+        record = self.state.get("A1")
+        self.assertEqual(record["status"], PENDING)
+        self.assertEqual(record["error"], "Lookup failed")
+        self.assertFalse(self.state.is_complete("A1"))
+
+        self.state.update("A1", "found", orthanc_id="id-1")
+        record = self.state.get("A1")
+        self.assertEqual(record["status"], "found")
+        self.assertIsNone(record["error"])
+
+    def test_unknown_status(self):
+        with self.assertRaises(ValueError):
+            self.state.update("A1", "unknown")
+
+    def test_persistence(self):
+        self.state.update("A1", "deleted", orthanc_id="id-1")
+        self.state.close()
+
+        with ExtractionState(self.filename) as state:
+            self.assertTrue(state.is_complete("A1"))
+        self.state = ExtractionState(self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+"""
+Single-process EpInsight pipeline.
+
+Runs the Freesurfer statistics conversion, the cortical asymmetry evaluation, the screenshots
+and the report generation in one process. DataFrames and figures are passed in memory
+between the stages, and the intermediate files are only written when requested.
+"""
+
+from datetime import datetime
+import io
+import json
+import os
+
+import matplotlib.pyplot as plt
+
+from onsetpy.instrumentation import BYTES_WRITTEN, count, stage, timed
+from onsetpy.scripts.onset_convert_fs_stats import (
+    load_aparc_stats,
+    load_aseg_stats,
+    save_stats,
+)
+from onsetpy.scripts.onset_epinsight_screenshots import render_screenshots
+from onsetpy.scripts.onset_evaluate_cortical_measures import (
+    ROI_MAPPING,
+    evaluate_asymmetry,
+    plot_asymmetry_index,
+)
+
+INTERMEDIATE_FILES = {
+    "aparc": "aparc.csv",
+    "aseg": "aseg.csv",
+    "asymmetry_index": "asymmetry_index.json",
+    "asymmetry_figure": "asymmetry_index.png",
+    "brain_screenshot": "brain_screenshot.png",
+}
+
+
+@timed("encode_png")
+def _figure_to_png(figure, dpi=None):
+    """Encode a matplotlib figure as PNG and close it.
+
+    Args:
+        figure (matplotlib.figure.Figure): Figure to encode.
+        dpi (float, optional): Resolution of the image. Defaults to the figure resolution.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png", dpi=dpi)
+    plt.close(figure)
+    return buffer.getvalue()
+
+
+def run_stages(
+    lh_fs_stats,
+    rh_fs_stats,
+    aseg_fs_stats,
+    image_paths,
+    titles,
+    cmaps,
+    coords,
+    sid=None,
+    asymmetry_threshold=10,
+    intermediate_dir=None,
+):
+    """Run the EpInsight stages preceding the report.
+
+    Args:
+        lh_fs_stats (str): Path to the left hemisphere Freesurfer statistics file.
+        rh_fs_stats (str): Path to the right hemisphere Freesurfer statistics file.
+        aseg_fs_stats (str): Path to the Freesurfer aseg statistics file.
+        image_paths (list): Paths to the NIfTI images of the brain screenshot.
+        titles (list): Titles for each image.
+        cmaps (list): Colormaps for each image.
+        coords (tuple): Coordinates (x, y, z) for the slices.
+        sid (str, optional): Subject ID. Defaults to None.
+        asymmetry_threshold (float, optional): Asymmetry threshold. Defaults to 10.
+        intermediate_dir (str, optional): Directory where the intermediate files are written
+            for debugging. Defaults to None (nothing is written).
+
+    Returns:
+        dict: The results of each stage, indexed like INTERMEDIATE_FILES. Tables are
+              DataFrames, the asymmetry index is a list of records and figures are PNG bytes.
+    """
+    aparc = load_aparc_stats(lh_fs_stats, rh_fs_stats, sid)
+    aseg = load_aseg_stats(aseg_fs_stats, sid)
+
+    df_combined, df_aparc = evaluate_asymmetry(aparc, aseg, asymmetry_threshold)
+    asymmetry_figure = _figure_to_png(
+        plot_asymmetry_index(df_combined, df_aparc.index, ROI_MAPPING), dpi=300
+    )
+    df_combined.index.names = ["roi"]
+    asymmetry_index = df_combined.reset_index().to_dict(orient="records")
+
+    brain_screenshot = _figure_to_png(
+        render_screenshots(image_paths, titles, cmaps, tuple(coords))
+    )
+
+    results = {
+        "aparc": aparc,
+        "aseg": aseg,
+        "asymmetry_index": asymmetry_index,
+        "asymmetry_figure": asymmetry_figure,
+        "brain_screenshot": brain_screenshot,
+    }
+    if intermediate_dir is not None:
+        write_intermediates(results, intermediate_dir)
+    return results
+
+
+@timed()
+def write_intermediates(results, output_dir):
+    """Write the results of the stages in the format of the standalone scripts.
+
+    Args:
+        results (dict): Results returned by run_stages.
+        output_dir (str): Output directory.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {
+        key: os.path.join(output_dir, name) for key, name in INTERMEDIATE_FILES.items()
+    }
+
+    save_stats(results["aparc"], paths["aparc"])
+    save_stats(results["aseg"], paths["aseg"])
+    with open(paths["asymmetry_index"], "w") as f:
+        json.dump(results["asymmetry_index"], f, indent=4)
+    for key in ["asymmetry_figure", "brain_screenshot"]:
+        with open(paths[key], "wb") as f:
+            f.write(results[key])
+        count(BYTES_WRITTEN, len(results[key]))
+
+
+def write_report(
+    results,
+    output_report,
+    patient_name="Not available",
+    patient_id="Not available",
+    map18_figures=None,
+):
+    """Render the EpInsight report from the in-memory results of the stages.
+
+    Args:
+        results (dict): Results returned by run_stages.
+        output_report (str): Path to the output PDF report.
+        patient_name (str, optional): Patient name. Defaults to "Not available".
+        patient_id (str, optional): Patient ID. Defaults to "Not available".
+        map18_figures (list, optional): Paths to the map18 figures, or the figures
+            themselves. Defaults to None.
+    """
+    from onsetpy.reporting.report import EpinsightReport
+
+    report = EpinsightReport(
+        patient_name, patient_id, datetime.now().strftime("%d-%m-%Y")
+    )
+    with stage("render_html"):
+        report.render(
+            results["asymmetry_index"],
+            results["asymmetry_figure"],
+            map18_figures or [],
+            results["brain_screenshot"],
+        )
+    report.to_pdf(output_report)
+
+
+def run_epinsight(
+    lh_fs_stats,
+    rh_fs_stats,
+    aseg_fs_stats,
+    image_paths,
+    titles,
+    cmaps,
+    coords,
+    output_report,
+    sid=None,
+    patient_name="Not available",
+    patient_id="Not available",
+    map18_figures=None,
+    asymmetry_threshold=10,
+    intermediate_dir=None,
+):
+    """Run the whole EpInsight pipeline, from the Freesurfer statistics to the report.
+
+    See run_stages and write_report for the description of the arguments.
+
+    Returns:
+        dict: The results of the stages.
+    """
+    results = run_stages(
+        lh_fs_stats,
+        rh_fs_stats,
+        aseg_fs_stats,
+        image_paths,
+        titles,
+        cmaps,
+        coords,
+        sid=sid,
+        asymmetry_threshold=asymmetry_threshold,
+        intermediate_dir=intermediate_dir,
+    )
+    write_report(
+        results,
+        output_report,
+        patient_name=patient_name,
+        patient_id=patient_id,
+        map18_figures=map18_figures,
+    )
+    return results
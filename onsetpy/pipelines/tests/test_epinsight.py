@@ -0,0 +1,139 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import nibabel as nib
+import numpy as np
+
+from onsetpy.cli.main import run_command
+from onsetpy.pipelines.epinsight import (
+    INTERMEDIATE_FILES,
+    run_epinsight,
+    run_stages,
+)
+
+
+def _write_aparc_stats(filename, thicknesses):
+    with open(filename, "w") as f:
+        f.write("# Freesurfer aparc statistics\n")
+        for roi, thickness in thicknesses.items():
+            f.write(f"{roi} 1000 800.0 2500 {thickness} 0.5 0.1 0.0 10 1.0\n")
+
+
+def _write_aseg_stats(filename, volumes):
+    with open(filename, "w") as f:
+        f.write("# Freesurfer aseg statistics\n")
+        for i, (roi, volume) in enumerate(volumes.items()):
+            f.write(f"{i + 1} {i + 10} 100 {volume} {roi} 80.0 10.0 20.0 120.0 100.0\n")
+
+
+class TestEpinsightPipeline(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.lh = os.path.join(self.temp_dir.name, "lh.aparc.stats")
+        self.rh = os.path.join(self.temp_dir.name, "rh.aparc.stats")
+        self.aseg = os.path.join(self.temp_dir.name, "aseg.stats")
+        self.image = os.path.join(self.temp_dir.name, "t1.nii.gz")
+
+        _write_aparc_stats(self.lh, {"G_cuneus": 2.0, "G_rectus": 2.5})
+        _write_aparc_stats(self.rh, {"G_cuneus": 3.0, "G_rectus": 2.5})
+        _write_aseg_stats(
+            self.aseg,
+            {
+                "Left-Hippocampus": 4000.0,
+                "Right-Hippocampus": 3000.0,
+                "Left-Putamen": 5000.0,
+                "Right-Putamen": 5000.0,
+                "CSF": 0.0,
+            },
+        )
+        data = np.random.default_rng(0).random((10, 10, 10)) + 1
+        nib.save(nib.Nifti1Image(data, np.eye(4)), self.image)
+
+        self.stage_args = (
+            self.lh,
+            self.rh,
+            self.aseg,
+            [self.image],
+            ["T1"],
+            ["gray"],
+            (5, 5, 5),
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_run_stages_in_memory(self):
+        results = run_stages(*self.stage_args, sid="sub-01")
+
+        self.assertEqual(list(results["aparc"]["sid"].unique()), ["sub-01"])
+        self.assertEqual(len(results["aseg"]), 5)
+        self.assertEqual(
+            [record["roi"] for record in results["asymmetry_index"]],
+            ["Cuneus (O6)", "Hippocampus proper"],
+        )
+        self.assertAlmostEqual(results["asymmetry_index"][0]["asymmetry_index"], 50)
+        self.assertTrue(results["asymmetry_figure"].startswith(b"\x89PNG"))
+        self.assertTrue(results["brain_screenshot"].startswith(b"\x89PNG"))
+
+    def test_run_stages_with_intermediates(self):
+        output_dir = os.path.join(self.temp_dir.name, "intermediates")
+        results = run_stages(*self.stage_args, intermediate_dir=output_dir)
+
+        for filename in INTERMEDIATE_FILES.values():
+            self.assertTrue(os.path.isfile(os.path.join(output_dir, filename)))
+        with open(os.path.join(output_dir, "asymmetry_index.json")) as f:
+            self.assertEqual(json.load(f), results["asymmetry_index"])
+
+    @patch("onsetpy.pipelines.epinsight.write_report")
+    def test_run_epinsight(self, mock_write_report):
+        output_report = os.path.join(self.temp_dir.name, "report.pdf")
+        results = run_epinsight(*self.stage_args, output_report, patient_id="12345")
+
+        mock_write_report.assert_called_once_with(
+            results,
+            output_report,
+            patient_name="Not available",
+            patient_id="12345",
+            map18_figures=None,
+        )
+
+    @patch("onsetpy.pipelines.epinsight.write_report")
+    def test_existing_intermediates(self, mock_write_report):
+        intermediate_dir = os.path.join(self.temp_dir.name, "intermediates")
+        os.makedirs(intermediate_dir)
+        existing = os.path.join(intermediate_dir, "aparc.csv")
+        with open(existing, "w") as f:
+            f.write("existing")
+        args = [
+            self.lh,
+            self.rh,
+            self.aseg,
+            os.path.join(self.temp_dir.name, "report.pdf"),
+            "--image_paths",
+            self.image,
+            "--titles",
+            "T1",
+            "--cmaps",
+            "gray",
+            "--coord",
+            "5",
+            "5",
+            "5",
+            "--intermediate_dir",
+            intermediate_dir,
+        ]
+
+        self.assertEqual(run_command("epinsight_pipeline", args), 2)
+        with open(existing) as f:
+            self.assertEqual(f.read(), "existing")
+        mock_write_report.assert_not_called()
+
+        self.assertEqual(run_command("epinsight_pipeline", args + ["-f"]), 0)
+        self.assertNotEqual(os.path.getsize(existing), len("existing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
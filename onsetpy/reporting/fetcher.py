@@ -0,0 +1,207 @@
+from functools import lru_cache
+import hashlib
+import mimetypes
+import os
+from os.path import abspath, dirname, join, normpath
+from urllib.parse import unquote, urlparse
+
+ASSETS_DIR = abspath(join(dirname(__file__), "../templates/assets"))
+ASSET_SCHEME = "onset"
+# Official source of the packaged assets, downloaded by fetch_assets
+ASSET_SOURCES = {
+    "logo_crchum_versionlongue_sans_fond.png": "https://www.chumontreal.qc.ca/sites/"
+    "default/files/logos/logo_crchum_versionlongue_sans_fond.png",
+}
+
+
+class NetworkAccessError(ValueError):
+    """Raised when a report tries to fetch a remote resource while the network is disabled."""
+
+
+@lru_cache(maxsize=64)
+def _read_file(path, mtime_ns, size):
+    """
+    Reads a local file once and keeps its content in memory.
+
+    The modification time and size are part of the cache key so that a file rewritten
+    between two reports is read again.
+
+    Args:
+        path (str): The absolute path of the file.
+        mtime_ns (int): The modification time of the file in nanoseconds.
+        size (int): The size of the file in bytes.
+
+    Returns:
+        bytes: The content of the file.
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _guess_mime_type(data):
+    """
+    Guesses the MIME type of an image from its first bytes.
+
+    Args:
+        data (bytes): The content of the image.
+
+    Returns:
+        str or None: The MIME type, or None if the format is not recognized.
+    """
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data.lstrip().startswith((b"<?xml", b"<svg")):
+        return "image/svg+xml"
+    return None
+
+
+class ReportFetcher:
+    def __init__(self, allow_network=False, assets_dir=ASSETS_DIR):
+        """
+        Initializes a WeasyPrint URL fetcher serving the report resources from memory.
+
+        Packaged assets are referenced in the templates as ``onset://assets/<name>``, in-memory
+        resources as ``onset://memory/<name>`` and local files as ``file://<path>``. Files are
+        read once and cached, so rendering a report never touches the network unless
+        explicitly allowed.
+
+        Args:
+            allow_network (bool, optional): Whether remote (http, https, ...) resources can be
+                fetched. Defaults to False.
+            assets_dir (str, optional): The directory containing the packaged assets.
+                Defaults to the ``templates/assets`` directory of onsetpy.
+
+        Attributes:
+            allow_network (bool): Whether remote resources can be fetched.
+            assets_dir (str): The directory containing the packaged assets.
+            resources (dict): The in-memory resources, indexed by URL.
+        """
+        self.allow_network = allow_network
+        self.assets_dir = normpath(abspath(assets_dir))
+        self.resources = {}
+
+    def add_resource(self, data, mime_type=None):
+        """
+        Registers an in-memory resource and returns the URL to use in the report.
+
+        Resources are named after the hash of their content, so adding the same image twice
+        returns the same URL.
+
+        Args:
+            data (bytes): The content of the resource.
+            mime_type (str, optional): The MIME type of the resource. If None, it is guessed
+                from the content.
+
+        Returns:
+            str: The URL of the resource.
+        """
+        data = bytes(data)
+        url = "{}://memory/{}".format(ASSET_SCHEME, hashlib.sha1(data).hexdigest())
+        self.resources[url] = {
+            "string": data,
+            "mime_type": mime_type or _guess_mime_type(data),
+            "redirected_url": url,
+        }
+        return url
+
+    def __call__(self, url, timeout=10, ssl_context=None):
+        """
+        Fetches a resource for WeasyPrint.
+
+        Args:
+            url (str): The URL of the resource.
+            timeout (int, optional): Timeout in seconds for remote resources. Defaults to 10.
+            ssl_context (ssl.SSLContext, optional): SSL context for remote resources.
+
+        Raises:
+            NetworkAccessError: If the resource is remote, or is an asset of ASSET_SOURCES
+                which is not bundled, and the network is disabled.
+            ValueError: If the asset URL points outside of the assets directory.
+
+        Returns:
+            dict: The resource in the format expected by WeasyPrint's ``url_fetcher``.
+        """
+        parsed = urlparse(url)
+
+        if parsed.scheme == ASSET_SCHEME and parsed.netloc == "memory":
+            if url not in self.resources:
+                raise ValueError("Unknown in-memory resource: {}".format(url))
+            return self.resources[url]
+        if parsed.scheme == ASSET_SCHEME and parsed.netloc == "assets":
+            path = normpath(join(self.assets_dir, unquote(parsed.path).lstrip("/")))
+            if os.path.commonpath([path, self.assets_dir]) != self.assets_dir:
+                raise ValueError("Invalid asset URL: {}".format(url))
+            name = os.path.relpath(path, self.assets_dir)
+            if not os.path.exists(path) and name in ASSET_SOURCES:
+                if not self.allow_network:
+                    raise NetworkAccessError(
+                        "{} is not bundled, download it with "
+                        "`python -m onsetpy.reporting.fetcher`".format(name)
+                    )
+                return self(ASSET_SOURCES[name], timeout, ssl_context)
+            return self._local_resource(url, path)
+        if parsed.scheme == "file":
+            return self._local_resource(url, unquote(parsed.path))
+        if parsed.scheme == "data" or self.allow_network:
+            from weasyprint import default_url_fetcher
+
+            return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
+
+        raise NetworkAccessError(
+            "Network access is disabled, cannot fetch {}".format(url)
+        )
+
+    def _local_resource(self, url, path):
+        """
+        Builds the WeasyPrint resource of a local file.
+
+        Args:
+            url (str): The URL of the resource.
+            path (str): The path of the local file.
+
+        Returns:
+            dict: The resource in the format expected by WeasyPrint's ``url_fetcher``.
+        """
+        stat = os.stat(path)
+        mime_type, _ = mimetypes.guess_type(path)
+        return {
+            "string": _read_file(path, stat.st_mtime_ns, stat.st_size),
+            "mime_type": mime_type,
+            "redirected_url": url,
+        }
+
+
+def fetch_assets(assets_dir=ASSETS_DIR, timeout=30):
+    """
+    Downloads the official files of ASSET_SOURCES missing from the assets directory, so
+    that they are bundled with the package and the reports render offline.
+
+    Args:
+        assets_dir (str, optional): The directory containing the packaged assets.
+        timeout (int, optional): Timeout of each download, in seconds. Defaults to 30.
+
+    Returns:
+        list: The paths of the downloaded files.
+    """
+    from urllib.request import urlopen
+
+    os.makedirs(assets_dir, exist_ok=True)
+    downloaded = []
+    for name, source in ASSET_SOURCES.items():
+        path = join(assets_dir, name)
+        if os.path.exists(path):
+            continue
+        with urlopen(source, timeout=timeout) as response:
+            data = response.read()
+        with open(path + ".part", "wb") as f:
+            f.write(data)
+        os.replace(path + ".part", path)
+        downloaded.append(path)
+    return downloaded
+
+
+if __name__ == "__main__":
+    for path in fetch_assets():
+        print("Downloaded {}".format(path))
@@ -1,4 +1,7 @@
+import io
+import os
 from os.path import abspath, dirname, join
+from pathlib import Path
 import shutil
 import tempfile
 
@@ -6,9 +9,12 @@ import tempfile
 from jinja2 import Environment, FileSystemLoader
 from weasyprint import HTML
 
+from onsetpy.instrumentation import BYTES_WRITTEN, count_file, stage
+from onsetpy.reporting.fetcher import ReportFetcher
+
 
 class Report:
-    def __init__(self, patient_name, patient_id, date):
+    def __init__(self, patient_name, patient_id, date, allow_network=False):
         """
         Initializes the Report object with patient details and sets up the environment for template
         rendering.
@@ -17,6 +23,8 @@ class Report:
             patient_name (str): The name of the patient.
             patient_id (str): The unique identifier for the patient.
             date (str): The date associated with the report.
+            allow_network (bool, optional): Whether remote resources referenced in the report
+                can be fetched. Defaults to False.
 
         Attributes:
             env (Environment): The Jinja2 environment for loading templates.
@@ -25,6 +33,7 @@ class Report:
             date (str): The date associated with the report.
             html_content (str or None): The HTML content of the report, initially set to None.
             temp_dir (str): The path to a temporary directory for storing files.
+            fetcher (ReportFetcher): The URL fetcher serving the report resources.
         """
         self.env = Environment(
             loader=FileSystemLoader(abspath(join(dirname(__file__), "../templates")))
@@ -34,6 +43,32 @@ class Report:
         self.date = date
         self.html_content = None
         self.temp_dir = tempfile.mkdtemp()
+        self.fetcher = ReportFetcher(allow_network=allow_network)
+        self.env.filters["image_url"] = self.image_url
+
+    def image_url(self, image):
+        """
+        Returns the URL under which an image is served to the report.
+
+        In-memory images (bytes or matplotlib figures) are registered in the report fetcher so
+        that they are embedded without being written to disk.
+
+        Args:
+            image (str, bytes or matplotlib.figure.Figure): The path to the image, its encoded
+                content or a matplotlib figure.
+
+        Returns:
+            str: The URL of the image, or an empty string if image is None.
+        """
+        if image is None:
+            return ""
+        if isinstance(image, (str, os.PathLike)):
+            return Path(abspath(image)).as_uri()
+        if hasattr(image, "savefig"):
+            buffer = io.BytesIO()
+            image.savefig(buffer, format="png")
+            return self.fetcher.add_resource(buffer.getvalue(), "image/png")
+        return self.fetcher.add_resource(image)
 
     def render(self):
         """
@@ -54,13 +89,17 @@ class Report:
         Raises:
             OSError: If there is an issue removing the temporary directory.
         """
-        HTML(string=self.html_content).write_pdf(output_path)
+        with stage("render_pdf", path=str(output_path)):
+            HTML(string=self.html_content, url_fetcher=self.fetcher).write_pdf(
+                output_path
+            )
+            count_file(BYTES_WRITTEN, output_path)
         shutil.rmtree(self.temp_dir)
 
 
 class SurgeryflowReport(Report):
-    def __init__(self, patient_name, patient_id, date):
-        super().__init__(patient_name, patient_id, date)
+    def __init__(self, patient_name, patient_id, date, allow_network=False):
+        super().__init__(patient_name, patient_id, date, allow_network)
 
     def render(self, missing_bundles, screenshot_path):
         """
@@ -68,7 +107,8 @@ class SurgeryflowReport(Report):
 
         Args:
             missing_bundles (dict): List of missing bundles to be included in the report.
-            screenshot_path (str): The file path to the screenshot image.
+            screenshot_path (str, bytes or matplotlib.figure.Figure): The file path to the
+                screenshot image, or the image itself.
 
         Returns:
             None
@@ -85,8 +125,8 @@ class SurgeryflowReport(Report):
 
 
 class EpinsightReport(Report):
-    def __init__(self, patient_name, patient_id, date):
-        super().__init__(patient_name, patient_id, date)
+    def __init__(self, patient_name, patient_id, date, allow_network=False):
+        super().__init__(patient_name, patient_id, date, allow_network)
 
     def render(
         self,
@@ -100,9 +140,12 @@ class EpinsightReport(Report):
 
         Args:
             asymmetry_index (dict): The asymmetry index data to be included in the report.
-            asymmetry_figure (str): The file path to the asymmetryfigure.
-            map18_figures (list): List of file paths to the map18 figures.
-            brain_screenshot (str): The file path to the brain screenshot image.
+            asymmetry_figure (str, bytes or matplotlib.figure.Figure): The file path to the
+                asymmetry figure, or the figure itself.
+            map18_figures (list): List of file paths to the map18 figures, or the figures
+                themselves.
+            brain_screenshot (str, bytes or matplotlib.figure.Figure): The file path to the
+                brain screenshot image, or the image itself.
 
         Returns:
             None
@@ -0,0 +1,88 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+from onsetpy.reporting.fetcher import (
+    ASSET_SOURCES,
+    ReportFetcher,
+    NetworkAccessError,
+    fetch_assets,
+)
+
+LOGO = "logo_crchum_versionlongue_sans_fond.png"
+
+
+class TestReportFetcher(TestCase):
+    def setUp(self):
+        self.fetcher = ReportFetcher()
+
+    def test_fetch_packaged_asset(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, LOGO), "wb") as f:
+                f.write(b"\x89PNG\r\n\x1a\nlogo")
+            fetcher = ReportFetcher(assets_dir=temp_dir)
+            resource = fetcher("onset://assets/" + LOGO)
+            self.assertEqual(resource["mime_type"], "image/png")
+            self.assertEqual(resource["string"], b"\x89PNG\r\n\x1a\nlogo")
+
+    def test_asset_not_bundled(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(NetworkAccessError):
+                ReportFetcher(assets_dir=temp_dir)("onset://assets/" + LOGO)
+
+    def test_fetch_assets(self):
+        response = mock.MagicMock()
+        response.__enter__.return_value.read.return_value = b"\x89PNG official"
+        with (
+            tempfile.TemporaryDirectory() as temp_dir,
+            mock.patch("urllib.request.urlopen", return_value=response) as urlopen,
+        ):
+            self.assertEqual(fetch_assets(temp_dir), [os.path.join(temp_dir, LOGO)])
+            urlopen.assert_called_once_with(ASSET_SOURCES[LOGO], timeout=30)
+            with open(os.path.join(temp_dir, LOGO), "rb") as f:
+                self.assertEqual(f.read(), b"\x89PNG official")
+            # Already bundled files are not downloaded again
+            self.assertEqual(fetch_assets(temp_dir), [])
+
+    def test_fetch_asset_outside_assets_dir(self):
+        with self.assertRaises(ValueError):
+            self.fetcher("onset://assets/../epinsight_report.html")
+
+    def test_fetch_asset_in_sibling_dir(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, "assets"))
+            os.makedirs(os.path.join(temp_dir, "assets_evil"))
+            with open(os.path.join(temp_dir, "assets_evil", "x.svg"), "w") as f:
+                f.write("<svg/>")
+            fetcher = ReportFetcher(assets_dir=os.path.join(temp_dir, "assets"))
+            with self.assertRaises(ValueError):
+                fetcher("onset://assets/../assets_evil/x.svg")
+
+    def test_fetch_local_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "figure with space.png")
+            with open(path, "wb") as f:
+                f.write(b"first")
+            url = "file://" + path.replace(" ", "%20")
+            self.assertEqual(self.fetcher(url)["string"], b"first")
+            self.assertEqual(self.fetcher(url)["mime_type"], "image/png")
+
+            with open(path, "wb") as f:
+                f.write(b"second content")
+            self.assertEqual(self.fetcher(url)["string"], b"second content")
+
+    def test_network_blocked_by_default(self):
+        with self.assertRaises(NetworkAccessError):
+            self.fetcher("https://www.example.com/logo.png")
+
+    def test_fetch_memory_resource(self):
+        url = self.fetcher.add_resource(b"\x89PNG\r\n\x1a\nimage")
+        self.assertTrue(url.startswith("onset://memory/"))
+        self.assertEqual(self.fetcher.add_resource(b"\x89PNG\r\n\x1a\nimage"), url)
+
+        resource = self.fetcher(url)
+        self.assertEqual(resource["string"], b"\x89PNG\r\n\x1a\nimage")
+        self.assertEqual(resource["mime_type"], "image/png")
+
+    def test_fetch_unknown_memory_resource(self):
+        with self.assertRaises(ValueError):
+            self.fetcher("onset://memory/unknown")
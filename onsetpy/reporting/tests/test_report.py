@@ -29,6 +29,23 @@ class TestReport(TestCase):
         mock_write_pdf.assert_called_once_with(output_path)
         mock_rmtree.assert_called_once_with(self.report.temp_dir)
 
+    def test_image_url_from_path(self):
+        self.assertEqual(
+            self.report.image_url("/path/to/screenshot.png"),
+            "file:///path/to/screenshot.png",
+        )
+        self.assertEqual(self.report.image_url(None), "")
+
+    def test_image_url_from_bytes(self):
+        url = self.report.image_url(b"\x89PNG\r\n\x1a\nimage")
+        self.assertEqual(self.report.fetcher(url)["string"], b"\x89PNG\r\n\x1a\nimage")
+
+    def test_image_url_from_figure(self):
+        figure = MagicMock(spec=["savefig"])
+        figure.savefig.side_effect = lambda buffer, format: buffer.write(b"figure")
+        url = self.report.image_url(figure)
+        self.assertEqual(self.report.fetcher(url)["string"], b"figure")
+
 
 class TestSurgeryflowReport(TestCase):
     def setUp(self):
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""
+Compare two groups of connectivity matrices edge by edge with permutation tests.
+
+A two-sample t-test is computed on every edge, and the family-wise error rate is
+controlled by permutations of the subjects between the groups:
+
+    <out_prefix>_t.npy              t statistic of each edge (group_a - group_b)
+    <out_prefix>_p_uncorrected.npy  permutation p-value of each edge
+    <out_prefix>_p_fwe.npy          p-value corrected with the max-statistic
+
+With --nbs_threshold, the Network-Based Statistic is also computed:
+
+    <out_prefix>_nbs_p.npy              p-value of the component of each edge
+    <out_prefix>_nbs_components.json    nodes, number of edges and p-value of each component
+"""
+
+import argparse
+import json
+import logging
+
+import numpy as np
+
+from onsetpy.io.matrix import load_matrix, save_matrix
+from onsetpy.io.utils import (
+    add_overwrite_arg,
+    add_profile_arg,
+    add_verbose_arg,
+    add_version_arg,
+    assert_inputs_exist,
+    assert_matrices_compatible,
+    assert_outputs_exist,
+)
+
+
+def _build_arg_parser():
+    """Build argparser.
+
+    Returns:
+        parser (ArgumentParser): Parser built.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--group_a",
+        nargs="+",
+        required=True,
+        help="Connectivity matrices of the first group (e.g. patients) in .npy\n"
+        "format, (R, R) or stacked (N, R, R).",
+    )
+    parser.add_argument(
+        "--group_b",
+        nargs="+",
+        required=True,
+        help="Connectivity matrices of the second group (e.g. controls).",
+    )
+    parser.add_argument(
+        "--n_permutations",
+        type=int,
+        default=10000,
+        help="Number of permutations [%(default)s].",
+    )
+    parser.add_argument(
+        "--tail",
+        choices=["two-sided", "greater", "less"],
+        default="two-sided",
+        help="Alternative hypothesis, 'greater' testing group_a > group_b\n"
+        "[%(default)s].",
+    )
+    parser.add_argument(
+        "--welch",
+        action="store_true",
+        help="Use Welch's t-test instead of Student's t-test with pooled variance.",
+    )
+    parser.add_argument(
+        "--nbs_threshold",
+        type=float,
+        help="Primary t threshold of the Network-Based Statistic.",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of processes evaluating the permutations, 0 for one per CPU\n"
+        "[%(default)s].",
+    )
+    parser.add_argument("--seed", type=int, help="Seed of the permutations.")
+    parser.add_argument(
+        "--out_prefix",
+        default="group_comparison",
+        help="Prefix of the output files [%(default)s].",
+    )
+
+    add_verbose_arg(parser)
+    add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_version_arg(parser)
+    return parser
+
+
+def _load_group(parser, filenames):
+    """Load the matrices of a group as a (N, R, R) array."""
+    matrices = []
+    for filename, matrix in zip(filenames, load_matrix(filenames)):
+        if matrix.ndim not in (2, 3):
+            parser.error(f"{filename} is not a (R, R) or (N, R, R) array.")
+        matrices.append(matrix[np.newaxis] if matrix.ndim == 2 else matrix)
+    return matrices
+
+
+def main():
+    parser = _build_arg_parser()
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.getLevelName(args.verbose))
+
+    if args.n_permutations < 1 or args.processes < 0:
+        parser.error("--n_permutations must be at least 1 and --processes positive.")
+    assert_inputs_exist(parser, args.group_a + args.group_b)
+    outputs = {
+        name: f"{args.out_prefix}_{name}.npy"
+        for name in ["t", "p_uncorrected", "p_fwe"]
+    }
+    if args.nbs_threshold is not None:
+        outputs["nbs_p"] = f"{args.out_prefix}_nbs_p.npy"
+        outputs["nbs_components"] = f"{args.out_prefix}_nbs_components.json"
+    assert_outputs_exist(parser, args, list(outputs.values()))
+
+    group_a = _load_group(parser, args.group_a)
+    group_b = _load_group(parser, args.group_b)
+    assert_matrices_compatible(parser, [m[0] for m in group_a + group_b])
+
+    from onsetpy.stats.permutation import permutation_test
+
+    try:
+        result = permutation_test(
+            np.concatenate(group_a),
+            np.concatenate(group_b),
+            n_permutations=args.n_permutations,
+            tail=args.tail,
+            equal_var=not args.welch,
+            nbs_threshold=args.nbs_threshold,
+            processes=args.processes or None,
+            seed=args.seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    for name, filename in outputs.items():
+        if name == "nbs_components":
+            with open(filename, "w") as f:
+                json.dump(result[name], f, indent=4)
+        else:
+            save_matrix(result[name], filename)
+
+    logging.info(
+        f"Edges with p_fwe < 0.05: {np.count_nonzero(np.triu(result['p_fwe'] < 0.05, 1))}"
+    )
+    logging.info(f"Results saved with prefix: {args.out_prefix}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+Compute graph-theory metrics over a cohort of connectivity matrices.
+
+The metrics of all the matrices are computed at once. Each metric is saved to
+<out_prefix>_<metric>.npy, with one row per input matrix (in the order of the inputs):
+a (N, R) array for the node metrics and a (N,) array for global_efficiency.
+
+Path-based metrics (efficiencies and betweenness) use the connection lengths 1 / w. The
+matrices must be symmetric, with positive weights.
+"""
+
+import argparse
+import logging
+
+import numpy as np
+
+from onsetpy.io.matrix import load_matrix, save_matrix
+from onsetpy.io.utils import (
+    add_overwrite_arg,
+    add_profile_arg,
+    add_verbose_arg,
+    add_version_arg,
+    assert_inputs_exist,
+    assert_matrices_compatible,
+    assert_outputs_exist,
+)
+
+# Kept in sync with onsetpy.graph.metrics.METRICS, which is only imported after parsing
+METRICS = (
+    "degree",
+    "strength",
+    "clustering",
+    "local_efficiency",
+    "betweenness",
+    "global_efficiency",
+)
+
+
+def _build_arg_parser():
+    """Build argparser.
+
+    Returns:
+        parser (ArgumentParser): Parser built.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "input",
+        nargs="+",
+        help="Connectivity matrices in .npy format, (R, R) or stacked (N, R, R).",
+    )
+    parser.add_argument(
+        "--metrics",
+        nargs="+",
+        choices=METRICS,
+        default=list(METRICS),
+        help="Metrics to compute [all].",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of processes for local_efficiency and betweenness, 0 for one\n"
+        "per CPU [%(default)s].",
+    )
+    parser.add_argument(
+        "--out_prefix",
+        default="graph_metrics",
+        help="Prefix of the output metric files [%(default)s].",
+    )
+
+    add_verbose_arg(parser)
+    add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_version_arg(parser)
+    return parser
+
+
+def main():
+    parser = _build_arg_parser()
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.getLevelName(args.verbose))
+
+    if args.processes < 0:
+        parser.error("--processes must be positive.")
+    assert_inputs_exist(parser, args.input)
+    output_files = {
+        metric: f"{args.out_prefix}_{metric}.npy" for metric in args.metrics
+    }
+    assert_outputs_exist(parser, args, list(output_files.values()))
+
+    matrices = load_matrix(args.input)
+    for filename, matrix in zip(args.input, matrices):
+        if matrix.ndim not in (2, 3):
+            parser.error(f"{filename} is not a (R, R) or (N, R, R) array.")
+    matrices = [m[np.newaxis] if m.ndim == 2 else m for m in matrices]
+    assert_matrices_compatible(parser, [m[0] for m in matrices])
+    cohort = np.concatenate(matrices)
+
+    from onsetpy.graph.metrics import compute_metrics
+
+    try:
+        results = compute_metrics(cohort, args.metrics, args.processes or None)
+    except ValueError as e:
+        parser.error(str(e))
+
+    for metric, values in results.items():
+        save_matrix(values, output_files[metric])
+
+    logging.info(f"Number of subjects processed: {len(cohort)}")
+    logging.info(f"Results saved with prefix: {args.out_prefix}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,13 @@ Convert Freesurfer cortical thickness statistics to CSV format.
 """
 
 import argparse
-import pandas as pd
+
+from onsetpy.instrumentation import timed
+from onsetpy.io.cache import cached_run
 from onsetpy.io.utils import (
+    add_cache_arg,
     add_overwrite_arg,
+    add_profile_arg,
     add_version_arg,
     assert_inputs_exist,
     assert_outputs_exist,
@@ -45,17 +49,24 @@ def _build_arg_parser():
     parser.add_argument("--sid", help="Subject ID")
 
     add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_cache_arg(parser)
     add_version_arg(parser)
     return parser
 
 
-def main():
-    parser = _build_arg_parser()
-    args = parser.parse_args()
+@timed()
+def load_aparc_stats(lh_fs_stats, rh_fs_stats, sid=None):
+    """Load the left and right hemisphere Freesurfer cortical statistics.
 
-    assert_inputs_exist(parser, [args.lh_fs_stats, args.rh_fs_stats])
-    assert_outputs_exist(parser, args, [args.output_aparc, args.output_aseg])
+    Args:
+        lh_fs_stats (str): Path to the left hemisphere statistics file.
+        rh_fs_stats (str): Path to the right hemisphere statistics file.
+        sid (str, optional): Subject ID. Defaults to None.
 
+    Returns:
+        pd.DataFrame: Cortical measures with columns sid, roi, side, volume and thickness.
+    """
     names = [
         "StructName",
         "NumVert",
@@ -69,11 +80,13 @@ def main():
         "CurvInd",
     ]
 
+    import pandas as pd
+
     df_list = []
-    for stat, side in zip([args.lh_fs_stats, args.rh_fs_stats], ["left", "right"]):
+    for stat, side in zip([lh_fs_stats, rh_fs_stats], ["left", "right"]):
         curr_df = pd.read_csv(
             stat,
-            sep="\s+",
+            sep=r"\s+",
             comment="#",
             header=None,
             names=names,
@@ -87,14 +100,21 @@ def main():
         columns={"StructName": "roi", "GrayVol": "volume", "ThickAvg": "thickness"},
         inplace=True,
     )
-    df["sid"] = args.sid
-    df = df[["sid", "roi", "side", "volume", "thickness"]]
+    df["sid"] = sid
+    return df[["sid", "roi", "side", "volume", "thickness"]]
 
-    if args.output_aparc.endswith(".csv"):
-        df.to_csv(args.output_aparc, index=False)
-    else:
-        df.to_json(args.output_aparc, orient="records", index=False, indent=4)
 
+@timed()
+def load_aseg_stats(aseg_fs_stats, sid=None):
+    """Load the Freesurfer subcortical segmentation statistics.
+
+    Args:
+        aseg_fs_stats (str): Path to the aseg statistics file.
+        sid (str, optional): Subject ID. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Subcortical volumes with columns sid, roi and volume.
+    """
     names = [
         "Index",
         "SegId",
@@ -107,9 +127,12 @@ def main():
         "normMax",
         "normRange",
     ]
+
+    import pandas as pd
+
     aseg_df = pd.read_csv(
-        args.aseg_fs_stats,
-        sep="\s+",
+        aseg_fs_stats,
+        sep=r"\s+",
         comment="#",
         header=None,
         names=names,
@@ -118,13 +141,45 @@ def main():
         columns={"StructName": "roi", "Volume_mm3": "volume"},
         inplace=True,
     )
-    aseg_df["sid"] = args.sid
-    aseg_df = aseg_df[["sid", "roi", "volume"]]
+    aseg_df["sid"] = sid
+    return aseg_df[["sid", "roi", "volume"]]
+
 
-    if args.output_aseg.endswith(".csv"):
-        aseg_df.to_csv(args.output_aseg, index=False)
+@timed()
+def save_stats(df, output):
+    """Save statistics in CSV format, or JSON if the output is not a .csv file.
+
+    Args:
+        df (pd.DataFrame): Statistics to save.
+        output (str): Path to the output file.
+    """
+    if output.endswith(".csv"):
+        df.to_csv(output, index=False)
     else:
-        aseg_df.to_json(args.output_aseg, orient="records", index=False, indent=4)
+        df.to_json(output, orient="records", index=False, indent=4)
+
+
+def main():
+    parser = _build_arg_parser()
+    args = parser.parse_args()
+
+    assert_inputs_exist(parser, [args.lh_fs_stats, args.rh_fs_stats])
+    assert_outputs_exist(parser, args, [args.output_aparc, args.output_aseg])
+    run = cached_run(
+        parser,
+        args,
+        [args.lh_fs_stats, args.rh_fs_stats, args.aseg_fs_stats],
+        [args.output_aparc, args.output_aseg],
+    )
+    if run.restore():
+        return
+
+    save_stats(
+        load_aparc_stats(args.lh_fs_stats, args.rh_fs_stats, args.sid),
+        args.output_aparc,
+    )
+    save_stats(load_aseg_stats(args.aseg_fs_stats, args.sid), args.output_aseg)
+    run.store()
 
 
 if __name__ == "__main__":
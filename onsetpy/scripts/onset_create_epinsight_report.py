@@ -12,13 +12,15 @@ from datetime import datetime
 import json
 import os
 
+from onsetpy.io.cache import cached_run
 from onsetpy.io.utils import (
+    add_cache_arg,
     add_overwrite_arg,
     assert_inputs_exist,
     assert_outputs_exist,
+    add_profile_arg,
     add_version_arg,
 )
-from onsetpy.reporting.report import EpinsightReport
 
 
 def _build_arg_parser():
@@ -60,6 +62,8 @@ def _build_arg_parser():
     parser.add_argument("--patient_id", help="Patient ID.", default="Not available")
 
     add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_cache_arg(parser)
     add_version_arg(parser)
     return parser
 
@@ -70,13 +74,26 @@ def main():
 
     assert_inputs_exist(parser, [args.asymmetry_figure, args.asymmetry_index])
     assert_outputs_exist(parser, args, args.output_report)
+    # The report is dated, so it is only reused on the same day
+    date = datetime.now().strftime("%d-%m-%Y")
+    run = cached_run(
+        parser,
+        args,
+        [args.asymmetry_figure, args.asymmetry_index, args.brain_screenshot]
+        + (args.map18_figures or []),
+        [args.output_report],
+        date=date,
+    )
+    if run.restore():
+        return
 
     with open(args.asymmetry_index, "r") as file:
         asymmetry_index = json.load(file)
 
-    report = EpinsightReport(
-        args.patient_name, args.patient_id, datetime.now().strftime("%d-%m-%Y")
-    )
+    # WeasyPrint is slow to import, so it is only loaded to build the report
+    from onsetpy.reporting.report import EpinsightReport
+
+    report = EpinsightReport(args.patient_name, args.patient_id, date)
 
     report.render(
         asymmetry_index,
@@ -85,3 +102,4 @@ def main():
         os.path.abspath(args.brain_screenshot),
     )
     report.to_pdf(args.output_report)
+    run.store()
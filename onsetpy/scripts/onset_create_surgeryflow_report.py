@@ -10,13 +10,15 @@ It then generates a SurgeryFlow report in PDF format, including patient informat
 import argparse
 from datetime import datetime
 
+from onsetpy.io.cache import cached_run
 from onsetpy.io.utils import (
+    add_cache_arg,
     add_overwrite_arg,
     assert_inputs_exist,
     assert_outputs_exist,
+    add_profile_arg,
     add_version_arg,
 )
-from onsetpy.reporting.report import SurgeryflowReport
 
 
 def _build_arg_parser():
@@ -46,6 +48,8 @@ def _build_arg_parser():
     parser.add_argument("--patient_id", help="Patient ID.", default="Not available")
 
     add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_cache_arg(parser)
     add_version_arg(parser)
     return parser
 
@@ -56,15 +60,28 @@ def main():
 
     assert_inputs_exist(parser, [args.input_screenshot, args.missing_bundles])
     assert_outputs_exist(parser, args, args.output_report)
+    # The report is dated, so it is only reused on the same day
+    date = datetime.now().strftime("%d-%m-%Y")
+    run = cached_run(
+        parser,
+        args,
+        [args.input_screenshot, args.missing_bundles],
+        [args.output_report],
+        date=date,
+    )
+    if run.restore():
+        return
 
     with open(args.missing_bundles, "r") as file:
         missing_bundles = file.readlines()
     missing_bundles = [bundle.strip() for bundle in missing_bundles]
 
-    report = SurgeryflowReport(
-        args.patient_name, args.patient_id, datetime.now().strftime("%d-%m-%Y")
-    )
+    # WeasyPrint is slow to import, so it is only loaded to build the report
+    from onsetpy.reporting.report import SurgeryflowReport
+
+    report = SurgeryflowReport(args.patient_name, args.patient_id, date)
     import os
 
     report.render(missing_bundles, os.path.abspath(args.input_screenshot))
     report.to_pdf(args.output_report)
+    run.store()
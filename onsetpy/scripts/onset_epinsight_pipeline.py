@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Run the whole EpInsight pipeline in a single process.
+
+This is equivalent to running onset_convert_fs_stats, onset_evaluate_cortical_measures,
+onset_epinsight_screenshots and onset_create_epinsight_report one after the other, without
+writing and re-reading the intermediate files. Use --intermediate_dir to keep them.
+"""
+
+import argparse
+import os
+
+from onsetpy.io.utils import (
+    add_overwrite_arg,
+    add_profile_arg,
+    add_version_arg,
+    assert_inputs_exist,
+    assert_outputs_exist,
+)
+
+
+def _build_arg_parser():
+    """Build argparser.
+
+    Returns:
+        parser (ArgumentParser): Parser built.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "lh_fs_stats",
+        help="Path to the left hemisphere Freesurfer cortical thickness statistics files",
+    )
+    parser.add_argument(
+        "rh_fs_stats",
+        help="Path to the right hemisphere Freesurfer cortical thickness statistics files",
+    )
+    parser.add_argument(
+        "aseg_fs_stats",
+        help="Path to the Freesurfer aseg statistics files",
+    )
+    parser.add_argument("output_report", help="Path to the .pdf EpInsight report file.")
+
+    parser.add_argument(
+        "--image_paths",
+        nargs="+",
+        required=True,
+        help="Paths to the NIfTI images of the brain screenshot.",
+    )
+    parser.add_argument(
+        "--titles",
+        nargs="+",
+        required=True,
+        help="Titles for each image.",
+    )
+    parser.add_argument(
+        "--cmaps",
+        nargs="+",
+        required=True,
+        help="Colormaps for each image.",
+    )
+    parser.add_argument(
+        "--coord",
+        type=int,
+        nargs=3,
+        required=True,
+        help="Coordinates (x, y, z) for the slices.",
+    )
+    parser.add_argument(
+        "--map18_figures",
+        nargs="+",
+        help="Path to the .png files containing the map18 figures.",
+    )
+    parser.add_argument(
+        "--asymmetry_threshold", type=float, help="Asymmetry threshold", default=10
+    )
+    parser.add_argument(
+        "--intermediate_dir",
+        help="Directory where the intermediate CSV, JSON and PNG files are written.",
+    )
+
+    parser.add_argument("--sid", help="Subject ID")
+    parser.add_argument(
+        "--patient_name",
+        help="Patient name. Write the name between quotes.",
+        default="Not available",
+    )
+    parser.add_argument("--patient_id", help="Patient ID.", default="Not available")
+
+    add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_version_arg(parser)
+    return parser
+
+
+def main():
+    parser = _build_arg_parser()
+    args = parser.parse_args()
+
+    assert_inputs_exist(
+        parser,
+        [args.lh_fs_stats, args.rh_fs_stats, args.aseg_fs_stats] + args.image_paths,
+        args.map18_figures,
+    )
+    assert_outputs_exist(parser, args, args.output_report)
+
+    if len(args.image_paths) != len(args.titles) or len(args.image_paths) != len(
+        args.cmaps
+    ):
+        parser.error(
+            "The number of images must match the number of titles and colormaps."
+        )
+
+    from onsetpy.pipelines.epinsight import INTERMEDIATE_FILES, run_epinsight
+
+    if args.intermediate_dir:
+        assert_outputs_exist(
+            parser,
+            args,
+            [
+                os.path.join(args.intermediate_dir, filename)
+                for filename in INTERMEDIATE_FILES.values()
+            ],
+            check_dir_exists=False,
+        )
+
+    run_epinsight(
+        args.lh_fs_stats,
+        args.rh_fs_stats,
+        args.aseg_fs_stats,
+        args.image_paths,
+        args.titles,
+        args.cmaps,
+        tuple(args.coord),
+        args.output_report,
+        sid=args.sid,
+        patient_name=args.patient_name,
+        patient_id=args.patient_id,
+        map18_figures=args.map18_figures,
+        asymmetry_threshold=args.asymmetry_threshold,
+        intermediate_dir=args.intermediate_dir,
+    )
+
+
+if __name__ == "__main__":
+    main()
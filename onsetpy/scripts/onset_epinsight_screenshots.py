@@ -5,14 +5,19 @@ supports multiple images, allowing users to specify titles and colormaps for eac
 """
 
 import argparse
-import nibabel as nib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import matplotlib.pyplot as plt
 
+from onsetpy.instrumentation import BYTES_READ, count_file, stage, timed
+from onsetpy.io.cache import cached_run
 from onsetpy.io.utils import (
+    add_cache_arg,
     add_overwrite_arg,
     assert_inputs_exist,
     assert_outputs_exist,
+    add_profile_arg,
     add_version_arg,
 )
 
@@ -112,6 +117,115 @@ def plot_slices(
         )
 
 
+def load_slices(
+    image_path: str, coords: tuple[int, int, int]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, float, float]:
+    """
+    Loads an image and extracts its slices with their intensity window.
+
+    Parameters:
+        image_path (str): Path to the NIfTI image.
+        coords (tuple): Tuple of (x, y, z) coordinates for the slices.
+
+    Returns:
+        tuple: The axial, coronal and sagittal slices, then the vmin and vmax of the
+        window: the largest 20th percentile and the smallest maximum of the non-zero
+        values of the slices.
+    """
+    import nibabel as nib
+
+    with stage("load_image", path=image_path):
+        count_file(BYTES_READ, image_path)
+        image = nib.load(image_path).get_fdata()
+    # Copied, since views would keep the whole volume alive until the row is drawn
+    axial, coronal, sagittal = [slice_.copy() for slice_ in get_slices(image, coords)]
+
+    vmins = []
+    vmaxs = []
+    for axis in [axial, coronal, sagittal]:
+        values = np.percentile(axis[axis != 0], [20, 100])
+        vmins.append(values[0])
+        vmaxs.append(values[1])
+    vmin = max(vmins)
+    vmax = min(vmaxs)
+    logging.debug(f"{image_path} vmin: {vmin}, vmax: {vmax}")
+    return axial, coronal, sagittal, vmin, vmax
+
+
+@timed()
+def render_screenshots(
+    image_paths: list[str],
+    titles: list[str],
+    cmaps: list[str],
+    coords: tuple[int, int, int],
+    workers: int = None,
+):
+    """
+    Renders the axial, coronal and sagittal slices of each image, one image per row.
+
+    The images are decompressed and windowed concurrently in threads (zlib and NumPy
+    release the GIL), so loading takes about as long as the largest image. Only the
+    drawing, which matplotlib does not support from several threads, is serial.
+
+    Parameters:
+        image_paths (list): Paths to the NIfTI images.
+        titles (list): Titles for each image.
+        cmaps (list): Colormaps for each image.
+        coords (tuple): Tuple of (x, y, z) coordinates for the slices and crosshairs.
+        workers (int, optional): Number of images loaded in parallel. Default is one
+            thread per image.
+
+    Returns:
+        matplotlib.figure.Figure: The rendered figure. The caller is responsible for saving
+        and closing it.
+    """
+    import matplotlib.pyplot as plt
+
+    # Imported once here rather than concurrently by the first threads
+    import nibabel  # noqa: F401
+
+    num_images = len(image_paths)
+    with ThreadPoolExecutor(max_workers=workers or num_images) as executor:
+        loaded = executor.map(lambda path: load_slices(path, coords), image_paths)
+
+        figure, axes = plt.subplots(num_images, 3, figsize=(15, 5 * num_images))
+        if num_images == 1:
+            axes = np.expand_dims(axes, axis=0)
+
+        # Each row is drawn as soon as its image is loaded, in the order of the images
+        for i, (axial, coronal, sagittal, vmin, vmax) in enumerate(loaded):
+            plot_slices(
+                axial,
+                coronal,
+                sagittal,
+                coords,
+                f"{titles[i]}",
+                axes,
+                i,
+                cmaps[i],
+                vmin,
+                vmax,
+            )
+
+    figure.tight_layout()
+    return figure
+
+
+def save_screenshots(figure, output_path: str):
+    """
+    Saves the figure of render_screenshots, then closes it.
+
+    Parameters:
+        figure (matplotlib.figure.Figure): The rendered figure.
+        output_path (str): Path of the image to save.
+    """
+    import matplotlib.pyplot as plt
+
+    with stage("save_figure", path=output_path):
+        figure.savefig(output_path)
+    plt.close(figure)
+
+
 def _build_arg_parser():
     """Build argparser.
 
@@ -151,7 +265,14 @@ def _build_arg_parser():
         required=True,
         help="Path to save the output figure.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of images loaded in parallel [one per image].",
+    )
     add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_cache_arg(parser)
     add_version_arg(parser)
     return parser
 
@@ -161,6 +282,8 @@ def main():
     args = parser.parse_args()
     assert_inputs_exist(parser, args.image_paths)
     assert_outputs_exist(parser, args, args.output_path)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1.")
 
     # Check if the number of images matches the number of titles and colormaps
     if len(args.image_paths) != len(args.titles) or len(args.image_paths) != len(
@@ -170,41 +293,16 @@ def main():
             "The number of images must match the number of titles and colormaps."
         )
 
-    num_images = len(args.image_paths)
-    _, axes = plt.subplots(num_images, 3, figsize=(15, 5 * num_images))
+    run = cached_run(parser, args, args.image_paths, [args.output_path])
+    if run.restore():
+        return
 
-    if num_images == 1:
-        axes = np.expand_dims(axes, axis=0)
-
-    for i, image_path in enumerate(args.image_paths):
-        image = nib.load(image_path).get_fdata()
-        axial, coronal, sagittal = get_slices(image, tuple(args.coord))
-
-        vmins = []
-        vmaxs = []
-        for axis in [axial, coronal, sagittal]:
-            values = np.percentile(axis[axis != 0], [20, 100])
-            print(values, values[0], values[1])
-            vmins.append(values[0])
-            vmaxs.append(values[1])
-        vmin = max(vmins)
-        vmax = min(vmaxs)
-        print(f"vmin: {vmin}, vmax: {vmax}")
-        print(vmins, vmaxs)
-
-        plot_slices(
-            axial,
-            coronal,
-            sagittal,
-            tuple(args.coord),
-            f"{args.titles[i]}",
-            axes,
-            i,
-            args.cmaps[i],
-            vmin,
-            vmax,
-        )
-
-    plt.tight_layout()
-    plt.savefig(args.output_path)
-    plt.close()
+    figure = render_screenshots(
+        args.image_paths,
+        args.titles,
+        args.cmaps,
+        tuple(args.coord),
+        args.workers,
+    )
+    save_screenshots(figure, args.output_path)
+    run.store()
@@ -5,17 +5,122 @@ Compare a patient to our database of cortical measures.
 """
 
 import argparse
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from matplotlib.patches import Patch
+
+from onsetpy.instrumentation import timed
+from onsetpy.io.cache import cached_run
 from onsetpy.io.utils import (
+    add_cache_arg,
     add_overwrite_arg,
+    add_profile_arg,
     add_version_arg,
     assert_inputs_exist,
     assert_outputs_exist,
 )
 
+ROI_MAPPING = {  # Dictionary mapping FreeSurfer ROIs to full anatomical names
+    "Lateral-Ventricle": "Lateral ventricle",
+    "Inf-Lat-Vent": "Temporal horn of the lateral ventricle",
+    "Cerebellum-White-Matter": "White matter of left hemisphere of cerebellum",
+    "Cerebellum-Cortex": "Cerebellar cortex",
+    "Thalamus": "Thalamus",
+    "Caudate": "Caudate nucleus",
+    "Putamen": "Putamen",
+    "Pallidum": "Globus pallidus",
+    "3rd-Ventricle": "Third ventricle",
+    "4th-Ventricle": "Fourth ventricle",
+    "Brain-Stem": "Brainstem",
+    "Hippocampus": "Hippocampus proper",
+    "Amygdala": "Amygdala",
+    "CSF": "Cerebrospinal fluid",
+    "Accumbens-area": "Nucleus accumbens",
+    "VentralDC": "Ventral diencephalon",
+    "vessel": "Vessel",
+    "choroid-plexus": "Choroid plexus",
+    "5th-Ventricle": "Fifth ventricle",
+    "WM-hypointensities": "White matter hypointensities",
+    "non-WM-hypointensities": "Non white matter hypointensities",
+    "Optic-Chiasm": "Optic chiasm",
+    "CC_Posterior": "Posterior part of the corpus callosum",
+    "CC_Mid_Posterior": "Mid posterior part of the corpus callosum",
+    "CC_Central": "Central part of the corpus callosum",
+    "CC_Mid_Anterior": "Mid anterior part of the corpus callosum",
+    "CC_Anterior": "Anterior part of the corpus callosum",
+    "G_and_S_frontomargin": "Fronto-marginal gyrus (of Wernicke) and sulcus",
+    "G_and_S_occipital_inf": "Inferior occipital gyrus (O3) and sulcus",
+    "G_and_S_paracentral": "Paracentral lobule and sulcus",
+    "G_and_S_subcentral": "	Subcentral gyrus (central operculum) and sulci",
+    "G_and_S_transv_frontopol": "Transverse frontopolar gyri and sulci",
+    "G_and_S_cingul-Ant": "Anterior part of the cingulate gyrus and sulcus (ACC)",
+    "G_and_S_cingul-Mid-Ant": "Middle-anterior part of the\ncingulate gyrus and sulcus (aMCC)",
+    "G_and_S_cingul-Mid-Post": "Middle-posterior part of the\ncingulate gyrus and sulcus (pMCC)",
+    "G_cingul-Post-dorsal": "Posterior-dorsal part of the cingulate gyrus (dPCC)",
+    "G_cingul-Post-ventral": "Posterior-ventral part of the\ncingulate gyrus (vPCC, isthmus of the cingulate gyrus)",
+    "G_cuneus": "Cuneus (O6)",
+    "G_front_inf-Opercular": "Opercular part of the inferior frontal gyrus",
+    "G_front_inf-Orbital": "Orbital part of the inferior frontal gyrus",
+    "G_front_inf-Triangul": "Triangular part of the inferior frontal gyrus",
+    "G_front_middle": "Middle frontal gyrus (F2)",
+    "G_front_sup": "Superior frontal gyrus (F1)",
+    "G_Ins_lg_and_S_cent_ins": "Long insular gyrus and central sulcus of the insula",
+    "G_insular_short": "Short insular gyri",
+    "G_occipital_middle": "Middle occipital gyrus (O2, lateral occipital gyrus)",
+    "G_occipital_sup": "Superior occipital gyrus (O1)",
+    "G_oc-temp_lat-fusifor": "Lateral occipito-temporal gyrus (fusiform gyrus, O4-T4)",
+    "G_oc-temp_med-Lingual": "Lingual gyrus, ligual part of the\nmedial occipito-temporal gyrus, (O5)",
+    "G_oc-temp_med-Parahip": "Parahippocampal gyrus, parahippocampal\npart of the medial occipito-temporal gyrus, (T5)",
+    "G_orbital": "Orbital gyri",
+    "G_pariet_inf-Angular": "Angular gyrus",
+    "G_pariet_inf-Supramar": "Supramarginal gyrus",
+    "G_parietal_sup": "Superior parietal lobule (lateral part of P1)",
+    "G_postcentral": "Postcentral gyrus",
+    "G_precentral": "Precentral gyrus",
+    "G_precuneus": "Precuneus (medial part of P1)",
+    "G_rectus": "Straight gyrus, Gyrus rectus",
+    "G_subcallosal": "Subcallosal area, subcallosal gyrus",
+    "G_temp_sup-G_T_transv": "Anterior transverse temporal gyrus (of Heschl)",
+    "G_temp_sup-Lateral": "Lateral aspect of the superior temporal gyrus",
+    "G_temp_sup-Plan_polar": "Planum polare of the superior temporal gyrus",
+    "G_temp_sup-Plan_tempo": "Planum temporale or temporal plane of\nthe superior temporal gyrus",
+    "G_temporal_inf": "Inferior temporal gyrus (T3)",
+    "G_temporal_middle": "Middle temporal gyrus (T2)",
+    "Lat_Fis-ant-Horizont": "Horizontal ramus of the anterior segment of\nthe lateral sulcus (or fissure)",
+    "Lat_Fis-ant-Vertical": "Vertical ramus of the anterior segment of the\nlateral sulcus (or fissure)",
+    "Lat_Fis-post": "Posterior ramus (or segment) of the lateral sulcus (or fissure)",
+    "Pole_occipital": "Occipital pole",
+    "Pole_temporal": "Temporal pole",
+    "S_calcarine": "Calcarine sulcus",
+    "S_central": "Central sulcus (Rolando's fissure)",
+    "S_cingul-Marginalis": "Marginal branch (or part) of the cingulate sulcus",
+    "S_circular_insula_ant": "Anterior segment of the circular sulcus of the insula",
+    "S_circular_insula_inf": "Inferior segment of the circular sulcus of the insula",
+    "S_circular_insula_sup": "Superior segment of the circular sulcus of the insula",
+    "S_collat_transv_ant": "Anterior transverse collateral sulcus",
+    "S_collat_transv_post": "Posterior transverse collateral sulcus",
+    "S_front_inf": "Inferior frontal sulcus",
+    "S_front_middle": "Middle frontal sulcus",
+    "S_front_sup": "Superior frontal sulcus",
+    "S_interm_prim-Jensen": "Sulcus intermedius primus (of Jensen)",
+    "S_intrapariet_and_P_trans": "Intraparietal sulcus (interparietal sulcus)\nand transverse parietal sulci",
+    "S_oc_middle_and_Lunatus": "Middle occipital sulcus and lunatus sulcus",
+    "S_oc_sup_and_transversal": "Superior occipital sulcus and transverse\noccipital sulcus",
+    "S_occipital_ant": "Anterior occipital sulcus and preoccipital notch\n(temporo-occipital incisure)",
+    "S_oc-temp_lat": "Lateral occipito-temporal sulcus",
+    "S_oc-temp_med_and_Lingual": "Medial occipito-temporal sulcus (collateral sulcus)\nand lingual sulcus",
+    "S_orbital_lateral": "Lateral orbital sulcus",
+    "S_orbital_med-olfact": "Medial orbital sulcus (olfactory sulcus)",
+    "S_orbital-H_Shaped": "Orbital sulci (H-shaped sulci)",
+    "S_parieto_occipital": "Parieto-occipital sulcus (or fissure)",
+    "S_pericallosal": "Pericallosal sulcus (S of corpus callosum)",
+    "S_postcentral": "Postcentral sulcus",
+    "S_precentral-inf-part": "Inferior part of the precentral sulcus",
+    "S_precentral-sup-part": "Superior part of the precentral sulcus",
+    "S_suborbital": "Suborbital sulcus (sulcus rostrales, supraorbital sulcus)",
+    "S_subparietal": "Subparietal sulcus",
+    "S_temporal_inf": "Inferior temporal sulcus",
+    "S_temporal_sup": "Superior temporal sulcus (parallel sulcus)",
+    "S_temporal_transverse": "Transverse temporal sulcus",
+}
+
 
 def _build_arg_parser():
     """Build argparser."""
@@ -32,12 +137,16 @@ def _build_arg_parser():
         "--asymmetry_threshold", type=float, help="Asymmetry threshold", default=10
     )
     add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_cache_arg(parser)
     add_version_arg(parser)
     return parser
 
 
 def calculate_asymmetry_index(data, roi_column, value_column, side_column, z_threshold):
     """Calculate asymmetry index for given data."""
+    import pandas as pd
+
     # keep only ROIs that have both left and right sides present
     groups = data.groupby(roi_column)[side_column].apply(lambda s: set(s.str.lower()))
     roi_columns = [
@@ -61,6 +170,8 @@ def calculate_asymmetry_index(data, roi_column, value_column, side_column, z_thr
 
 def calculate_aseg_asymmetry_index(data, z_threshold):
     """Calculate asymmetry index for aseg data."""
+    import pandas as pd
+
     rois = [
         roi.replace("Left-", "").replace("Right-", "")
         for roi in data["roi"].unique()
@@ -79,9 +190,65 @@ def calculate_aseg_asymmetry_index(data, z_threshold):
     return df[df["asymmetry_index"].abs() >= z_threshold]
 
 
-def plot_asymmetry_index(df_combined, aparc_list, roi_mapping, output_path):
-    """Plot the asymmetry index."""
-    plt.figure(figsize=(10, max(6, len(df_combined) * 0.3)))
+def load_measures(aparc_csv, aseg_csv):
+    """Load the cortical and subcortical measures written by onset_convert_fs_stats.
+
+    Args:
+        aparc_csv (str): Path to the cortical measures (roi, side, thickness).
+        aseg_csv (str): Path to the subcortical volumes (roi, volume).
+
+    Returns:
+        tuple: The cortical and subcortical measures, as DataFrames.
+    """
+    import pandas as pd
+
+    return pd.read_csv(aparc_csv), pd.read_csv(aseg_csv)
+
+
+@timed()
+def evaluate_asymmetry(aparc, aseg, asymmetry_threshold=10):
+    """Calculate the cortical and subcortical asymmetry indexes above a threshold.
+
+    Args:
+        aparc (pd.DataFrame): Cortical measures (roi, side, thickness).
+        aseg (pd.DataFrame): Subcortical volumes (roi, volume).
+        asymmetry_threshold (float, optional): Asymmetry threshold. Defaults to 10.
+
+    Returns:
+        tuple: Combined asymmetry indexes sorted in descending order, and the cortical
+               asymmetry indexes.
+    """
+    import pandas as pd
+
+    aseg = aseg[aseg["volume"] != 0]
+
+    df_aparc = calculate_asymmetry_index(
+        aparc,
+        roi_column="roi",
+        value_column="thickness",
+        side_column="side",
+        z_threshold=asymmetry_threshold,
+    )
+    df_aseg = calculate_aseg_asymmetry_index(aseg, z_threshold=asymmetry_threshold)
+
+    df_combined = pd.concat([df_aparc, df_aseg]).sort_values(
+        by="asymmetry_index", ascending=False
+    )
+    return df_combined, df_aparc
+
+
+@timed()
+def plot_asymmetry_index(df_combined, aparc_list, roi_mapping, output_path=None):
+    """Plot the asymmetry index.
+
+    The index of df_combined is renamed in place with the anatomical names of roi_mapping.
+    The figure is saved if output_path is given, and returned.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+    import seaborn as sns
+
+    figure = plt.figure(figsize=(10, max(6, len(df_combined) * 0.3)))
     sns.set_style("whitegrid")
 
     colors = [
@@ -112,7 +279,9 @@ def plot_asymmetry_index(df_combined, aparc_list, roi_mapping, output_path):
 
     sns.despine()
     plt.tight_layout()
-    plt.savefig(output_path, dpi=300)
+    if output_path is not None:
+        plt.savefig(output_path, dpi=300)
+    return figure
 
 
 def main():
@@ -130,134 +299,23 @@ def main():
     ):
         parser.error("Output file must be a CSV or JSON file.")
 
-    aparc = pd.read_csv(args.aparc_csv)
-    aseg = pd.read_csv(args.aseg_csv)
-    aseg = aseg[aseg["volume"] != 0]
-
-    df_aparc = calculate_asymmetry_index(
-        aparc,
-        roi_column="roi",
-        value_column="thickness",
-        side_column="side",
-        z_threshold=args.asymmetry_threshold,
+    run = cached_run(
+        parser, args, [args.aparc_csv, args.aseg_csv], [args.output_png, args.output]
     )
-    df_aseg = calculate_aseg_asymmetry_index(aseg, z_threshold=args.asymmetry_threshold)
+    if run.restore():
+        return
 
-    df_combined = pd.concat([df_aparc, df_aseg]).sort_values(
-        by="asymmetry_index", ascending=False
-    )
+    aparc, aseg = load_measures(args.aparc_csv, args.aseg_csv)
+    df_combined, df_aparc = evaluate_asymmetry(aparc, aseg, args.asymmetry_threshold)
 
-    roi_mapping = {  # Dictionary mapping FreeSurfer ROIs to full anatomical names
-        "Lateral-Ventricle": "Lateral ventricle",
-        "Inf-Lat-Vent": "Temporal horn of the lateral ventricle",
-        "Cerebellum-White-Matter": "White matter of left hemisphere of cerebellum",
-        "Cerebellum-Cortex": "Cerebellar cortex",
-        "Thalamus": "Thalamus",
-        "Caudate": "Caudate nucleus",
-        "Putamen": "Putamen",
-        "Pallidum": "Globus pallidus",
-        "3rd-Ventricle": "Third ventricle",
-        "4th-Ventricle": "Fourth ventricle",
-        "Brain-Stem": "Brainstem",
-        "Hippocampus": "Hippocampus proper",
-        "Amygdala": "Amygdala",
-        "CSF": "Cerebrospinal fluid",
-        "Accumbens-area": "Nucleus accumbens",
-        "VentralDC": "Ventral diencephalon",
-        "vessel": "Vessel",
-        "choroid-plexus": "Choroid plexus",
-        "5th-Ventricle": "Fifth ventricle",
-        "WM-hypointensities": "White matter hypointensities",
-        "non-WM-hypointensities": "Non white matter hypointensities",
-        "Optic-Chiasm": "Optic chiasm",
-        "CC_Posterior": "Posterior part of the corpus callosum",
-        "CC_Mid_Posterior": "Mid posterior part of the corpus callosum",
-        "CC_Central": "Central part of the corpus callosum",
-        "CC_Mid_Anterior": "Mid anterior part of the corpus callosum",
-        "CC_Anterior": "Anterior part of the corpus callosum",
-        "G_and_S_frontomargin": "Fronto-marginal gyrus (of Wernicke) and sulcus",
-        "G_and_S_occipital_inf": "Inferior occipital gyrus (O3) and sulcus",
-        "G_and_S_paracentral": "Paracentral lobule and sulcus",
-        "G_and_S_subcentral": "	Subcentral gyrus (central operculum) and sulci",
-        "G_and_S_transv_frontopol": "Transverse frontopolar gyri and sulci",
-        "G_and_S_cingul-Ant": "Anterior part of the cingulate gyrus and sulcus (ACC)",
-        "G_and_S_cingul-Mid-Ant": "Middle-anterior part of the\ncingulate gyrus and sulcus (aMCC)",
-        "G_and_S_cingul-Mid-Post": "Middle-posterior part of the\ncingulate gyrus and sulcus (pMCC)",
-        "G_cingul-Post-dorsal": "Posterior-dorsal part of the cingulate gyrus (dPCC)",
-        "G_cingul-Post-ventral": "Posterior-ventral part of the\ncingulate gyrus (vPCC, isthmus of the cingulate gyrus)",
-        "G_cuneus": "Cuneus (O6)",
-        "G_front_inf-Opercular": "Opercular part of the inferior frontal gyrus",
-        "G_front_inf-Orbital": "Orbital part of the inferior frontal gyrus",
-        "G_front_inf-Triangul": "Triangular part of the inferior frontal gyrus",
-        "G_front_middle": "Middle frontal gyrus (F2)",
-        "G_front_sup": "Superior frontal gyrus (F1)",
-        "G_Ins_lg_and_S_cent_ins": "Long insular gyrus and central sulcus of the insula",
-        "G_insular_short": "Short insular gyri",
-        "G_occipital_middle": "Middle occipital gyrus (O2, lateral occipital gyrus)",
-        "G_occipital_sup": "Superior occipital gyrus (O1)",
-        "G_oc-temp_lat-fusifor": "Lateral occipito-temporal gyrus (fusiform gyrus, O4-T4)",
-        "G_oc-temp_med-Lingual": "Lingual gyrus, ligual part of the\nmedial occipito-temporal gyrus, (O5)",
-        "G_oc-temp_med-Parahip": "Parahippocampal gyrus, parahippocampal\npart of the medial occipito-temporal gyrus, (T5)",
-        "G_orbital": "Orbital gyri",
-        "G_pariet_inf-Angular": "Angular gyrus",
-        "G_pariet_inf-Supramar": "Supramarginal gyrus",
-        "G_parietal_sup": "Superior parietal lobule (lateral part of P1)",
-        "G_postcentral": "Postcentral gyrus",
-        "G_precentral": "Precentral gyrus",
-        "G_precuneus": "Precuneus (medial part of P1)",
-        "G_rectus": "Straight gyrus, Gyrus rectus",
-        "G_subcallosal": "Subcallosal area, subcallosal gyrus",
-        "G_temp_sup-G_T_transv": "Anterior transverse temporal gyrus (of Heschl)",
-        "G_temp_sup-Lateral": "Lateral aspect of the superior temporal gyrus",
-        "G_temp_sup-Plan_polar": "Planum polare of the superior temporal gyrus",
-        "G_temp_sup-Plan_tempo": "Planum temporale or temporal plane of\nthe superior temporal gyrus",
-        "G_temporal_inf": "Inferior temporal gyrus (T3)",
-        "G_temporal_middle": "Middle temporal gyrus (T2)",
-        "Lat_Fis-ant-Horizont": "Horizontal ramus of the anterior segment of\nthe lateral sulcus (or fissure)",
-        "Lat_Fis-ant-Vertical": "Vertical ramus of the anterior segment of the\nlateral sulcus (or fissure)",
-        "Lat_Fis-post": "Posterior ramus (or segment) of the lateral sulcus (or fissure)",
-        "Pole_occipital": "Occipital pole",
-        "Pole_temporal": "Temporal pole",
-        "S_calcarine": "Calcarine sulcus",
-        "S_central": "Central sulcus (Rolando's fissure)",
-        "S_cingul-Marginalis": "Marginal branch (or part) of the cingulate sulcus",
-        "S_circular_insula_ant": "Anterior segment of the circular sulcus of the insula",
-        "S_circular_insula_inf": "Inferior segment of the circular sulcus of the insula",
-        "S_circular_insula_sup": "Superior segment of the circular sulcus of the insula",
-        "S_collat_transv_ant": "Anterior transverse collateral sulcus",
-        "S_collat_transv_post": "Posterior transverse collateral sulcus",
-        "S_front_inf": "Inferior frontal sulcus",
-        "S_front_middle": "Middle frontal sulcus",
-        "S_front_sup": "Superior frontal sulcus",
-        "S_interm_prim-Jensen": "Sulcus intermedius primus (of Jensen)",
-        "S_intrapariet_and_P_trans": "Intraparietal sulcus (interparietal sulcus)\nand transverse parietal sulci",
-        "S_oc_middle_and_Lunatus": "Middle occipital sulcus and lunatus sulcus",
-        "S_oc_sup_and_transversal": "Superior occipital sulcus and transverse\noccipital sulcus",
-        "S_occipital_ant": "Anterior occipital sulcus and preoccipital notch\n(temporo-occipital incisure)",
-        "S_oc-temp_lat": "Lateral occipito-temporal sulcus",
-        "S_oc-temp_med_and_Lingual": "Medial occipito-temporal sulcus (collateral sulcus)\nand lingual sulcus",
-        "S_orbital_lateral": "Lateral orbital sulcus",
-        "S_orbital_med-olfact": "Medial orbital sulcus (olfactory sulcus)",
-        "S_orbital-H_Shaped": "Orbital sulci (H-shaped sulci)",
-        "S_parieto_occipital": "Parieto-occipital sulcus (or fissure)",
-        "S_pericallosal": "Pericallosal sulcus (S of corpus callosum)",
-        "S_postcentral": "Postcentral sulcus",
-        "S_precentral-inf-part": "Inferior part of the precentral sulcus",
-        "S_precentral-sup-part": "Superior part of the precentral sulcus",
-        "S_suborbital": "Suborbital sulcus (sulcus rostrales, supraorbital sulcus)",
-        "S_subparietal": "Subparietal sulcus",
-        "S_temporal_inf": "Inferior temporal sulcus",
-        "S_temporal_sup": "Superior temporal sulcus (parallel sulcus)",
-        "S_temporal_transverse": "Transverse temporal sulcus",
-    }
-
-    plot_asymmetry_index(df_combined, df_aparc.index, roi_mapping, args.output_png)
+    plot_asymmetry_index(df_combined, df_aparc.index, ROI_MAPPING, args.output_png)
     df_combined.index.names = ["roi"]
     df_combined.reset_index(inplace=True)
     if args.output.lower().endswith(".csv"):
         df_combined.to_csv(args.output)
     else:
         df_combined.to_json(args.output, orient="records", indent=4)
+    run.store()
 
 
 if __name__ == "__main__":
@@ -1,78 +1,63 @@
 import os
 import argparse
-import pandas as pd
-import time
-import requests
-import json
+import csv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import shutil
+import threading
+
+from onsetpy.instrumentation import stage
+from onsetpy.io.utils import add_profile_arg
+from onsetpy.pacs.exceptions import (
+    OrthancConnectionError,
+    OrthancError,
+    OrthancHTTPError,
+    OrthancNotFoundError,
+    OrthancTimeoutError,
+    StudyNotFoundError,
+)
 
 
 def get_study_by_criteria(
-    orthanc_url,
+    pacs,
     accession_number,
-    username=None,
-    password=None,
 ):
     """
     Queries Orthanc to retrieve studies based on the patient ID, study date, and modality.
 
     Args:
-        orthanc_url (str): The base URL of your Orthanc server (e.g., "http://localhost:8042").
+        pacs (BlockingOrthancClient): The client of your Orthanc server.
         accession_number (str, optional): The accession number of the study to search for.
-        username (str, optional): Username for Orthanc authentication.
-        password (str, optional): Password for Orthanc authentication.
 
     Returns:
         list: A list of dictionaries, each representing a matching study with its details.
-              Returns an empty list if no study is found.
+              Returns an empty list if no study is found or if the query failed.
     """
-    auth = (username, password) if username and password else None
-    search_url = f"{orthanc_url}/tools/find"
-
-    # Build the DICOM Query/Retrieve (Q/R) request
-    query = {"Level": "Study", "Query": {"AccessionNumber": accession_number}}
-
-    headers = {"Content-Type": "application/json"}
-
     try:
-        response = requests.post(
-            search_url, data=json.dumps(query), auth=auth, headers=headers
-        )
-        response.raise_for_status()  # Raise an exception for HTTP error status codes
-
-        study_ids = response.json()
-        if not study_ids:
-            print(f"No study found for AccessionNumber: {accession_number}")
-            return []
-
-        found_studies = []
-        print(f"Studies found (IDs): {study_ids}")
-
-        # For each study ID found, retrieve the study details
-        for study_id in study_ids:
-            study_details_url = f"{orthanc_url}/studies/{study_id}"
-            details_response = requests.get(study_details_url, auth=auth)
-            details_response.raise_for_status()
-            found_studies.append(details_response.json())
-            print(f"Details of study {study_id} retrieved.")
+        # The query is expanded, so no request per study is needed for the details
+        found_studies = pacs.find(accession_number)
+    except OrthancError as e:
+        print(f"Error checking {accession_number} in Orthanc: {e}")
+        return []
 
-        return found_studies
-    except:
-        print("Error checking in PACS")
+    if not found_studies:
+        print(f"No study found for AccessionNumber: {accession_number}")
+        return []
+    print(f"Studies found (IDs): {[study['ID'] for study in found_studies]}")
+    return found_studies
 
 
 def find_and_retrieve_from_remote_aet(
-    orthanc_url,
+    pacs,
     remote_aet_name,
     accession_number,
     retrieve_aet_title=None,
-    username=None,
-    password=None,
+    timeout=3600,
 ):
     """
-    Queries a remote AET via Orthanc (C-FIND) and retrieves the found studies (C-MOVE/C-GET).
+    Queries a remote AET via Orthanc (C-FIND) and retrieves the found study (C-MOVE).
 
     Args:
-        orthanc_url (str): The base URL of your Orthanc server (e.g., "http://localhost:8042").
+        pacs (BlockingOrthancClient): The client of your Orthanc server.
         remote_aet_name (str): The name of the remote modality/AET configured in Orthanc
                                (e.g., "EXTERNAL_PACS"). This must be the name you assigned
                                to the external AET in your Orthanc configuration.
@@ -80,119 +65,303 @@ def find_and_retrieve_from_remote_aet(
         retrieve_aet_title (str, optional): The AET to retrieve the studies to.
                                             If None, Orthanc will attempt to retrieve them to itself.
                                             This is usually the AET of your Orthanc.
-        username (str, optional): Username for Orthanc authentication.
-        password (str, optional): Password for Orthanc authentication.
+        timeout (float, optional): Maximum time to wait for the retrieve job, in seconds.
 
     Returns:
-        list: A list of dictionaries, each representing a retrieved study with its details.
-              Returns an empty list if no study is found or if the retrieval fails.
+        str or None: The internal Orthanc ID of the retrieved study, or None if no study is
+                     found or if the retrieval fails.
     """
-    auth = (username, password) if username and password else None
-    find_url = f"{orthanc_url}/modalities/{remote_aet_name}/query"
-
-    # Build the C-FIND DICOM request
-    # "Study" level to find studies
-    query = {"Level": "Study", "Query": {"AccessionNumber": accession_number}}
-
-    headers = {"Content-Type": "application/json"}
-
     print(
         f"Attempting C-FIND on '{remote_aet_name}' for AccessionNumber: {accession_number}..."
     )
     try:
-        # Step 1: Execute the C-FIND to find studies
-        response = requests.post(
-            find_url, data=json.dumps(query), auth=auth, headers=headers
+        # The C-MOVE runs as an Orthanc job, which is awaited so that the study is complete
+        # before it is looked up and downloaded
+        job_id = pacs.retrieve(
+            remote_aet_name, accession_number, target_aet=retrieve_aet_title
         )
-        response.raise_for_status()  # Raise an exception for HTTP error status codes
+        print(f"Retrieve job {job_id} submitted for {accession_number}.")
+        pacs.wait_for_job(job_id, timeout=timeout)
 
-        study_instance_uids = response.json()
-        if not study_instance_uids:
-            print(f"No study found on '{remote_aet_name}' for the specified criteria.")
-            return []
+        studies_found = pacs.find(accession_number)
+        if not studies_found:
+            raise StudyNotFoundError(accession_number)
+        return studies_found[0]["ID"]
+    except StudyNotFoundError as e:
+        print(e)
+    except OrthancTimeoutError as e:
+        print(f"Timeout transferring {accession_number}: {e}")
+    except OrthancError as e:
+        print(f"Error transferring {accession_number}: {e}")
+    return None
 
-        print(
-            f"Studies found on '{remote_aet_name}' (StudyInstanceUIDs): {study_instance_uids}"
-        )
-        move_url = f"{orthanc_url}{study_instance_uids['Path']}/retrieve"
-        response = requests.post(
-            move_url, data=retrieve_aet_title, auth=auth, headers=headers
-        )
-        response.raise_for_status()  # Raise an exception for HTTP error status codes
-        print(response.text)
 
-        time.sleep(5)
-        studies_found = get_study_by_criteria(
-            orthanc_url=orthanc_url,
-            accession_number=accession_number,
-            username=username,
-            password=password,
-        )
-        return studies_found[0]["ID"]
-    except:
-        print(f"Error transferring for {accession_number}.")
-        return []
+def _progress(state, accession_number):
+    """
+    Returns the record of a study to resume its extraction from, if any.
+
+    Args:
+        state (ExtractionState or None): The extraction state.
+        accession_number (str): The accession number of the study.
+
+    Returns:
+        dict or None: The record of the study, or None if the study has no recorded step
+                      (a study with only an error recorded starts over).
+    """
+    from onsetpy.pacs.state import PENDING
+
+    record = state.get(accession_number) if state is not None else None
+    if record is not None and record["status"] == PENDING:
+        return None
+    return record
+
+
+def _record(state, accession_number, status, **kwargs):
+    """
+    Records the status of a study in the extraction state, if any.
+
+    Args:
+        state (ExtractionState or None): The extraction state.
+        accession_number (str): The accession number of the study.
+        status (str): The new status of the study.
+        **kwargs: Additional fields passed to ExtractionState.update.
+    """
+    if state is not None:
+        state.update(accession_number, status, **kwargs)
 
 
 def download_study_zip_by_id(
-    orthanc_url,
+    pacs,
     orthanc_study_id,
     output_filename="Study.zip",
-    username=None,
-    password=None,
+    state=None,
+    accession_number=None,
+    layout="zip",
 ):
     """
-    Downloads an Orthanc study as a ZIP file using its internal Orthanc ID.
+    Downloads an Orthanc study as a ZIP file using its internal Orthanc ID, then deletes it
+    from Orthanc.
+
+    With the "series" and "manifest" layouts, the archive is extracted while it is
+    downloaded: the DICOM files are written in one folder per series next to
+    output_filename, which is the CSV manifest of the extracted files.
 
     Args:
-        orthanc_url (str): The base URL of your Orthanc server (e.g., "http://localhost:8042").
+        pacs (BlockingOrthancClient): The client of your Orthanc server.
         orthanc_study_id (str): The internal Orthanc ID of the study (e.g., "6b9e19d9-62094390-5f9ddb01-4a191ae7-9766b715").
         output_filename (str): The name of the ZIP file to save. Defaults to "Study.zip".
-        username (str, optional): Username for Orthanc authentication.
-        password (str, optional): Password for Orthanc authentication.
+        state (ExtractionState, optional): The extraction state where the progress is
+                                           recorded. A study already verified is not
+                                           downloaded again.
+        accession_number (str, optional): The accession number of the study, required
+                                          with state.
+        layout (str, optional): "zip" to keep the archive, "series" to extract it in
+                                series folders or "manifest" to only list its files.
+                                Defaults to "zip".
 
     Returns:
         str or None: The full path to the downloaded file if successful, otherwise None.
     """
-    auth = (username, password) if username and password else None
-    download_url = f"{orthanc_url}/studies/{orthanc_study_id}/archive"
+    from onsetpy.pacs.archive import download_archive
+    from onsetpy.pacs.extract import extract_archive
 
     print(f"Attempting to download study {orthanc_study_id} as '{output_filename}'...")
 
     try:
-        # Use stream=True for potentially large files
-        response = requests.get(download_url, stream=True, auth=auth)
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-
-        with open(output_filename, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        record = state.get(accession_number) if state is not None else None
+        if record is None or record["status"] != "verified":
+            if layout == "zip":
+                # Streamed to a .part file, renamed once verified
+                download_archive(
+                    pacs,
+                    orthanc_study_id,
+                    output_filename,
+                    on_downloaded=lambda: _record(
+                        state, accession_number, "downloaded"
+                    ),
+                )
+            else:
+                # The manifest is written last, once every file passed its CRC check
+                extract_archive(
+                    pacs,
+                    orthanc_study_id,
+                    os.path.dirname(os.path.abspath(output_filename)),
+                    manifest_filename=output_filename,
+                    write_files=layout == "series",
+                )
+            _record(
+                state,
+                accession_number,
+                "verified",
+                output_file=os.path.abspath(output_filename),
+            )
 
         print(
             f"Study '{orthanc_study_id}' successfully downloaded to '{output_filename}'"
         )
-        delete_url = f"{orthanc_url}/studies/{orthanc_study_id}"
-        response = requests.delete(delete_url, auth=auth)
-        response.raise_for_status()
+        pacs.delete_study(orthanc_study_id)
+        _record(state, accession_number, "deleted")
         return os.path.abspath(output_filename)
 
-    except requests.exceptions.ConnectionError as e:
-        print(
-            f"Connection error: Could not connect to Orthanc at {orthanc_url}. Error: {e}"
-        )
+    except OrthancConnectionError as e:
+        print(f"Connection error: {e}")
         return None
-    except requests.exceptions.HTTPError as e:
-        print(
-            f"HTTP error during download: {e.response.status_code} - {e.response.text}"
-        )
-        if e.response.status_code == 404:
-            print(f"Error: Study with ID '{orthanc_study_id}' not found on Orthanc.")
+    except OrthancNotFoundError:
+        print(f"Error: Study with ID '{orthanc_study_id}' not found on Orthanc.")
+        return None
+    except OrthancHTTPError as e:
+        print(f"HTTP error during download: {e.status} - {e.body}")
         return None
     except Exception as e:
         print(f"An unexpected error occurred during download: {e}")
         return None
 
 
+def extract_study(
+    pacs,
+    accession_number,
+    output_file_path,
+    remote_aet_name,
+    retrieve_aet_title,
+    move_semaphore,
+    retrieve_timeout=3600,
+    study_index=None,
+    state=None,
+    layout="zip",
+):
+    """
+    Finds a study in Orthanc, retrieves it from the remote AET if needed and downloads it.
+
+    Args:
+        pacs (BlockingOrthancClient): The client of your Orthanc server.
+        accession_number (str): The accession number of the study.
+        output_file_path (str): The path of the ZIP file (or manifest, see layout) to save.
+        remote_aet_name (str): The name of the remote modality/AET configured in Orthanc.
+        retrieve_aet_title (str): The AET to retrieve the studies to.
+        move_semaphore (threading.Semaphore): Semaphore limiting the number of concurrent
+                                              C-MOVE on the remote PACS.
+        retrieve_timeout (float, optional): Maximum time to wait for the C-MOVE, in seconds.
+        study_index (dict, optional): Studies already looked up in Orthanc, indexed by
+                                      accession number (see AsyncOrthancClient.find_many).
+        state (ExtractionState, optional): The extraction state. The extraction resumes
+                                           from the last step recorded for the study.
+        layout (str, optional): How the study is stored (see download_study_zip_by_id).
+
+    Returns:
+        str or None: The full path to the downloaded file if successful, otherwise None.
+    """
+    record = _progress(state, accession_number)
+    if record is not None and record["status"] == "deleted":
+        print(
+            f"Study '{accession_number}' already extracted to '{record['output_file']}'"
+        )
+        return record["output_file"]
+    if record is None and os.path.exists(output_file_path):
+        print(f"Study '{accession_number}' already exists at '{output_file_path}'")
+        return output_file_path
+
+    if record is not None and record["orthanc_id"]:
+        orthanc_retrieved_id = record["orthanc_id"]
+    else:
+        if study_index is not None and accession_number in study_index:
+            studies_found = study_index[accession_number]
+        else:
+            studies_found = get_study_by_criteria(pacs, accession_number)
+        if not studies_found:
+            with move_semaphore, stage("retrieve", accession_number=accession_number):
+                orthanc_retrieved_id = find_and_retrieve_from_remote_aet(
+                    pacs=pacs,
+                    remote_aet_name=remote_aet_name,
+                    accession_number=accession_number,
+                    retrieve_aet_title=retrieve_aet_title,
+                    timeout=retrieve_timeout,
+                )
+            if not orthanc_retrieved_id:
+                return None
+            _record(state, accession_number, "moved", orthanc_id=orthanc_retrieved_id)
+        else:
+            orthanc_retrieved_id = studies_found[0]["ID"]
+            _record(state, accession_number, "found", orthanc_id=orthanc_retrieved_id)
+
+    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    with stage("download", accession_number=accession_number):
+        return download_study_zip_by_id(
+            pacs=pacs,
+            orthanc_study_id=orthanc_retrieved_id,
+            output_filename=output_file_path,
+            state=state,
+            accession_number=accession_number,
+            layout=layout,
+        )
+
+
+def copy_study(output_file, output_file_path, layout="zip"):
+    """
+    Copies an extracted study to another output path, e.g. for a study listed in the CSV
+    under several patients or sessions.
+
+    Args:
+        output_file (str): The path of the extracted ZIP file (or manifest, see layout).
+        output_file_path (str): The path of the copy.
+        layout (str, optional): How the study is stored (see download_study_zip_by_id).
+                                With the "series" layout, the series folders listed in
+                                the manifest are copied as well.
+
+    Returns:
+        str: The full path to the copy.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_file_path)), exist_ok=True)
+    if layout == "series":
+        source_dir = os.path.dirname(os.path.abspath(output_file))
+        output_dir = os.path.dirname(os.path.abspath(output_file_path))
+        with open(output_file, newline="") as f:
+            for series, filename, _ in list(csv.reader(f))[1:]:
+                os.makedirs(os.path.join(output_dir, series), exist_ok=True)
+                shutil.copy2(
+                    os.path.join(source_dir, series, filename),
+                    os.path.join(output_dir, series, filename),
+                )
+    # The manifest (or archive) is copied last, so that it still marks a complete study
+    shutil.copy2(output_file, f"{output_file_path}.part")
+    os.replace(f"{output_file_path}.part", output_file_path)
+    return os.path.abspath(output_file_path)
+
+
+def extract_study_to_paths(
+    pacs, accession_number, output_file_paths, *args, layout="zip", **kwargs
+):
+    """
+    Extracts a study once to its first output path, then copies it to the others.
+
+    A study is only moved, downloaded and deleted from Orthanc by one worker, even if the
+    CSV lists its accession number several times.
+
+    Args:
+        pacs (BlockingOrthancClient): The client of your Orthanc server.
+        accession_number (str): The accession number of the study.
+        output_file_paths (list): The output paths of the study, in the order of the CSV.
+        *args, **kwargs: Arguments passed to extract_study.
+        layout (str, optional): How the study is stored (see download_study_zip_by_id).
+
+    Returns:
+        str or None: The full path to the first output if successful, otherwise None.
+    """
+    output_file = extract_study(
+        pacs,
+        accession_number,
+        output_file_paths[0],
+        *args,
+        layout=layout,
+        **kwargs,
+    )
+    if output_file is None:
+        return None
+    for output_file_path in output_file_paths[1:]:
+        if not os.path.exists(output_file_path):
+            copy_study(output_file, output_file_path, layout)
+    return output_file
+
+
 def main():
     parser = argparse.ArgumentParser(description="Export patients form Orthanc PACS")
     parser.add_argument("csv_path", help="Path to the CSV file")
@@ -202,54 +371,116 @@ def main():
     parser.add_argument("--orthanc_password", required=True, help="Orthanc Password")
     parser.add_argument("--remote_aet_name", required=True, help="Remote AET Name")
     parser.add_argument("--my_orthanc_aet", required=True, help="My Orthanc AET")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of studies processed in parallel [%(default)s].",
+    )
+    parser.add_argument(
+        "--max_moves",
+        type=int,
+        default=1,
+        help="Maximum number of concurrent C-MOVE on the remote PACS [%(default)s].",
+    )
+    parser.add_argument(
+        "--retrieve_timeout",
+        type=float,
+        default=3600,
+        help="Maximum time to wait for a C-MOVE to complete, in seconds [%(default)s].",
+    )
+    parser.add_argument(
+        "--state_db",
+        help="SQLite database recording the progress of each study, used to resume "
+        "an interrupted extraction [output_folder/.extraction_state.sqlite].",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=["zip", "series", "manifest"],
+        default="zip",
+        help="How each study is stored: 'zip' keeps the Orthanc archive, 'series' "
+        "extracts the DICOM files into patient/session/series folders while "
+        "downloading, and 'manifest' only writes the list of SOPInstanceUIDs "
+        "[%(default)s].",
+    )
+    add_profile_arg(parser)
     args = parser.parse_args()
 
-    ORTHANC_URL = args.orthanc_url
-    ORTHANC_USERNAME = args.orthanc_username
-    ORTHANC_PASSWORD = args.orthanc_password
-    REMOTE_AET_NAME = args.remote_aet_name
-    MY_ORTHANC_AET = args.my_orthanc_aet
+    if args.workers < 1 or args.max_moves < 1:
+        parser.error("--workers and --max_moves must be at least 1.")
+
+    # The HTTP and data libraries are slow to import, so they are only loaded once the
+    # arguments are validated
+    import pandas as pd
+
+    from onsetpy.pacs.aio import BlockingOrthancClient
+    from onsetpy.pacs.state import ExtractionState
 
     os.makedirs(args.output_folder, exist_ok=True)
     df = pd.read_csv(args.csv_path)
+    state = ExtractionState(
+        args.state_db or os.path.join(args.output_folder, ".extraction_state.sqlite")
+    )
 
+    studies = {}
     for idx, row in df.iterrows():
         an_to_find = str(row["AccessionNumber"]).strip()
         if len(an_to_find) != 14:
             an_to_find += "01"
         patient_folder = os.path.join(args.output_folder, str(row["Patient Name"]))
         session_folder = os.path.join(patient_folder, str(row["session"]))
-        output_file_path = os.path.join(session_folder, f"{an_to_find}.zip")
-        if not os.path.exists(output_file_path):
-
-            studies_found = get_study_by_criteria(
-                ORTHANC_URL,
-                an_to_find,
-                username=ORTHANC_USERNAME,
-                password=ORTHANC_PASSWORD,
-            )
-            if len(studies_found) == 0:
-                orthanc_retrieved_id = find_and_retrieve_from_remote_aet(
-                    orthanc_url=ORTHANC_URL,
-                    remote_aet_name=REMOTE_AET_NAME,
-                    accession_number=an_to_find,
-                    retrieve_aet_title=MY_ORTHANC_AET,
-                    username=ORTHANC_USERNAME,
-                    password=ORTHANC_PASSWORD,
-                )
-            else:
-                orthanc_retrieved_id = studies_found[0]["ID"]
-
-            os.makedirs(session_folder, exist_ok=True)
-            download_study_zip_by_id(
-                orthanc_url=ORTHANC_URL,
-                orthanc_study_id=orthanc_retrieved_id,
-                output_filename=output_file_path,
-                username=ORTHANC_USERNAME,
-                password=ORTHANC_PASSWORD,
-            )
+        if args.layout == "zip":
+            output_file_path = os.path.join(session_folder, f"{an_to_find}.zip")
         else:
-            print(f"Study '{an_to_find}' already exists at '{output_file_path}'")
+            output_file_path = os.path.join(
+                session_folder, f"{an_to_find}_manifest.csv"
+            )
+        # A study listed several times is extracted by a single worker, which would
+        # otherwise move, download and delete it concurrently with another one
+        output_file_paths = studies.setdefault(an_to_find, [])
+        if output_file_path not in output_file_paths:
+            output_file_paths.append(output_file_path)
+
+    # The requests of all the workers are multiplexed on the event loop of this client,
+    # so the whole CSV is looked up at once rather than a query per thread
+    pacs = BlockingOrthancClient(
+        args.orthanc_url,
+        username=args.orthanc_username,
+        password=args.orthanc_password,
+    )
+    study_index = pacs.find_many(
+        [
+            an_to_find
+            for an_to_find, output_file_paths in studies.items()
+            if _progress(state, an_to_find) is None
+            and not os.path.exists(output_file_paths[0])
+        ]
+    )
+    move_semaphore = threading.BoundedSemaphore(args.max_moves)
+    with state, pacs, ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(
+                extract_study_to_paths,
+                pacs,
+                an_to_find,
+                output_file_paths,
+                args.remote_aet_name,
+                args.my_orthanc_aet,
+                move_semaphore,
+                retrieve_timeout=args.retrieve_timeout,
+                study_index=study_index,
+                state=state,
+                layout=args.layout,
+            ): an_to_find
+            for an_to_find, output_file_paths in studies.items()
+        }
+        for future in as_completed(futures):
+            try:
+                if future.result() is None:
+                    state.record_error(futures[future], "Extraction failed")
+            except Exception as e:
+                print(f"Error extracting study '{futures[future]}': {e}")
+                state.record_error(futures[future], e)
 
 
 if __name__ == "__main__":
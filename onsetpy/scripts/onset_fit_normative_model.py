@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Fit a covariate-adjusted normative model of connectivity matrices on controls.
+
+Every edge is regressed on the covariates (e.g. age and sex) of the controls. All the
+edges are fitted at once from a single QR factorization of the design matrix, and the
+coefficients and residual variances are saved in a .npz model, to be used with
+onset_zscore_connectivity_matrix --model.
+
+The covariates are read from a CSV table with one row per control, in the same order as
+the input matrices. Categorical covariates must be coded as numbers (e.g. sex as 0/1).
+"""
+
+import argparse
+import logging
+
+import numpy as np
+
+from onsetpy.io.matrix import load_matrix
+from onsetpy.io.utils import (
+    add_overwrite_arg,
+    add_profile_arg,
+    add_verbose_arg,
+    add_version_arg,
+    assert_inputs_exist,
+    assert_matrices_compatible,
+    assert_outputs_exist,
+)
+from onsetpy.stats.normative import NormativeModel, read_covariates
+
+
+def _build_arg_parser():
+    """Build argparser.
+
+    Returns:
+        parser (ArgumentParser): Parser built.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "input",
+        nargs="+",
+        help="Path to the control connectivity matrices in .npy format",
+    )
+    parser.add_argument(
+        "--covariates",
+        required=True,
+        help="Path to the CSV table of the covariates of the controls.",
+    )
+    parser.add_argument(
+        "--columns",
+        nargs="+",
+        required=True,
+        help="Columns of the covariates in the table (e.g. age sex).",
+    )
+    parser.add_argument(
+        "--out_model",
+        default="normative_model.npz",
+        help="Path to the output normative model [%(default)s].",
+    )
+
+    add_verbose_arg(parser)
+    add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_version_arg(parser)
+    return parser
+
+
+def main():
+    parser = _build_arg_parser()
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.getLevelName(args.verbose))
+
+    assert_inputs_exist(parser, args.input + [args.covariates])
+    assert_outputs_exist(parser, args, args.out_model)
+
+    control_matrices = load_matrix(args.input)
+    assert_matrices_compatible(parser, control_matrices)
+
+    try:
+        covariates = read_covariates(args.covariates, args.columns)
+        model = NormativeModel.fit(covariates, np.stack(control_matrices), args.columns)
+    except ValueError as e:
+        parser.error(str(e))
+    model.save(args.out_model)
+
+    logging.info(f"Number of connectivity matrices processed: {len(control_matrices)}")
+    logging.info(f"Covariates of the model: {', '.join(args.columns)}")
+    logging.info(f"Model saved in: {args.out_model}")
+
+
+if __name__ == "__main__":
+    main()
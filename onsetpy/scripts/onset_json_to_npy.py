@@ -9,15 +9,18 @@ import json
 import logging
 import numpy as np
 import os
+from onsetpy.instrumentation import timed
 from onsetpy.io.utils import (
     add_verbose_arg,
     add_overwrite_arg,
     assert_inputs_exist,
     assert_outputs_exist,
+    add_profile_arg,
     add_version_arg,
 )
 
 
+@timed()
 def json_to_npy(json_file: str, output_dir: str):
     """Convert JSON file to multiple NPY files.
 
@@ -53,6 +56,7 @@ def _build_arg_parser():
 
     add_verbose_arg(parser)
     add_overwrite_arg(parser)
+    add_profile_arg(parser)
     add_version_arg(parser)
     return parser
 
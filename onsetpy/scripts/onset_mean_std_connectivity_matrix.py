@@ -2,36 +2,101 @@
 
 """
 Compute mean and std connectivity matrices from multiple connectivity matrices.
+
+The matrices are streamed one at a time, so the memory does not depend on their number.
+With --precision float32, the statistics are accumulated and saved in float32, halving
+the memory traffic and the output size, within a few float32 ulps of the float64 path
+(see onsetpy.stats.running for the error bound).
+
+With --out_sketch, a per-edge quantile sketch of the matrices is also saved. Its memory
+does not depend on the number of matrices, and onset_zscore_connectivity_matrix uses it
+to compute robust z-scores from the median and the MAD of each edge.
 """
 
 import argparse
 import logging
 import numpy as np
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 
+from onsetpy.instrumentation import timed
 from onsetpy.io.matrix import save_matrix, load_matrix
+from onsetpy.io.cache import cached_run
 from onsetpy.io.utils import (
+    add_cache_arg,
     add_verbose_arg,
     add_overwrite_arg,
+    add_profile_arg,
     add_version_arg,
     assert_inputs_exist,
     assert_matrices_compatible,
     assert_outputs_exist,
 )
+from onsetpy.stats.running import PRECISIONS, RunningStats
+from onsetpy.stats.sketch import EdgeHistogram
+
 
+@timed()
+def accumulate_stats(
+    matrices: Iterable[np.ndarray],
+    precision: str = "float64",
+    n_bins: Optional[int] = None,
+) -> Tuple[RunningStats, Optional[EdgeHistogram]]:
+    """Accumulate the statistics of connectivity matrices in a single pass.
+
+    Args:
+        matrices (Iterable[np.ndarray]): Connectivity matrices, streamed one at a time.
+        precision (str, optional): Accumulation and output precision, float32 or
+            float64. Defaults to float64.
+        n_bins (int, optional): Number of histogram bins of each edge in the quantile
+            sketch. Defaults to None (no sketch).
 
-def calculate_stats(matrices: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    Returns:
+        Tuple[RunningStats, Optional[EdgeHistogram]]: The running statistics, and the
+            quantile sketch if n_bins is given.
+
+    Raises:
+        ValueError: If there are no matrices or if their shapes differ.
+    """
+    stats = sketch = None
+    for matrix in matrices:
+        if stats is None:
+            stats = RunningStats(matrix.shape, precision)
+            if n_bins is not None:
+                sketch = EdgeHistogram(matrix.shape, n_bins)
+        stats.update(matrix)
+        if sketch is not None:
+            sketch.update(matrix)
+    if stats is None:
+        raise ValueError("No matrices to compute the statistics of.")
+    return stats, sketch
+
+
+def calculate_stats(
+    matrices: Iterable[np.ndarray], precision: str = "float64"
+) -> Tuple[np.ndarray, np.ndarray]:
     """Compute mean and std connectivity matrices.
 
     Args:
-        matrices (List[np.ndarray]): Connectivity matrices.
+        matrices (Iterable[np.ndarray]): Connectivity matrices, streamed one at a time.
+        precision (str, optional): Accumulation and output precision, float32 or
+            float64. Defaults to float64.
 
     Returns:
         List[np.ndarray, np.ndarray]: Mean and std connectivity matrices.
     """
-    mean_matrix = np.mean(matrices, axis=0)
-    std_matrix = np.std(matrices, axis=0, ddof=1)
-    return mean_matrix, std_matrix
+    stats, _ = accumulate_stats(matrices, precision)
+    return stats.mean, stats.std()
+
+
+def _load_matrices(parser, filenames: List[str]) -> Iterator[np.ndarray]:
+    """Load the matrices one at a time, checking that they have the same shape."""
+    previous = None
+    for filename in filenames:
+        matrix = load_matrix(filename)
+        if previous is not None:
+            assert_matrices_compatible(parser, [previous, matrix])
+        previous = matrix
+        yield matrix
 
 
 def _build_arg_parser():
@@ -56,9 +121,27 @@ def _build_arg_parser():
         default="std_matrix.npy",
         help="Path to the output std connectivity matrix [%(default)s].",
     )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default="float64",
+        help="Precision of the accumulation and of the outputs [%(default)s].",
+    )
+    parser.add_argument(
+        "--out_sketch",
+        help="Path to the output per-edge quantile sketch (.npz).",
+    )
+    parser.add_argument(
+        "--n_bins",
+        type=int,
+        default=128,
+        help="Number of histogram bins of each edge in the sketch [%(default)s].",
+    )
 
     add_verbose_arg(parser)
     add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_cache_arg(parser)
     add_version_arg(parser)
     return parser
 
@@ -69,18 +152,32 @@ def main():
     logging.getLogger().setLevel(logging.getLevelName(args.verbose))
 
     assert_inputs_exist(parser, args.input)
-    assert_outputs_exist(parser, args, [args.out_mean, args.out_std])
+    if args.n_bins < 2 or args.n_bins % 2:
+        parser.error("--n_bins must be a positive even number.")
+    assert_outputs_exist(parser, args, [args.out_mean, args.out_std], args.out_sketch)
+    run = cached_run(
+        parser, args, args.input, [args.out_mean, args.out_std, args.out_sketch]
+    )
+    if run.restore():
+        return
 
-    control_matrices = load_matrix(args.input)
-    assert_matrices_compatible(parser, control_matrices)
+    stats, sketch = accumulate_stats(
+        _load_matrices(parser, args.input),
+        args.precision,
+        args.n_bins if args.out_sketch else None,
+    )
 
-    mean_matrix, std_matrix = calculate_stats(control_matrices)
+    mean_matrix, std_matrix = stats.mean, stats.std()
     save_matrix(mean_matrix, args.out_mean)
     save_matrix(std_matrix, args.out_std)
+    if sketch is not None:
+        sketch.save(args.out_sketch)
+        logging.info(f"Quantile sketch saved in: {args.out_sketch}")
 
-    logging.info(f"Number of connectivity matrices processed: {len(control_matrices)}")
+    logging.info(f"Number of connectivity matrices processed: {stats.n}")
     logging.info(f"Shape of mean and std matrices: {mean_matrix.shape}")
     logging.info(f"Results saved in: {args.out_mean} and {args.out_std}")
+    run.store()
 
 
 if __name__ == "__main__":
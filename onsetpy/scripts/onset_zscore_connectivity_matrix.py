@@ -2,6 +2,23 @@
 
 """
 Compute z-score matrices from base matrices using mean and std connectivity matrices.
+
+With --sketch, robust z-scores (x - median) / (1.4826 * MAD) are computed instead, from
+the per-edge quantile sketch saved by onset_mean_std_connectivity_matrix --out_sketch.
+
+With --model, each base matrix is compared to the prediction of a normative model
+(onset_fit_normative_model) for its own covariates, read from the --covariates table
+(one row per base matrix, in the same order).
+
+With --leave_one_out, the base matrices are controls, and each one is compared to the
+mean and std of all the other controls, to check for false positives. The N leave-one-out
+statistics are computed in closed form from the statistics of the whole cohort, in a
+single pass over the controls.
+
+Each base matrix gives a dense z-score matrix <out_prefix>_<i>.npy (unless --no_dense),
+and optionally sparse CSV tables of its abnormal edges, with their node labels:
+    <out_prefix>_<i>_outliers.csv   edges with |z| >= --threshold
+    <out_prefix>_<i>_top_edges.csv  the --top_k edges with the largest |z|
 """
 
 import argparse
@@ -9,17 +26,25 @@ import logging
 import numpy as np
 from typing import List
 
+from onsetpy.instrumentation import timed
 from onsetpy.io.matrix import save_matrix, load_matrix
 from onsetpy.io.utils import (
     add_verbose_arg,
     add_overwrite_arg,
+    add_profile_arg,
     add_version_arg,
     assert_inputs_exist,
     assert_matrices_compatible,
     assert_outputs_exist,
 )
+from onsetpy.graph.sparse import read_labels
+from onsetpy.stats.normative import load_model, read_covariates
+from onsetpy.stats.outliers import save_edge_table, threshold_edges, top_k_edges
+from onsetpy.stats.running import running_stats
+from onsetpy.stats.sketch import MAD_SCALE, load_sketch
 
 
+@timed()
 def calculate_z_scores(
     mean_matrix: np.ndarray, std_matrix: np.ndarray, base_matrices: List[np.ndarray]
 ) -> List[np.ndarray]:
@@ -40,6 +65,24 @@ def calculate_z_scores(
     return z_score_matrices
 
 
+@timed()
+def calculate_leave_one_out_z_scores(matrices: List[np.ndarray]) -> List[np.ndarray]:
+    """Compute the z-score matrix of each matrix against all the other matrices.
+
+    Args:
+        matrices (List[np.ndarray]): Connectivity matrices, at least 3.
+
+    Returns:
+        List[np.ndarray]: List of leave-one-out z-score matrices.
+    """
+    stats = running_stats(matrices)
+    z_score_matrices = []
+    for matrix in matrices:
+        mean_matrix, std_matrix = stats.leave_one_out(matrix)
+        z_score_matrices.append((matrix - mean_matrix) / std_matrix)
+    return z_score_matrices
+
+
 def _build_arg_parser():
     """Build argparser.
 
@@ -51,14 +94,33 @@ def _build_arg_parser():
     )
     parser.add_argument(
         "--mean",
-        required=True,
         help="Path to the mean connectivity matrix in .npy format",
     )
     parser.add_argument(
         "--std",
-        required=True,
         help="Path to the standard deviation connectivity matrix in .npy format",
     )
+    parser.add_argument(
+        "--sketch",
+        help="Path to a per-edge quantile sketch (.npz), to compute robust z-scores\n"
+        "instead of using --mean and --std.",
+    )
+    parser.add_argument(
+        "--model",
+        help="Path to a normative model (.npz), to compute covariate-adjusted\n"
+        "z-scores instead of using --mean and --std.",
+    )
+    parser.add_argument(
+        "--covariates",
+        help="Path to the CSV table of the covariates of the base matrices, required\n"
+        "with --model.",
+    )
+    parser.add_argument(
+        "--leave_one_out",
+        action="store_true",
+        help="Compare each base matrix to all the other base matrices, instead of\n"
+        "using --mean and --std.",
+    )
     parser.add_argument(
         "base_matrices",
         nargs="+",
@@ -69,9 +131,30 @@ def _build_arg_parser():
         default="z_score_matrix",
         help="Prefix for the output z-score matrices [%(default)s].",
     )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        help="Save the edges with |z| >= threshold of each base matrix as a sparse\n"
+        "CSV table.",
+    )
+    parser.add_argument(
+        "--top_k",
+        type=int,
+        help="Save the k edges with the largest |z| of each base matrix as a CSV table.",
+    )
+    parser.add_argument(
+        "--labels",
+        help="Text file with the name of each node, one per line, for the edge tables.",
+    )
+    parser.add_argument(
+        "--no_dense",
+        action="store_true",
+        help="Do not save the dense z-score matrices.",
+    )
 
     add_verbose_arg(parser)
     add_overwrite_arg(parser)
+    add_profile_arg(parser)
     add_version_arg(parser)
     return parser
 
@@ -81,23 +164,95 @@ def main():
     args = parser.parse_args()
     logging.getLogger().setLevel(logging.getLevelName(args.verbose))
 
-    assert_inputs_exist(parser, [args.mean, args.std] + args.base_matrices)
-
-    mean_matrix = load_matrix(args.mean)
-    std_matrix = load_matrix(args.std)
+    if args.no_dense and args.threshold is None and args.top_k is None:
+        parser.error("--no_dense requires --threshold or --top_k.")
+    if args.threshold is not None and args.threshold < 0:
+        parser.error("--threshold must be positive.")
+    if args.top_k is not None and args.top_k < 1:
+        parser.error("--top_k must be at least 1.")
+    if args.labels:
+        assert_inputs_exist(parser, args.labels)
+    modes = [args.mean or args.std, args.sketch, args.model, args.leave_one_out]
+    if sum(map(bool, modes)) > 1:
+        parser.error(
+            "Use only one of --mean and --std, --sketch, --model or --leave_one_out."
+        )
+    if args.leave_one_out:
+        if len(args.base_matrices) < 3:
+            parser.error("--leave_one_out needs at least 3 base matrices.")
+        assert_inputs_exist(parser, args.base_matrices)
+    elif args.model:
+        if not args.covariates:
+            parser.error("--covariates is required with --model.")
+        assert_inputs_exist(parser, [args.model, args.covariates] + args.base_matrices)
+    elif args.sketch:
+        assert_inputs_exist(parser, [args.sketch] + args.base_matrices)
+        try:
+            sketch = load_sketch(args.sketch)
+        except ValueError as e:
+            parser.error(str(e))
+        mean_matrix = sketch.median()
+        std_matrix = MAD_SCALE * sketch.mad()
+    else:
+        if not (args.mean and args.std):
+            parser.error(
+                "Either --mean and --std, --sketch, --model or --leave_one_out is "
+                "required."
+            )
+        assert_inputs_exist(parser, [args.mean, args.std] + args.base_matrices)
+        mean_matrix = load_matrix(args.mean)
+        std_matrix = load_matrix(args.std)
     base_matrices = load_matrix(args.base_matrices)
 
-    assert_matrices_compatible(parser, [mean_matrix, std_matrix] + base_matrices)
+    if args.leave_one_out:
+        assert_matrices_compatible(parser, base_matrices)
+        z_score_matrices = calculate_leave_one_out_z_scores(base_matrices)
+    elif args.model:
+        try:
+            model = load_model(args.model)
+            covariates = read_covariates(args.covariates, model.covariate_names)
+            if len(covariates) != len(base_matrices):
+                parser.error(
+                    f"{args.covariates} has {len(covariates)} rows for "
+                    f"{len(base_matrices)} base matrices."
+                )
+            assert_matrices_compatible(parser, [model.coefficients[0]] + base_matrices)
+            z_score_matrices = list(model.z_scores(covariates, base_matrices))
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        assert_matrices_compatible(parser, [mean_matrix, std_matrix] + base_matrices)
+        z_score_matrices = calculate_z_scores(mean_matrix, std_matrix, base_matrices)
 
-    z_score_matrices = calculate_z_scores(mean_matrix, std_matrix, base_matrices)
+    labels = read_labels(args.labels) if args.labels else None
+    if labels is not None and len(labels) != len(z_score_matrices[0]):
+        parser.error(f"Expected {len(z_score_matrices[0])} labels, got {len(labels)}.")
 
+    outputs = {"dense": "{}_{}.npy"} if not args.no_dense else {}
+    if args.threshold is not None:
+        outputs["outliers"] = "{}_{}_outliers.csv"
+    if args.top_k is not None:
+        outputs["top_edges"] = "{}_{}_top_edges.csv"
     output_files = [
-        f"{args.out_prefix}_{i+1}.npy" for i in range(len(z_score_matrices))
+        {
+            name: pattern.format(args.out_prefix, i + 1)
+            for name, pattern in outputs.items()
+        }
+        for i in range(len(z_score_matrices))
     ]
-    assert_outputs_exist(parser, args, output_files)
+    assert_outputs_exist(
+        parser, args, [f for files in output_files for f in files.values()]
+    )
 
-    for i, z_score_matrix in enumerate(z_score_matrices):
-        save_matrix(z_score_matrix, output_files[i])
+    for z_score_matrix, files in zip(z_score_matrices, output_files):
+        if "dense" in files:
+            save_matrix(z_score_matrix, files["dense"])
+        if "outliers" in files:
+            edges = threshold_edges(z_score_matrix, args.threshold)
+            save_edge_table(files["outliers"], edges, labels)
+        if "top_edges" in files:
+            edges = top_k_edges(z_score_matrix, args.top_k)
+            save_edge_table(files["top_edges"], edges, labels)
 
     logging.info(f"Number of base matrices processed: {len(base_matrices)}")
     logging.info(f"Shape of z-score matrices: {z_score_matrices[0].shape}")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Convert a connectivity matrix or an edge table into a sparse graph file.
+
+The input is either a dense connectivity matrix in .npy format, or a long-format edge
+table (.csv or .tsv) with one row per edge. The graph only stores the non-zero edges, in
+compressed sparse row layout, with the name of each node. It is saved in the onsetpy
+binary graph format (.npz), loaded with onsetpy.graph.sparse.load_graph.
+
+The graph can be thresholded on the edge weights (--threshold), on the density
+(--density, the strongest edges being kept) or both.
+"""
+
+import argparse
+import logging
+import os
+
+from onsetpy.io.utils import (
+    add_overwrite_arg,
+    add_profile_arg,
+    add_verbose_arg,
+    add_version_arg,
+    assert_inputs_exist,
+    assert_outputs_exist,
+)
+
+TABLE_SEPARATORS = {".csv": ",", ".tsv": "\t"}
+
+
+def _build_arg_parser():
+    """Build argparser.
+
+    Returns:
+        parser (ArgumentParser): Parser built.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "input", help="Connectivity matrix (.npy) or edge table (.csv or .tsv)."
+    )
+    parser.add_argument("output", help="Output graph file (.npz).")
+    parser.add_argument(
+        "--labels",
+        help="Text file with the name of each node, one per line. For a matrix, the\n"
+        "lines follow the rows. For a table, nodes without edges must be listed.",
+    )
+    parser.add_argument(
+        "--directed",
+        action="store_true",
+        help="Build a directed graph. By default, a matrix is directed only if it is\n"
+        "not symmetric, and a table is undirected.",
+    )
+
+    table = parser.add_argument_group("Edge table options")
+    table.add_argument(
+        "--source_column",
+        default="source",
+        help="Column of the source node names [%(default)s].",
+    )
+    table.add_argument(
+        "--target_column",
+        default="target",
+        help="Column of the target node names [%(default)s].",
+    )
+    table.add_argument(
+        "--weight_column",
+        default="weight",
+        help="Column of the edge weights [%(default)s].",
+    )
+    table.add_argument(
+        "--unweighted",
+        action="store_true",
+        help="Ignore the weights, all the edges having a weight of 1.",
+    )
+    table.add_argument(
+        "--sum_duplicates",
+        action="store_true",
+        help="Sum the weights of the edges listed in several rows. By default, an edge\n"
+        "may only be listed once per direction, and an undirected edge listed in both\n"
+        "directions must have the same weight.",
+    )
+
+    thresholds = parser.add_argument_group("Thresholding options")
+    thresholds.add_argument(
+        "--threshold", type=float, help="Minimum weight of the edges kept."
+    )
+    thresholds.add_argument(
+        "--density",
+        type=float,
+        help="Fraction of the possible edges kept, the strongest first.",
+    )
+    thresholds.add_argument(
+        "--absolute",
+        action="store_true",
+        help="Threshold on the absolute value of the weights.",
+    )
+
+    add_verbose_arg(parser)
+    add_overwrite_arg(parser)
+    add_profile_arg(parser)
+    add_version_arg(parser)
+    return parser
+
+
+def main():
+    parser = _build_arg_parser()
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.getLevelName(args.verbose))
+
+    assert_inputs_exist(parser, args.input, args.labels)
+    assert_outputs_exist(parser, args, args.output)
+
+    extension = os.path.splitext(args.input)[1].lower()
+    if extension != ".npy" and extension not in TABLE_SEPARATORS:
+        parser.error(f"Unsupported input format: {args.input}")
+    if args.density is not None and not 0 <= args.density <= 1:
+        parser.error("--density must be between 0 and 1.")
+
+    from onsetpy.graph.sparse import SparseGraph, read_labels
+    from onsetpy.io.matrix import load_matrix
+
+    labels = read_labels(args.labels) if args.labels else None
+
+    if extension == ".npy":
+        matrix = load_matrix(args.input)
+        if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+            parser.error(f"{args.input} is not a square matrix.")
+        if labels is not None and len(labels) != len(matrix):
+            parser.error(f"Expected {len(matrix)} labels, got {len(labels)}.")
+        graph = SparseGraph.from_dense(
+            matrix, labels, directed=True if args.directed else None
+        )
+    else:
+        import pandas as pd
+
+        df = pd.read_csv(args.input, sep=TABLE_SEPARATORS[extension])
+        columns = [args.source_column, args.target_column]
+        if not args.unweighted:
+            columns.append(args.weight_column)
+        missing = [column for column in columns if column not in df.columns]
+        if missing:
+            parser.error(f"Missing columns in {args.input}: {', '.join(missing)}")
+        try:
+            graph = SparseGraph.from_dataframe(
+                df,
+                args.source_column,
+                args.target_column,
+                None if args.unweighted else args.weight_column,
+                labels,
+                args.directed,
+                args.sum_duplicates,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.threshold is not None or args.density is not None:
+        graph = graph.threshold(args.threshold, args.density, args.absolute)
+
+    graph.save(args.output)
+    logging.info(f"{graph}, {graph.nbytes / 2**20:.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
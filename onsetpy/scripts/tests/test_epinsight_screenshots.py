@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from onsetpy.cli.main import run_command
+from onsetpy.scripts.onset_epinsight_screenshots import (
+    load_slices,
+    render_screenshots,
+)
+
+COORDS = (10, 12, 8)
+
+
+class TestEpinsightScreenshots(unittest.TestCase):
+    def setUp(self):
+        import nibabel as nib
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.image_paths = []
+        for i in range(4):
+            # Different sizes, so the images finish loading out of order
+            shape = (20 + 8 * (3 - i), 24, 16)
+            data = (rng.random(shape) * (i + 1) * 100).astype(np.float32)
+            path = os.path.join(self.temp_dir.name, f"image_{i}.nii.gz")
+            nib.save(nib.Nifti1Image(data, np.eye(4)), path)
+            self.image_paths.append(path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _render(self, workers):
+        import matplotlib.pyplot as plt
+
+        figure = render_screenshots(
+            self.image_paths,
+            [f"Image {i}" for i in range(len(self.image_paths))],
+            ["gray", "hot", "gray", "viridis"],
+            COORDS,
+            workers,
+        )
+        try:
+            figure.canvas.draw()
+            rows = [
+                [axis.images[0].get_array() for axis in row]
+                for row in np.reshape(figure.axes, (-1, 3))
+            ]
+            return rows, np.asarray(figure.canvas.buffer_rgba()).copy()
+        finally:
+            plt.close(figure)
+
+    def test_rows_in_input_order(self):
+        _, serial_pixels = self._render(workers=1)
+        for workers in (2, None):
+            with self.subTest(workers=workers):
+                rows, pixels = self._render(workers)
+                np.testing.assert_array_equal(pixels, serial_pixels)
+                for image_path, row in zip(self.image_paths, rows):
+                    slices = load_slices(image_path, COORDS)[:3]
+                    for displayed, expected in zip(row, slices):
+                        np.testing.assert_array_equal(displayed, expected.T)
+
+    def test_slices_own_their_data(self):
+        # The volume is freed as soon as its slices are extracted
+        for slice_ in load_slices(self.image_paths[0], COORDS)[:3]:
+            self.assertIsNone(slice_.base)
+
+    def test_invalid_workers(self):
+        output_path = os.path.join(self.temp_dir.name, "screenshot.png")
+        exit_code = run_command(
+            "epinsight_screenshots",
+            [
+                "--image_paths",
+                self.image_paths[0],
+                "--titles",
+                "Image",
+                "--cmaps",
+                "gray",
+                "--coord",
+                *map(str, COORDS),
+                "--output_path",
+                output_path,
+                "--workers",
+                "0",
+            ],
+        )
+        self.assertEqual(exit_code, 2)
+        self.assertFalse(os.path.exists(output_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
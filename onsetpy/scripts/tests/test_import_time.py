@@ -0,0 +1,76 @@
+import re
+import subprocess
+import sys
+
+import pytest
+
+SCRIPTS = [
+    "onset_compare_connectivity_groups",
+    "onset_compute_graph_metrics",
+    "onset_convert_fs_stats",
+    "onset_create_epinsight_report",
+    "onset_create_surgeryflow_report",
+    "onset_epinsight_pipeline",
+    "onset_epinsight_screenshots",
+    "onset_evaluate_cortical_measures",
+    "onset_extract_patients_from_pacs",
+    "onset_fit_normative_model",
+    "onset_json_to_npy",
+    "onset_mean_std_connectivity_matrix",
+    "onset_zscore_connectivity_matrix",
+    "pandas_to_graph",
+]
+
+# Modules which must only be imported once the arguments are parsed and validated
+HEAVY_MODULES = [
+    "aiohttp",
+    "importlib.metadata",
+    "matplotlib",
+    "nibabel",
+    "pandas",
+    "requests",
+    "seaborn",
+    "weasyprint",
+]
+
+# Generous budget for CI machines, the imports take a few tens of milliseconds locally
+IMPORT_BUDGET_US = 500_000
+
+
+def _run_help(script):
+    """Runs the --help of a script with -X importtime.
+
+    Returns:
+        tuple: The heavy modules loaded and the cumulative import time of the script, in
+               microseconds.
+    """
+    code = (
+        "import sys\n"
+        f"sys.argv = [{script!r}, '--help']\n"
+        f"from onsetpy.scripts.{script} import main\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = result.stdout.strip().splitlines()[-1]
+    match = re.search(
+        rf"^import time:\s+\d+ \|\s+(\d+) \| onsetpy\.scripts\.{script}$",
+        result.stderr,
+        re.MULTILINE,
+    )
+    return loaded, int(match.group(1))
+
+
+@pytest.mark.parametrize("script", SCRIPTS)
+def test_help_does_not_import_heavy_modules(script):
+    loaded, cumulative_us = _run_help(script)
+    assert loaded == "[]"
+    assert cumulative_us < IMPORT_BUDGET_US
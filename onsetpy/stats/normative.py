@@ -0,0 +1,277 @@
+"""
+Covariate-adjusted normative models of connectivity matrices.
+
+Age and sex explain a large part of the variance of the connectivity, so comparing a
+patient to the mean of all the controls mixes the effect of the covariates with the
+effect of the disease. NormativeModel regresses every edge of the control matrices on the
+covariates,
+
+    w_e = X @ beta_e + noise,   noise ~ N(0, sigma_e²),
+
+and scores a patient against the prediction of its own covariates.
+
+All the edges share the same design matrix X (N, p), so they are fitted at once as a
+single multi-output least-squares problem: X is factorized once (X = QR), and the
+coefficients of every edge come from one (p, N) @ (N, E) product followed by a single
+p x p solve with R.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from onsetpy.instrumentation import BYTES_READ, BYTES_WRITTEN, count_file, stage, timed
+
+MODEL_FORMAT = "onsetpy.normative.1"
+
+
+def design_matrix(covariates: np.ndarray) -> np.ndarray:
+    """Design matrix of the covariates: an intercept followed by the covariates.
+
+    Args:
+        covariates (np.ndarray): (N, k) covariates of the subjects.
+
+    Returns:
+        np.ndarray: (N, k + 1) design matrix.
+    """
+    covariates = np.asarray(covariates, dtype=np.float64)
+    if covariates.ndim == 1:
+        covariates = covariates[:, np.newaxis]
+    return np.column_stack([np.ones(len(covariates)), covariates])
+
+
+def read_covariates(input_name: str, columns: Sequence[str]) -> np.ndarray:
+    """Reads covariates from a CSV table with one row per subject.
+
+    Args:
+        input_name (str): CSV filename.
+        columns (Sequence[str]): Columns of the covariates. Categorical covariates must
+            be coded as numbers (e.g. sex as 0/1).
+
+    Returns:
+        np.ndarray: (N, k) covariates.
+
+    Raises:
+        ValueError: If a column is missing or is not numeric.
+    """
+    import pandas as pd
+
+    with stage("read_covariates", path=str(input_name)):
+        table = pd.read_csv(input_name)
+    missing = [column for column in columns if column not in table.columns]
+    if missing:
+        raise ValueError(f"Columns not found in {input_name}: {', '.join(missing)}.")
+    table = table[list(columns)]
+    non_numeric = [
+        column for column in columns if not pd.api.types.is_numeric_dtype(table[column])
+    ]
+    if non_numeric:
+        raise ValueError(
+            f"Covariates must be numeric (e.g. sex coded as 0/1): "
+            f"{', '.join(non_numeric)}."
+        )
+    return table.to_numpy(dtype=np.float64)
+
+
+class NormativeModel:
+    def __init__(
+        self,
+        coefficients: np.ndarray,
+        residual_variance: np.ndarray,
+        xtx_inverse: np.ndarray,
+        n_subjects: int,
+        covariate_names: Optional[Sequence[str]] = None,
+    ):
+        """
+        Initializes a fitted model. Use NormativeModel.fit to fit a model on controls.
+
+        Args:
+            coefficients (np.ndarray): (p, R, R) coefficients, the intercept first.
+            residual_variance (np.ndarray): (R, R) unbiased residual variance.
+            xtx_inverse (np.ndarray): (p, p) inverse of X^T X, for the prediction
+                variance.
+            n_subjects (int): Number of controls of the fit.
+            covariate_names (Sequence[str], optional): Names of the p - 1 covariates.
+                Defaults to their indices.
+        """
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.residual_variance = np.asarray(residual_variance, dtype=np.float64)
+        self.xtx_inverse = np.asarray(xtx_inverse, dtype=np.float64)
+        self.n_subjects = int(n_subjects)
+        if covariate_names is None:
+            covariate_names = [str(i) for i in range(self.n_covariates)]
+        self.covariate_names = [str(name) for name in covariate_names]
+        if len(self.covariate_names) != self.n_covariates:
+            raise ValueError(
+                f"Expected {self.n_covariates} covariate names, "
+                f"got {len(self.covariate_names)}."
+            )
+
+    @property
+    def n_covariates(self) -> int:
+        """Number of covariates, without the intercept."""
+        return len(self.coefficients) - 1
+
+    @property
+    def shape(self):
+        """Shape of the matrices."""
+        return self.coefficients.shape[1:]
+
+    @classmethod
+    @timed("fit_normative_model")
+    def fit(
+        cls,
+        covariates: np.ndarray,
+        matrices: np.ndarray,
+        covariate_names: Optional[Sequence[str]] = None,
+    ) -> "NormativeModel":
+        """Fits the model of every edge on the matrices of the controls.
+
+        Args:
+            covariates (np.ndarray): (N, k) covariates of the controls.
+            matrices (np.ndarray): (N, R, R) matrices of the controls.
+            covariate_names (Sequence[str], optional): Names of the k covariates.
+
+        Returns:
+            NormativeModel: The fitted model.
+
+        Raises:
+            ValueError: If the covariates and the matrices do not match, if there are
+                not more controls than coefficients or if the covariates are collinear.
+        """
+        matrices = np.asarray(matrices, dtype=np.float64)
+        design = design_matrix(covariates)
+        n_subjects, n_coefficients = design.shape
+        if len(matrices) != n_subjects:
+            raise ValueError(
+                f"Got {n_subjects} rows of covariates for {len(matrices)} matrices."
+            )
+        if n_subjects <= n_coefficients:
+            raise ValueError(
+                f"The model needs more than {n_coefficients} controls, got {n_subjects}."
+            )
+        if not np.all(np.isfinite(design)):
+            raise ValueError("Covariates contain non-finite values.")
+
+        q, r = np.linalg.qr(design)
+        diagonal = np.abs(np.diag(r))
+        if diagonal.min() <= diagonal.max() * n_subjects * np.finfo(float).eps:
+            raise ValueError("The covariates are collinear (or constant).")
+
+        edges = matrices.reshape(n_subjects, -1)
+        coefficients = np.linalg.solve(r, q.T @ edges)
+        residuals = edges - design @ coefficients
+        residual_variance = np.einsum("ne,ne->e", residuals, residuals)
+        residual_variance /= n_subjects - n_coefficients
+        r_inverse = np.linalg.inv(r)
+
+        return cls(
+            coefficients.reshape((n_coefficients,) + matrices.shape[1:]),
+            residual_variance.reshape(matrices.shape[1:]),
+            r_inverse @ r_inverse.T,
+            n_subjects,
+            covariate_names,
+        )
+
+    def _design(self, covariates: np.ndarray) -> np.ndarray:
+        design = design_matrix(covariates)
+        if design.shape[1] != len(self.coefficients):
+            raise ValueError(
+                f"Expected {self.n_covariates} covariates, got {design.shape[1] - 1}."
+            )
+        return design
+
+    def predict(self, covariates: np.ndarray) -> np.ndarray:
+        """Expected matrices of subjects with the given covariates.
+
+        Args:
+            covariates (np.ndarray): (M, k) covariates of the subjects.
+
+        Returns:
+            np.ndarray: (M, R, R) predicted matrices.
+        """
+        design = self._design(covariates)
+        coefficients = self.coefficients.reshape(len(self.coefficients), -1)
+        return (design @ coefficients).reshape((len(design),) + self.shape)
+
+    def z_scores(self, covariates: np.ndarray, matrices: np.ndarray) -> np.ndarray:
+        """Z-scores of the matrices of new subjects against the model.
+
+        The deviation from the prediction is divided by the standard deviation of the
+        prediction error of a new subject, sigma² (1 + x^T (X^T X)^-1 x), which accounts
+        for the uncertainty of the coefficients far from the covariates of the controls.
+
+        Args:
+            covariates (np.ndarray): (M, k) covariates of the subjects.
+            matrices (np.ndarray): (M, R, R) matrices of the subjects.
+
+        Returns:
+            np.ndarray: (M, R, R) z-score matrices.
+        """
+        design = self._design(covariates)
+        matrices = np.asarray(matrices, dtype=np.float64)
+        if matrices.shape != (len(design),) + self.shape:
+            raise ValueError(
+                f"Expected {len(design)} matrices of shape {self.shape}, "
+                f"got {matrices.shape}."
+            )
+        leverage = np.einsum("mi,ij,mj->m", design, self.xtx_inverse, design)
+        std = np.sqrt(np.multiply.outer(1 + leverage, self.residual_variance))
+        return (matrices - self.predict(covariates)) / std
+
+    def save(self, output_name: str) -> None:
+        """Saves the model in the onsetpy normative model format (.npz).
+
+        Args:
+            output_name (str): Output filename.
+        """
+        with stage("save_normative_model", path=str(output_name)):
+            with open(output_name, "wb") as f:
+                np.savez(
+                    f,
+                    format=np.array(MODEL_FORMAT),
+                    coefficients=self.coefficients,
+                    residual_variance=self.residual_variance,
+                    xtx_inverse=self.xtx_inverse,
+                    n_subjects=np.array(self.n_subjects),
+                    covariate_names=np.array(self.covariate_names, dtype=str),
+                )
+            count_file(BYTES_WRITTEN, output_name)
+
+    def __repr__(self):
+        covariates = ", ".join(self.covariate_names)
+        return (
+            f"NormativeModel({self.shape}, covariates [{covariates}], "
+            f"{self.n_subjects} controls)"
+        )
+
+
+def load_model(input_name: str) -> NormativeModel:
+    """Loads a model saved by NormativeModel.save.
+
+    Args:
+        input_name (str): Model filename.
+
+    Returns:
+        NormativeModel: The model.
+
+    Raises:
+        ValueError: If the file is not an onsetpy normative model.
+    """
+    with stage("load_normative_model", path=str(input_name)):
+        count_file(BYTES_READ, input_name)
+        f = np.load(input_name, allow_pickle=False)
+        if not isinstance(f, np.lib.npyio.NpzFile):
+            raise ValueError(f"{input_name} is not an onsetpy normative model file.")
+        with f:
+            if "format" not in f or str(f["format"]) != MODEL_FORMAT:
+                raise ValueError(
+                    f"{input_name} is not an onsetpy normative model file."
+                )
+            return NormativeModel(
+                f["coefficients"],
+                f["residual_variance"],
+                f["xtx_inverse"],
+                int(f["n_subjects"]),
+                f["covariate_names"],
+            )
@@ -0,0 +1,103 @@
+"""
+Sparse extraction of the abnormal edges of z-score matrices.
+
+Only the edges far from the norm are of clinical interest, so instead of a dense (R, R)
+z-score matrix, the abnormal edges of a patient can be kept as a COO table: the row and
+column of each edge, its node labels and its z-score, sorted by decreasing |z|.
+
+Symmetric matrices only report the upper triangle, so that each edge appears once. The
+diagonal (self-connections) and the non-finite z-scores (e.g. edges with a null std in
+the controls) are never reported.
+"""
+
+import csv
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from onsetpy.instrumentation import BYTES_WRITTEN, count_file, stage
+
+EDGE_COLUMNS = ("row", "col", "row_label", "col_label", "z_score")
+
+EdgeTable = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _candidate_edges(z_scores: np.ndarray) -> EdgeTable:
+    """Row, column and z-score of the edges which can be reported."""
+    z_scores = np.asarray(z_scores)
+    if z_scores.ndim != 2 or z_scores.shape[0] != z_scores.shape[1]:
+        raise ValueError(f"Expected a square z-score matrix, got {z_scores.shape}.")
+    if np.array_equal(z_scores, z_scores.T, equal_nan=True):
+        rows, cols = np.triu_indices(len(z_scores), 1)
+    else:
+        rows, cols = np.nonzero(~np.eye(len(z_scores), dtype=bool))
+    values = z_scores[rows, cols]
+    finite = np.isfinite(values)
+    return rows[finite], cols[finite], values[finite]
+
+
+def _by_decreasing_magnitude(rows, cols, values) -> EdgeTable:
+    order = np.argsort(-np.abs(values), kind="stable")
+    return rows[order], cols[order], values[order]
+
+
+def threshold_edges(z_scores: np.ndarray, threshold: float) -> EdgeTable:
+    """Edges whose z-score is beyond ±threshold.
+
+    Args:
+        z_scores (np.ndarray): (R, R) z-score matrix.
+        threshold (float): Threshold on |z|.
+
+    Returns:
+        EdgeTable: Rows, columns and z-scores of the edges, by decreasing |z|.
+    """
+    rows, cols, values = _candidate_edges(z_scores)
+    beyond = np.abs(values) >= threshold
+    return _by_decreasing_magnitude(rows[beyond], cols[beyond], values[beyond])
+
+
+def top_k_edges(z_scores: np.ndarray, k: int) -> EdgeTable:
+    """The k edges with the largest |z|.
+
+    np.argpartition selects them in linear time, and only these k edges are sorted.
+
+    Args:
+        z_scores (np.ndarray): (R, R) z-score matrix.
+        k (int): Number of edges, fewer if the matrix has fewer reportable edges.
+
+    Returns:
+        EdgeTable: Rows, columns and z-scores of the edges, by decreasing |z|.
+
+    Raises:
+        ValueError: If k is not positive.
+    """
+    if k < 1:
+        raise ValueError(f"k must be positive, got {k}.")
+    rows, cols, values = _candidate_edges(z_scores)
+    if k < len(values):
+        top = np.argpartition(-np.abs(values), k - 1)[:k]
+        rows, cols, values = rows[top], cols[top], values[top]
+    return _by_decreasing_magnitude(rows, cols, values)
+
+
+def save_edge_table(
+    output_name: str, edges: EdgeTable, labels: Optional[Sequence[str]] = None
+) -> None:
+    """Saves edges as a CSV table with the EDGE_COLUMNS columns.
+
+    Args:
+        output_name (str): Output filename.
+        edges (EdgeTable): Rows, columns and z-scores of the edges.
+        labels (Sequence[str], optional): Name of each node. Defaults to the node
+            indices.
+    """
+    rows, cols, values = edges
+    with stage("save_edge_table", path=str(output_name)):
+        with open(output_name, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(EDGE_COLUMNS)
+            for row, col, value in zip(rows.tolist(), cols.tolist(), values.tolist()):
+                row_label = labels[row] if labels is not None else row
+                col_label = labels[col] if labels is not None else col
+                writer.writerow([row, col, row_label, col_label, f"{value:.6g}"])
+        count_file(BYTES_WRITTEN, output_name)
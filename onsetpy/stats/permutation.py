@@ -0,0 +1,343 @@
+"""
+Edge-wise two-sample tests with permutation-based family-wise error control.
+
+The connectivity matrices of the two groups are flattened to their upper triangle and
+stacked into one contiguous (N, E) array. A permutation reassigns the subjects to the
+groups, so its group sums are a product of a 0/1 assignment row with this array: a batch
+of permutations is evaluated with two matrix products, (P, N) @ (N, E), for the sums and
+the sums of squares of all the edges at once.
+
+Two corrections for the multiple comparisons are derived from the same permutations:
+
+    - max-statistic: the p-value of an edge is the fraction of the permutations whose
+      largest statistic over all the edges exceeds the statistic of the edge,
+    - Network-Based Statistic (Zalesky et al., 2010): the edges whose statistic exceeds a
+      primary threshold form connected components, whose p-value is the fraction of the
+      permutations whose largest component has at least as many edges.
+
+The permutations are split into batches of fixed size, each drawn from its own random
+stream, so the results for a given seed do not depend on the number of processes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+from typing import Optional
+
+import numpy as np
+
+from onsetpy.instrumentation import timed
+
+TAILS = ("two-sided", "greater", "less")
+
+# Maximum number of float64 in the (P, E) arrays of a batch (64 MiB)
+_MAX_BATCH_ITEMS = 8 * 2**20
+
+# Data shared with the worker processes, set once per worker by _init_worker
+_WORKER = {}
+
+
+def cohort_to_edges(cohort: np.ndarray) -> np.ndarray:
+    """Flattens the upper triangle of connectivity matrices.
+
+    Args:
+        cohort (np.ndarray): (N, R, R) connectivity matrices.
+
+    Returns:
+        np.ndarray: (N, E) contiguous array, E = R (R - 1) / 2, the edges being in the order
+                    of np.triu_indices(R, 1).
+    """
+    cohort = np.asarray(cohort)
+    rows, cols = np.triu_indices(cohort.shape[-1], 1)
+    return np.ascontiguousarray(cohort[:, rows, cols], dtype=float)
+
+
+def edges_to_matrix(
+    values: np.ndarray, n_nodes: int, diagonal: float = 0
+) -> np.ndarray:
+    """Builds the symmetric matrix of edge values given in np.triu_indices order.
+
+    Args:
+        values (np.ndarray): (E,) values of the edges.
+        n_nodes (int): Number of nodes R.
+        diagonal (float, optional): Value of the diagonal. Defaults to 0.
+
+    Returns:
+        np.ndarray: (R, R) symmetric matrix.
+    """
+    matrix = np.full((n_nodes, n_nodes), diagonal, dtype=np.result_type(values, float))
+    rows, cols = np.triu_indices(n_nodes, 1)
+    matrix[rows, cols] = values
+    matrix[cols, rows] = values
+    return matrix
+
+
+def _t_statistics(assignments, edges, squares, totals, n_a, equal_var):
+    """Two-sample t statistics of a batch of group assignments.
+
+    Args:
+        assignments (np.ndarray): (P, N) 0/1 float array, 1 for the subjects of group A.
+        edges (np.ndarray): (N, E) centered edge values.
+        squares (np.ndarray): (N, E) squares of the centered edge values.
+        totals (tuple): Sums of edges and squares over all the subjects.
+        n_a (int): Number of subjects in group A.
+        equal_var (bool): Student's t with pooled variance, or Welch's t.
+
+    Returns:
+        np.ndarray: (P, E) t statistics, 0 where both groups have no variance.
+    """
+    n_b = len(edges) - n_a
+    sum_a = assignments @ edges
+    squares_a = assignments @ squares
+    sum_b = totals[0] - sum_a
+    squares_b = totals[1] - squares_a
+
+    # Sums of squared deviations, clipped as the subtraction can round below 0
+    deviations_a = np.maximum(squares_a - sum_a**2 / n_a, 0)
+    deviations_b = np.maximum(squares_b - sum_b**2 / n_b, 0)
+    difference = sum_a / n_a - sum_b / n_b
+    if equal_var:
+        pooled = (deviations_a + deviations_b) / (n_a + n_b - 2)
+        variance = pooled * (1 / n_a + 1 / n_b)
+    else:
+        variance = deviations_a / (n_a * (n_a - 1)) + deviations_b / (n_b * (n_b - 1))
+    standard_error = np.sqrt(variance)
+    return np.divide(
+        difference,
+        standard_error,
+        out=np.zeros_like(difference),
+        where=standard_error > 0,
+    )
+
+
+def _oriented(statistics, tail):
+    """Statistics oriented so that large values are evidence against the null."""
+    if tail == "two-sided":
+        return np.abs(statistics)
+    return statistics if tail == "greater" else -statistics
+
+
+def _components(supra, rows, cols, n_nodes):
+    """Connected components of the supra-threshold edges of a batch of statistic maps.
+
+    The graphs of the batch are labelled together, node i of permutation p being node
+    p * n_nodes + i, by propagating the smallest node index along the edges.
+
+    Args:
+        supra (np.ndarray): (P, E) boolean supra-threshold edges.
+        rows, cols (np.ndarray): (E,) nodes of the edges.
+        n_nodes (int): Number of nodes R.
+
+    Returns:
+        tuple: (P * R,) component label of each node and (P, R) number of edges of the
+               component of each label.
+    """
+    n_maps = len(supra)
+    labels = np.arange(n_maps * n_nodes)
+    map_index, edge_index = np.nonzero(supra)
+    u = map_index * n_nodes + rows[edge_index]
+    v = map_index * n_nodes + cols[edge_index]
+    while len(u):
+        hooked = labels.copy()
+        smallest = np.minimum(labels[u], labels[v])
+        np.minimum.at(hooked, u, smallest)
+        np.minimum.at(hooked, v, smallest)
+        hooked = hooked[hooked]
+        if np.array_equal(hooked, labels):
+            break
+        labels = hooked
+    sizes = np.bincount(labels[u], minlength=n_maps * n_nodes)
+    return labels, sizes.reshape(n_maps, n_nodes)
+
+
+def _null_p_values(null, observed):
+    """Fraction of a null distribution at least as large as the observed values.
+
+    The observed values count as one sample of the null distribution, so the p-values are
+    never 0.
+    """
+    null = np.sort(null)
+    exceeding = len(null) - np.searchsorted(null, observed, side="left")
+    return (1 + exceeding) / (1 + len(null))
+
+
+def _statistic_args(data):
+    """Arguments of _t_statistics taken from the shared data of a test."""
+    return {
+        "edges": data["edges"],
+        "squares": data["squares"],
+        "totals": data["totals"],
+        "n_a": data["n_a"],
+        "equal_var": data["equal_var"],
+    }
+
+
+def _init_worker(data):
+    """Shares the data of the test with a worker process."""
+    _WORKER.update(data)
+
+
+def _run_batch(task):
+    """Evaluates one batch of random permutations.
+
+    Args:
+        task (tuple): Random seed sequence and number of permutations of the batch.
+
+    Returns:
+        tuple: (P,) maximum statistic, (P,) maximum component size (or None without NBS)
+               and (E,) number of permutations exceeding the observed statistic of each
+               edge.
+    """
+    seed, n_permutations = task
+    data = _WORKER
+    rng = np.random.default_rng(seed)
+    assignments = rng.permuted(
+        np.tile(data["observed_assignment"], (n_permutations, 1)), axis=1
+    )
+    statistics = _oriented(
+        _t_statistics(assignments, **_statistic_args(data)), data["tail"]
+    )
+    max_statistics = statistics.max(axis=1)
+    exceedances = np.count_nonzero(statistics >= data["observed"], axis=0)
+    max_sizes = None
+    if data["nbs_threshold"] is not None:
+        _, sizes = _components(
+            statistics > data["nbs_threshold"],
+            data["rows"],
+            data["cols"],
+            data["n_nodes"],
+        )
+        max_sizes = sizes.max(axis=1)
+    return max_statistics, max_sizes, exceedances
+
+
+@timed()
+def permutation_test(
+    group_a: np.ndarray,
+    group_b: np.ndarray,
+    n_permutations: int = 10000,
+    tail: str = "two-sided",
+    equal_var: bool = True,
+    nbs_threshold: Optional[float] = None,
+    processes: Optional[int] = 1,
+    seed: Optional[int] = None,
+    batch_size: Optional[int] = None,
+) -> dict:
+    """Edge-wise two-sample t-tests between two groups, corrected by permutations.
+
+    Args:
+        group_a (np.ndarray): (Na, R, R) connectivity matrices of the first group.
+        group_b (np.ndarray): (Nb, R, R) connectivity matrices of the second group.
+        n_permutations (int, optional): Number of permutations. Defaults to 10000.
+        tail (str, optional): Alternative hypothesis, from TAILS: "greater" tests
+            A > B. Defaults to "two-sided".
+        equal_var (bool, optional): Student's t with pooled variance if True, Welch's t
+            otherwise. Defaults to True.
+        nbs_threshold (float, optional): Primary threshold on the (oriented) t statistic
+            of the Network-Based Statistic. Defaults to None (no NBS).
+        processes (int, optional): Number of worker processes, None for one per CPU.
+            Defaults to 1 (computed in the current process).
+        seed (int, optional): Seed of the permutations. Defaults to None.
+        batch_size (int, optional): Number of permutations evaluated per matrix product.
+            Defaults to a batch of about 64 MiB.
+
+    Returns:
+        dict: (R, R) matrices "t" (observed statistics), "p_uncorrected" and "p_fwe"
+              (max-statistic corrected p-values). With NBS, "nbs_p" holds the p-value of
+              the component of each edge (1 outside the components) and "nbs_components"
+              lists the components, largest first, as dicts with their "nodes", number of
+              "edges" and "p" value.
+
+    Raises:
+        ValueError: If the groups are incompatible or too small.
+    """
+    if tail not in TAILS:
+        raise ValueError(f"tail must be one of {TAILS}, got {tail}.")
+    group_a, group_b = np.asarray(group_a), np.asarray(group_b)
+    if group_a.ndim != 3 or group_a.shape[1:] != group_b.shape[1:]:
+        raise ValueError("The groups must be (N, R, R) arrays of the same R.")
+    n_a, n_b = len(group_a), len(group_b)
+    if n_a < 2 or n_b < 2:
+        raise ValueError("Each group must have at least 2 subjects.")
+    n_nodes = group_a.shape[1]
+
+    edges = cohort_to_edges(np.concatenate([group_a, group_b]))
+    # Centering the edges limits the cancellation in the variances computed from sums
+    edges -= edges.mean(axis=0)
+    squares = edges**2
+    observed_assignment = np.zeros(n_a + n_b)
+    observed_assignment[:n_a] = 1
+    rows, cols = np.triu_indices(n_nodes, 1)
+    data = {
+        "edges": edges,
+        "squares": squares,
+        "totals": (edges.sum(axis=0), squares.sum(axis=0)),
+        "n_a": n_a,
+        "equal_var": equal_var,
+        "tail": tail,
+        "observed_assignment": observed_assignment,
+        "nbs_threshold": nbs_threshold,
+        "rows": rows,
+        "cols": cols,
+        "n_nodes": n_nodes,
+    }
+
+    t = _t_statistics(observed_assignment[np.newaxis], **_statistic_args(data))[0]
+    data["observed"] = _oriented(t, tail)
+
+    batch_size = batch_size or max(1, min(1000, _MAX_BATCH_ITEMS // len(rows)))
+    sizes = [batch_size] * (n_permutations // batch_size)
+    if n_permutations % batch_size:
+        sizes.append(n_permutations % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(seeds, sizes))
+
+    if processes == 1 or len(tasks) <= 1:
+        _init_worker(data)
+        try:
+            results = [_run_batch(task) for task in tasks]
+        finally:
+            _WORKER.clear()
+    else:
+        with ProcessPoolExecutor(
+            processes or os.cpu_count(), initializer=_init_worker, initargs=(data,)
+        ) as executor:
+            results = list(executor.map(_run_batch, tasks))
+
+    max_statistics = np.concatenate([r[0] for r in results])
+    exceedances = np.sum([r[2] for r in results], axis=0)
+    p_uncorrected = (1 + exceedances) / (1 + n_permutations)
+    p_fwe = _null_p_values(max_statistics, data["observed"])
+
+    output = {
+        "t": edges_to_matrix(t, n_nodes),
+        "p_uncorrected": edges_to_matrix(p_uncorrected, n_nodes, diagonal=1),
+        "p_fwe": edges_to_matrix(p_fwe, n_nodes, diagonal=1),
+    }
+    if nbs_threshold is not None:
+        max_sizes = np.concatenate([r[1] for r in results])
+        output.update(
+            _nbs_components(
+                data["observed"] > nbs_threshold, max_sizes, rows, cols, n_nodes
+            )
+        )
+    return output
+
+
+def _nbs_components(supra, max_sizes, rows, cols, n_nodes):
+    """Components of the observed supra-threshold edges and their NBS p-values."""
+    labels, sizes = _components(supra[np.newaxis], rows, cols, n_nodes)
+    edge_labels = labels[rows]
+    p_edges = np.ones(len(rows))
+    components = []
+    for label in np.flatnonzero(sizes[0]):
+        n_edges = int(sizes[0, label])
+        p = float(_null_p_values(max_sizes, n_edges))
+        members = supra & (edge_labels == label)
+        p_edges[members] = p
+        nodes = np.union1d(rows[members], cols[members])
+        components.append({"nodes": nodes.tolist(), "edges": n_edges, "p": p})
+    components.sort(key=lambda component: -component["edges"])
+    return {
+        "nbs_p": edges_to_matrix(p_edges, n_nodes, diagonal=1),
+        "nbs_components": components,
+    }
@@ -0,0 +1,287 @@
+"""
+Streaming per-edge quantile sketches of connectivity matrices.
+
+The median, the MAD and percentile-based normative ranges need the distribution of every
+edge, which an exact computation only gets by keeping the whole (N, R, R) cohort in
+memory. EdgeHistogram keeps instead a fixed-bin histogram of each edge, stored as a single
+(R * R, n_bins) array of counts: its memory only depends on the matrix shape and on the
+number of bins, not on the number of subjects.
+
+The first n_bins matrices are kept as they are, so the statistics of small cohorts are
+exact. The histograms are then built over the range of these matrices, and the range of
+an edge is doubled (merging its bins in pairs) whenever a new value falls outside of it.
+The quantiles are interpolated linearly within the bins, so their error is at most the
+width of one bin of the edge.
+"""
+
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+
+from onsetpy.instrumentation import BYTES_READ, BYTES_WRITTEN, count_file, stage
+
+SKETCH_FORMAT = "onsetpy.sketch.1"
+# Consistency constant of the MAD as an estimator of the std of a normal distribution
+MAD_SCALE = 1.4826
+# Number of bisection steps of the MAD, enough to reach the float64 resolution
+_MAD_STEPS = 60
+
+
+class EdgeHistogram:
+    def __init__(self, shape: Tuple[int, ...], n_bins: int = 128):
+        """
+        Initializes an empty sketch.
+
+        Args:
+            shape (Tuple[int, ...]): Shape of the matrices, e.g. (R, R).
+            n_bins (int, optional): Number of bins of each edge, which must be even.
+                Defaults to 128.
+
+        Raises:
+            ValueError: If n_bins is not a positive even number.
+        """
+        if n_bins < 2 or n_bins % 2:
+            raise ValueError(f"n_bins must be a positive even number, got {n_bins}.")
+        self.shape = tuple(int(s) for s in shape)
+        self.n_bins = int(n_bins)
+        self.n = 0
+        n_edges = int(np.prod(self.shape))
+        self.minimum = np.full(n_edges, np.inf)
+        self.maximum = np.full(n_edges, -np.inf)
+        # Exact values until n_bins matrices are seen, then the histograms
+        self.buffer = np.empty((self.n_bins, n_edges))
+        self.lower = None
+        self.width = None
+        self.counts = None
+
+    @property
+    def exact(self) -> bool:
+        """Whether the matrices are still kept as they are."""
+        return self.counts is None
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays of the sketch."""
+        arrays = [self.minimum, self.maximum, self.buffer]
+        arrays += [self.lower, self.width, self.counts]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def update(self, matrices: np.ndarray) -> None:
+        """Adds one (R, R) matrix, or a (N, R, R) stack of matrices, to the sketch.
+
+        Args:
+            matrices (np.ndarray): Matrices to add.
+
+        Raises:
+            ValueError: If the shape of the matrices does not match the sketch, or if they
+                contain non-finite values.
+        """
+        values = np.asarray(matrices, dtype=np.float64)
+        if values.shape == self.shape:
+            values = values[np.newaxis]
+        if values.shape[1:] != self.shape:
+            raise ValueError(
+                f"Expected matrices of shape {self.shape}, got {values.shape[1:]}."
+            )
+        if not np.all(np.isfinite(values)):
+            raise ValueError("Matrices contain non-finite values.")
+        if len(values) == 0:
+            return
+        values = values.reshape(len(values), -1)
+        np.minimum(self.minimum, values.min(axis=0), out=self.minimum)
+        np.maximum(self.maximum, values.max(axis=0), out=self.maximum)
+
+        if self.exact:
+            n_buffered = min(len(values), self.n_bins - self.n)
+            self.buffer[self.n : self.n + n_buffered] = values[:n_buffered]
+            self.n += n_buffered
+            values = values[n_buffered:]
+            if self.n < self.n_bins:
+                return
+            self._build_histograms()
+        if len(values):
+            self._grow(values.min(axis=0), values.max(axis=0))
+            self._add(values)
+            self.n += len(values)
+
+    def _build_histograms(self):
+        """Replaces the buffered matrices by histograms over their range."""
+        self.width = (self.maximum - self.minimum) / self.n_bins
+        self.lower = self.minimum.copy()
+        # Constant edges get a narrow range centered on their value
+        constant = self.width == 0
+        self.width[constant] = np.maximum(np.abs(self.lower[constant]), 1) * 2**-20
+        self.lower[constant] -= self.width[constant] * self.n_bins / 2
+        self.counts = np.zeros((len(self.lower), self.n_bins), dtype=np.uint32)
+        self._add(self.buffer)
+        self.buffer = None
+
+    def _grow(self, minimum: np.ndarray, maximum: np.ndarray):
+        """Doubles the ranges of the edges until they contain [minimum, maximum]."""
+        half = self.n_bins // 2
+        while True:
+            left = minimum < self.lower
+            right = maximum > self.lower + self.n_bins * self.width
+            grow = np.flatnonzero(left | right)
+            if len(grow) == 0:
+                return
+            merged = self.counts[grow].reshape(len(grow), half, 2).sum(axis=2)
+            counts = np.zeros((len(grow), self.n_bins), dtype=self.counts.dtype)
+            # Growing to the left moves the merged bins to the upper half of the range
+            to_left = left[grow]
+            counts[to_left, half:] = merged[to_left]
+            counts[~to_left, :half] = merged[~to_left]
+            self.counts[grow] = counts
+            self.lower[grow[to_left]] -= self.n_bins * self.width[grow[to_left]]
+            self.width[grow] *= 2
+
+    def _add(self, values: np.ndarray):
+        """Counts (N, E) values, all within the ranges of the histograms."""
+        bins = np.floor((values - self.lower) / self.width).astype(np.intp)
+        np.clip(bins, 0, self.n_bins - 1, out=bins)
+        bins += np.arange(values.shape[1]) * self.n_bins
+        # The bins of one matrix are distinct, so a fancy-indexed increment counts them
+        # all, touching E counts instead of the E * n_bins of a bincount
+        counts = self.counts.reshape(-1)
+        for matrix_bins in bins:
+            counts[matrix_bins] += 1
+
+    def _check_not_empty(self):
+        if self.n == 0:
+            raise ValueError("The sketch is empty.")
+
+    def _cdf(self, cumulative: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Number of values of each edge below values, interpolated within the bins."""
+        position = np.clip((values - self.lower) / self.width, 0, self.n_bins)
+        bins = np.minimum(position.astype(np.intp), self.n_bins - 1)[:, np.newaxis]
+        below = np.take_along_axis(cumulative, bins, axis=1)[:, 0]
+        inside = np.take_along_axis(self.counts, bins, axis=1)[:, 0]
+        return below - inside + (position - bins[:, 0]) * inside
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> np.ndarray:
+        """Quantiles of each edge.
+
+        Args:
+            q (Union[float, Sequence[float]]): Quantile(s), between 0 and 1.
+
+        Returns:
+            np.ndarray: Quantile matrix, or a (Q, R, R) stack for a sequence of quantiles.
+        """
+        self._check_not_empty()
+        q = np.asarray(q, dtype=np.float64)
+        if np.any((q < 0) | (q > 1)):
+            raise ValueError("Quantiles must be between 0 and 1.")
+        if self.exact:
+            values = np.quantile(self.buffer[: self.n], q, axis=0)
+            return values.reshape(q.shape + self.shape)
+
+        cumulative = np.cumsum(self.counts, axis=1, dtype=np.int64)
+        values = []
+        # A strictly positive rank never lands in an empty bin
+        for target in np.clip(q.ravel() * self.n, np.finfo(float).tiny, self.n):
+            bins = np.count_nonzero(cumulative < target, axis=1)[:, np.newaxis]
+            above = np.take_along_axis(cumulative, bins, axis=1)[:, 0]
+            inside = np.take_along_axis(self.counts, bins, axis=1)[:, 0]
+            fraction = (target - above + inside) / inside
+            value = self.lower + (bins[:, 0] + fraction) * self.width
+            values.append(np.clip(value, self.minimum, self.maximum))
+        return np.reshape(values, q.shape + self.shape)
+
+    def median(self) -> np.ndarray:
+        """Median of each edge.
+
+        Returns:
+            np.ndarray: Median matrix.
+        """
+        return self.quantile(0.5)
+
+    def mad(self) -> np.ndarray:
+        """Median absolute deviation of each edge, without the MAD_SCALE factor.
+
+        Returns:
+            np.ndarray: MAD matrix.
+        """
+        self._check_not_empty()
+        median = self.median().ravel()
+        if self.exact:
+            deviations = np.abs(self.buffer[: self.n] - median)
+            return np.median(deviations, axis=0).reshape(self.shape)
+
+        # Smallest deviation d with half of the values within [median - d, median + d]
+        cumulative = np.cumsum(self.counts, axis=1, dtype=np.int64)
+        low = np.zeros_like(median)
+        high = np.maximum(median - self.minimum, self.maximum - median)
+        for _ in range(_MAD_STEPS):
+            middle = (low + high) / 2
+            within = self._cdf(cumulative, median + middle) - self._cdf(
+                cumulative, median - middle
+            )
+            enough = within >= self.n / 2
+            high = np.where(enough, middle, high)
+            low = np.where(enough, low, middle)
+        return high.reshape(self.shape)
+
+    def save(self, output_name: str) -> None:
+        """Saves the sketch in the onsetpy sketch format (.npz).
+
+        Args:
+            output_name (str): Output filename.
+        """
+        if self.exact:
+            arrays = {"buffer": self.buffer[: self.n]}
+        else:
+            arrays = {"lower": self.lower, "width": self.width, "counts": self.counts}
+        with stage("save_sketch", path=str(output_name)):
+            with open(output_name, "wb") as f:
+                np.savez(
+                    f,
+                    format=np.array(SKETCH_FORMAT),
+                    shape=np.array(self.shape),
+                    n_bins=np.array(self.n_bins),
+                    n=np.array(self.n),
+                    minimum=self.minimum,
+                    maximum=self.maximum,
+                    **arrays,
+                )
+            count_file(BYTES_WRITTEN, output_name)
+
+    def __repr__(self):
+        kind = "exact" if self.exact else "histograms"
+        return (
+            f"EdgeHistogram({self.shape}, {self.n_bins} bins, {self.n} matrices, "
+            f"{kind})"
+        )
+
+
+def load_sketch(input_name: str) -> EdgeHistogram:
+    """Loads a sketch saved by EdgeHistogram.save.
+
+    Args:
+        input_name (str): Sketch filename.
+
+    Returns:
+        EdgeHistogram: The sketch.
+
+    Raises:
+        ValueError: If the file is not an onsetpy sketch.
+    """
+    with stage("load_sketch", path=str(input_name)):
+        count_file(BYTES_READ, input_name)
+        f = np.load(input_name, allow_pickle=False)
+        if not isinstance(f, np.lib.npyio.NpzFile):
+            raise ValueError(f"{input_name} is not an onsetpy sketch file.")
+        with f:
+            if "format" not in f or str(f["format"]) != SKETCH_FORMAT:
+                raise ValueError(f"{input_name} is not an onsetpy sketch file.")
+            sketch = EdgeHistogram(tuple(f["shape"]), int(f["n_bins"]))
+            sketch.n = int(f["n"])
+            sketch.minimum = f["minimum"]
+            sketch.maximum = f["maximum"]
+            if "buffer" in f:
+                sketch.buffer[: sketch.n] = f["buffer"]
+            else:
+                sketch.buffer = None
+                sketch.lower = f["lower"]
+                sketch.width = f["width"]
+                sketch.counts = f["counts"]
+            return sketch
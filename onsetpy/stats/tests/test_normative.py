@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from onsetpy.stats.normative import NormativeModel, design_matrix, load_model
+
+
+class TestNormativeModel(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n_subjects = 60
+        age = rng.uniform(20, 80, n_subjects)
+        sex = rng.integers(0, 2, n_subjects)
+        self.covariates = np.column_stack([age, sex])
+        self.coefficients = rng.normal(size=(3, 5, 5))
+        self.noise = 0.5 * rng.normal(size=(n_subjects, 5, 5))
+        self.matrices = (
+            np.einsum("np,pij->nij", design_matrix(self.covariates), self.coefficients)
+            + self.noise
+        )
+
+    def test_fit_matches_lstsq(self):
+        model = NormativeModel.fit(self.covariates, self.matrices, ["age", "sex"])
+        design = design_matrix(self.covariates)
+        for i, j in [(0, 0), (1, 3), (4, 2)]:
+            coefficients, residuals, _, _ = np.linalg.lstsq(
+                design, self.matrices[:, i, j], rcond=None
+            )
+            np.testing.assert_allclose(model.coefficients[:, i, j], coefficients)
+            np.testing.assert_allclose(
+                model.residual_variance[i, j], residuals[0] / (60 - 3)
+            )
+        np.testing.assert_allclose(model.xtx_inverse, np.linalg.inv(design.T @ design))
+        np.testing.assert_allclose(
+            model.predict(self.covariates[:2]),
+            self.matrices[:2] - self.noise[:2],
+            atol=0.5,
+        )
+
+    def test_z_scores(self):
+        model = NormativeModel.fit(self.covariates, self.matrices)
+        patient = self.covariates[:1]
+        expected = model.predict(patient) + 3 * np.sqrt(model.residual_variance)
+        z_scores = model.z_scores(patient, expected)
+        self.assertEqual(z_scores.shape, (1, 5, 5))
+        # Slightly below 3: the prediction itself is uncertain
+        self.assertTrue(np.all(z_scores < 3))
+        self.assertTrue(np.all(z_scores > 2.9))
+
+    def test_save_load(self):
+        model = NormativeModel.fit(self.covariates, self.matrices, ["age", "sex"])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "model.npz")
+            model.save(filename)
+            loaded = load_model(filename)
+            np.save(os.path.join(tmp_dir, "matrix.npy"), self.matrices[0])
+            with self.assertRaises(ValueError):
+                load_model(os.path.join(tmp_dir, "matrix.npy"))
+        self.assertEqual(loaded.covariate_names, ["age", "sex"])
+        self.assertEqual(loaded.n_subjects, 60)
+        np.testing.assert_array_equal(
+            loaded.z_scores(self.covariates, self.matrices),
+            model.z_scores(self.covariates, self.matrices),
+        )
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            NormativeModel.fit(self.covariates[:10], self.matrices)
+        with self.assertRaises(ValueError):
+            NormativeModel.fit(self.covariates[:3], self.matrices[:3])
+        collinear = np.column_stack([self.covariates, 2 * self.covariates[:, 0]])
+        with self.assertRaises(ValueError):
+            NormativeModel.fit(collinear, self.matrices)
+        model = NormativeModel.fit(self.covariates, self.matrices)
+        with self.assertRaises(ValueError):
+            model.predict(self.covariates[:, :1])
+        with self.assertRaises(ValueError):
+            model.z_scores(self.covariates[:2], self.matrices[:3])
+
+
+if __name__ == "__main__":
+    unittest.main()
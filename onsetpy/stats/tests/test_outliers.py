@@ -0,0 +1,67 @@
+import csv
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from onsetpy.stats.outliers import (
+    EDGE_COLUMNS,
+    save_edge_table,
+    threshold_edges,
+    top_k_edges,
+)
+
+
+class TestOutliers(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        z_scores = rng.normal(size=(30, 30))
+        self.z_scores = (z_scores + z_scores.T) / 2
+        self.z_scores[2, 7] = self.z_scores[7, 2] = -6
+        self.z_scores[1, 3] = self.z_scores[3, 1] = 5
+        self.z_scores[4, 5] = self.z_scores[5, 4] = np.inf
+        np.fill_diagonal(self.z_scores, 10)
+
+    def test_threshold_edges(self):
+        rows, cols, values = threshold_edges(self.z_scores, 1)
+        upper = np.triu(np.ones((30, 30), dtype=bool), 1)
+        expected = upper & (np.abs(self.z_scores) >= 1) & np.isfinite(self.z_scores)
+        self.assertEqual(len(values), np.count_nonzero(expected))
+        self.assertTrue(np.all(rows < cols))
+        np.testing.assert_array_equal(values, self.z_scores[rows, cols])
+        self.assertTrue(np.all(np.diff(np.abs(values)) <= 0))
+        self.assertEqual((rows[0], cols[0], values[0]), (2, 7, -6))
+
+    def test_top_k_edges(self):
+        rows, cols, values = top_k_edges(self.z_scores, 2)
+        np.testing.assert_array_equal(rows, [2, 1])
+        np.testing.assert_array_equal(cols, [7, 3])
+        np.testing.assert_array_equal(values, [-6, 5])
+        _, _, values = top_k_edges(self.z_scores, 50)
+        _, _, expected = threshold_edges(self.z_scores, 0)
+        np.testing.assert_array_equal(values, expected[:50])
+        self.assertEqual(len(top_k_edges(self.z_scores[:2, :2], 5)[0]), 1)
+        with self.assertRaises(ValueError):
+            top_k_edges(self.z_scores, 0)
+
+    def test_directed(self):
+        z_scores = np.zeros((3, 3))
+        z_scores[2, 0] = 4
+        rows, cols, values = threshold_edges(z_scores, 3)
+        self.assertEqual((rows.tolist(), cols.tolist()), ([2], [0]))
+
+    def test_save_edge_table(self):
+        labels = [f"region_{i}" for i in range(30)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "edges.csv")
+            save_edge_table(filename, top_k_edges(self.z_scores, 2), labels)
+            with open(filename) as f:
+                table = list(csv.reader(f))
+        self.assertEqual(tuple(table[0]), EDGE_COLUMNS)
+        self.assertEqual(table[1], ["2", "7", "region_2", "region_7", "-6"])
+        self.assertEqual(len(table), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
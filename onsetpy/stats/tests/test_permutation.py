@@ -0,0 +1,142 @@
+import unittest
+
+import numpy as np
+
+from onsetpy.stats.permutation import (
+    _components,
+    _t_statistics,
+    cohort_to_edges,
+    edges_to_matrix,
+    permutation_test,
+)
+
+
+def _symmetric_cohort(rng, n_subjects, n_nodes):
+    cohort = rng.normal(size=(n_subjects, n_nodes, n_nodes))
+    return (cohort + cohort.transpose(0, 2, 1)) / 2
+
+
+def _naive_t(a, b, equal_var):
+    """Two-sample t statistic of one edge."""
+    n_a, n_b = len(a), len(b)
+    var_a, var_b = np.var(a, ddof=1), np.var(b, ddof=1)
+    if equal_var:
+        pooled = ((n_a - 1) * var_a + (n_b - 1) * var_b) / (n_a + n_b - 2)
+        return (a.mean() - b.mean()) / np.sqrt(pooled * (1 / n_a + 1 / n_b))
+    return (a.mean() - b.mean()) / np.sqrt(var_a / n_a + var_b / n_b)
+
+
+def _naive_max_component(edges, n_nodes):
+    """Number of edges of the largest connected component, with a union-find."""
+    parents = list(range(n_nodes))
+
+    def _find(node):
+        while parents[node] != node:
+            node = parents[node]
+        return node
+
+    for i, j in edges:
+        parents[_find(i)] = _find(j)
+    sizes = {}
+    for i, _ in edges:
+        root = _find(i)
+        sizes[root] = sizes.get(root, 0) + 1
+    return max(sizes.values(), default=0)
+
+
+class TestPermutation(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.group_a = _symmetric_cohort(rng, 8, 10)
+        self.group_b = _symmetric_cohort(rng, 11, 10)
+        # Strong effect on the edges between the first 4 nodes
+        self.group_a[:, :4, :4] += 3
+
+    def test_edges_round_trip(self):
+        edges = cohort_to_edges(self.group_a)
+        self.assertEqual(edges.shape, (8, 45))
+        self.assertTrue(edges.flags["C_CONTIGUOUS"])
+        matrix = edges_to_matrix(edges[0], 10, diagonal=np.nan)
+        off_diagonal = ~np.eye(10, dtype=bool)
+        np.testing.assert_array_equal(
+            matrix[off_diagonal], self.group_a[0][off_diagonal]
+        )
+        self.assertTrue(np.all(np.isnan(np.diag(matrix))))
+
+    def test_t_statistics(self):
+        edges = cohort_to_edges(np.concatenate([self.group_a, self.group_b]))
+        centered = edges - edges.mean(axis=0)
+        totals = (centered.sum(axis=0), (centered**2).sum(axis=0))
+        rng = np.random.default_rng(1)
+        assignments = np.zeros((5, 19))
+        for row in assignments:
+            row[rng.choice(19, 8, replace=False)] = 1
+
+        for equal_var in (True, False):
+            batched = _t_statistics(
+                assignments, centered, centered**2, totals, 8, equal_var
+            )
+            for row, statistics in zip(assignments, batched):
+                expected = [
+                    _naive_t(edge[row == 1], edge[row == 0], equal_var)
+                    for edge in edges.T
+                ]
+                np.testing.assert_allclose(statistics, expected)
+
+    def test_components(self):
+        rng = np.random.default_rng(2)
+        rows, cols = np.triu_indices(12, 1)
+        supra = rng.random((20, len(rows))) < 0.08
+        _, sizes = _components(supra, rows, cols, 12)
+        for mask, size in zip(supra, sizes.max(axis=1)):
+            expected = _naive_max_component(list(zip(rows[mask], cols[mask])), 12)
+            self.assertEqual(size, expected)
+
+    def test_permutation_test(self):
+        result = permutation_test(
+            self.group_a, self.group_b, n_permutations=500, nbs_threshold=5, seed=0
+        )
+        for name in ("t", "p_uncorrected", "p_fwe", "nbs_p"):
+            self.assertEqual(result[name].shape, (10, 10))
+            np.testing.assert_array_equal(result[name], result[name].T)
+
+        effect = np.triu(np.ones((10, 10), dtype=bool), 1)
+        effect[4:] = False
+        effect[:, 4:] = False
+        self.assertTrue(np.all(result["p_fwe"][effect] < 0.01))
+        self.assertTrue(np.all(result["p_fwe"][np.triu(~effect, 1)] > 0.05))
+        self.assertTrue(np.all(result["p_uncorrected"] <= result["p_fwe"]))
+
+        component = result["nbs_components"][0]
+        self.assertEqual(component["nodes"], [0, 1, 2, 3])
+        self.assertEqual(component["edges"], 6)
+        self.assertLess(component["p"], 0.01)
+
+    def test_tails(self):
+        greater = permutation_test(
+            self.group_a, self.group_b, 200, tail="greater", seed=0
+        )
+        less = permutation_test(self.group_a, self.group_b, 200, tail="less", seed=0)
+        self.assertLess(greater["p_fwe"][0, 1], 0.01)
+        self.assertGreater(less["p_fwe"][0, 1], 0.5)
+
+    def test_reproducible_across_processes(self):
+        kwargs = {"n_permutations": 300, "nbs_threshold": 2, "seed": 3}
+        serial = permutation_test(self.group_a, self.group_b, batch_size=64, **kwargs)
+        parallel = permutation_test(
+            self.group_a, self.group_b, batch_size=64, processes=2, **kwargs
+        )
+        for name in ("t", "p_uncorrected", "p_fwe", "nbs_p"):
+            np.testing.assert_array_equal(serial[name], parallel[name])
+
+    def test_invalid_groups(self):
+        with self.assertRaises(ValueError):
+            permutation_test(self.group_a[:1], self.group_b)
+        with self.assertRaises(ValueError):
+            permutation_test(self.group_a, self.group_b[:, :5, :5])
+        with self.assertRaises(ValueError):
+            permutation_test(self.group_a, self.group_b, tail="both")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from onsetpy.stats.running import RunningStats, running_stats
+
+EPS32 = 2.0**-24
+
+
+class TestRunningStats(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Large offset: the worst case of an uncompensated float32 accumulation
+        self.cohort = 1000 + rng.normal(size=(5000, 6, 6))
+        self.mean = self.cohort.mean(axis=0)
+        self.std = self.cohort.std(axis=0, ddof=1)
+
+    def test_float64(self):
+        stats = running_stats(self.cohort)
+        self.assertEqual(stats.n, 5000)
+        self.assertEqual(stats.mean.dtype, np.float64)
+        np.testing.assert_allclose(stats.mean, self.mean, rtol=1e-14)
+        np.testing.assert_allclose(stats.std(), self.std, rtol=1e-12)
+        np.testing.assert_allclose(
+            stats.std(ddof=0), self.cohort.std(axis=0), rtol=1e-12
+        )
+
+    def _assert_float32_error_bound(self, cohort):
+        mean = cohort.mean(axis=0)
+        std = cohort.std(axis=0, ddof=1)
+        stats = running_stats(cohort, "float32")
+        self.assertEqual(stats.mean.dtype, np.float32)
+        self.assertEqual(stats.std().dtype, np.float32)
+        magnitude = np.abs(cohort).max(axis=0)
+        mean_bound = 4 * EPS32 * magnitude
+        self.assertTrue(np.all(np.abs(stats.mean - mean) <= mean_bound))
+        deviations = np.abs(cohort - mean).max(axis=0)
+        std_bound = 4 * EPS32 * (deviations + std) + 2 * EPS32 * magnitude
+        self.assertTrue(np.all(np.abs(stats.std() - std) <= std_bound))
+
+    def test_float32_error_bound(self):
+        self._assert_float32_error_bound(self.cohort)
+
+    def test_float32_error_bound_large_offset(self):
+        # The rounding of the inputs to float32 dominates the error of the std
+        rng = np.random.default_rng(1)
+        self._assert_float32_error_bound(1e4 + rng.normal(size=(5000, 6, 6)))
+
+    def test_few_matrices(self):
+        stats = RunningStats((2, 2), "float32")
+        stats.update(np.ones((2, 2)))
+        np.testing.assert_array_equal(stats.mean, np.ones((2, 2)))
+        self.assertTrue(np.all(np.isnan(stats.std())))
+        np.testing.assert_array_equal(stats.std(ddof=0), np.zeros((2, 2)))
+
+    def test_leave_one_out(self):
+        cohort = self.cohort[:20]
+        stats = running_stats(cohort)
+        for i in (0, 7, 19):
+            others = np.delete(cohort, i, axis=0)
+            mean, std = stats.leave_one_out(cohort[i])
+            np.testing.assert_allclose(mean, others.mean(axis=0), rtol=1e-13)
+            np.testing.assert_allclose(std, others.std(axis=0, ddof=1), rtol=1e-9)
+        with self.assertRaises(ValueError):
+            running_stats(cohort[:2]).leave_one_out(cohort[0])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            RunningStats((2, 2), "float16")
+        with self.assertRaises(ValueError):
+            running_stats([])
+        with self.assertRaises(ValueError):
+            running_stats([np.zeros((2, 2)), np.zeros((3, 3))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from onsetpy.stats.sketch import EdgeHistogram, load_sketch
+
+
+class TestEdgeHistogram(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Heavy-tailed weights, with a constant (empty) edge
+        self.cohort = rng.lognormal(size=(2000, 4, 4))
+        self.cohort[:, 0, 0] = 0
+
+    def _sketch(self, cohort, n_bins=64):
+        sketch = EdgeHistogram(cohort.shape[1:], n_bins)
+        # Matrices streamed one by one and in stacks
+        for matrix in cohort[:10]:
+            sketch.update(matrix)
+        sketch.update(cohort[10:500])
+        sketch.update(cohort[500:])
+        return sketch
+
+    def test_exact_below_n_bins(self):
+        sketch = self._sketch(self.cohort[:50])
+        self.assertTrue(sketch.exact)
+        np.testing.assert_allclose(sketch.median(), np.median(self.cohort[:50], axis=0))
+        deviations = np.abs(self.cohort[:50] - np.median(self.cohort[:50], axis=0))
+        np.testing.assert_allclose(sketch.mad(), np.median(deviations, axis=0))
+
+    def test_quantiles(self):
+        sketch = self._sketch(self.cohort)
+        self.assertFalse(sketch.exact)
+        self.assertEqual(sketch.n, 2000)
+        q = [0.05, 0.5, 0.95]
+        expected = np.quantile(self.cohort, q, axis=0)
+        result = sketch.quantile(q)
+        self.assertEqual(result.shape, (3, 4, 4))
+        # The error is bounded by the width of one bin
+        width = sketch.width.reshape(4, 4)
+        self.assertTrue(np.all(np.abs(result - expected) <= width))
+        np.testing.assert_array_equal(sketch.quantile([0, 1])[:, 0, 0], [0, 0])
+        np.testing.assert_array_equal(sketch.quantile(1), self.cohort.max(axis=0))
+
+    def test_mad(self):
+        sketch = self._sketch(self.cohort)
+        median = np.median(self.cohort, axis=0)
+        expected = np.median(np.abs(self.cohort - median), axis=0)
+        width = sketch.width.reshape(4, 4)
+        self.assertTrue(np.all(np.abs(sketch.mad() - expected) <= 2 * width))
+        self.assertEqual(sketch.mad()[0, 0], 0)
+
+    def test_range_growth(self):
+        sketch = EdgeHistogram((1,), 4)
+        sketch.update(np.array([[0.0], [1.0], [2.0], [4.0]]))
+        np.testing.assert_array_equal(sketch.counts, [[1, 1, 1, 1]])
+        sketch.update(np.array([[-3.0], [9.0]]))
+        self.assertEqual(sketch.counts.sum(), 6)
+        self.assertLessEqual(sketch.lower[0], -3)
+        self.assertGreaterEqual(sketch.lower[0] + 4 * sketch.width[0], 9)
+
+    def test_memory_independent_of_n(self):
+        sketch = self._sketch(self.cohort[:200])
+        nbytes = sketch.nbytes
+        sketch.update(self.cohort[200:])
+        self.assertEqual(sketch.nbytes, nbytes)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for cohort in (self.cohort[:20], self.cohort):
+                filename = os.path.join(tmp_dir, "sketch.npz")
+                sketch = self._sketch(cohort)
+                sketch.save(filename)
+                loaded = load_sketch(filename)
+                self.assertEqual(loaded.exact, sketch.exact)
+                np.testing.assert_array_equal(loaded.median(), sketch.median())
+                np.testing.assert_array_equal(loaded.mad(), sketch.mad())
+
+            np.save(os.path.join(tmp_dir, "matrix.npy"), self.cohort[0])
+            with self.assertRaises(ValueError):
+                load_sketch(os.path.join(tmp_dir, "matrix.npy"))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            EdgeHistogram((4, 4), 3)
+        sketch = EdgeHistogram((4, 4))
+        with self.assertRaises(ValueError):
+            sketch.median()
+        with self.assertRaises(ValueError):
+            sketch.update(np.zeros((3, 3)))
+        with self.assertRaises(ValueError):
+            sketch.update(np.full((4, 4), np.nan))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from onsetpy import instrumentation
+from onsetpy.instrumentation import (
+    BYTES_READ,
+    BYTES_WRITTEN,
+    Profiler,
+    count,
+    count_file,
+    get_profiler,
+    stage,
+    start_profiling,
+    stop_profiling,
+    timed,
+)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_nested_stages(self):
+        profiler = Profiler(sample_interval=0)
+        with profiler.stage("outer", path="a.npy"):
+            profiler.count(BYTES_READ, 10)
+            with profiler.stage("inner"):
+                profiler.count(BYTES_WRITTEN, 4)
+
+        stages = {e["name"]: e for e in profiler.events if e["ph"] == "X"}
+        outer, inner = stages["outer"], stages["inner"]
+        self.assertLessEqual(outer["ts"], inner["ts"])
+        self.assertGreaterEqual(outer["ts"] + outer["dur"], inner["ts"] + inner["dur"])
+        self.assertEqual(outer["args"]["path"], "a.npy")
+        self.assertEqual(outer["args"][BYTES_READ], 10)
+        self.assertEqual(outer["args"][BYTES_WRITTEN], 4)
+        self.assertNotIn(BYTES_READ, inner["args"])
+        self.assertEqual(profiler.counters, {BYTES_READ: 10, BYTES_WRITTEN: 4})
+
+    def test_concurrent_stages(self):
+        profiler = Profiler(sample_interval=0)
+        opened = threading.Barrier(2)
+
+        def _load(name, size):
+            with profiler.stage("load", path=name):
+                # Both stages are open when the bytes are counted
+                opened.wait()
+                profiler.count(BYTES_READ, size)
+                opened.wait()
+
+        with profiler.stage("main"):
+            threads = [
+                threading.Thread(target=_load, args=(name, size))
+                for name, size in (("a.npy", 10), ("b.npy", 100))
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            profiler.count("items", 2)
+
+        stages = [e for e in profiler.events if e["ph"] == "X"]
+        loads = {e["args"]["path"]: e["args"] for e in stages if e["name"] == "load"}
+        self.assertEqual(loads["a.npy"][BYTES_READ], 10)
+        self.assertEqual(loads["b.npy"][BYTES_READ], 100)
+        main = next(e["args"] for e in stages if e["name"] == "main")
+        self.assertNotIn(BYTES_READ, main)
+        self.assertEqual(main["items"], 2)
+        self.assertEqual(profiler.counters, {BYTES_READ: 110, "items": 2})
+
+    def test_stage_records_failures(self):
+        profiler = Profiler(sample_interval=0)
+        with self.assertRaises(ValueError):
+            with profiler.stage("failing"):
+                raise ValueError()
+        self.assertIn("failing", profiler.stage_totals)
+
+    def test_trace_format(self):
+        profiler = Profiler(name="onset_test", sample_interval=0.001).start()
+        with profiler.stage("work"):
+            sum(range(10000))
+        profiler.stop()
+
+        trace = json.loads(json.dumps(profiler.to_trace()))
+        self.assertEqual(trace["traceEvents"][0]["ph"], "M")
+        self.assertEqual(trace["traceEvents"][0]["args"]["name"], "onset_test")
+        for event in trace["traceEvents"]:
+            self.assertIn(event["ph"], ("M", "X", "C"))
+            self.assertIn("pid", event)
+            self.assertIn("tid", event)
+        summary = trace["otherData"]
+        self.assertEqual(summary["command"], "onset_test")
+        self.assertIn("work", summary["stages_s"])
+        self.assertGreater(summary["peak_rss_mb"], 0)
+
+
+class TestActiveProfiler(unittest.TestCase):
+    def tearDown(self):
+        stop_profiling()
+
+    def test_inactive(self):
+        self.assertIsNone(get_profiler())
+
+        @timed()
+        def _add(a, b):
+            return a + b
+
+        with stage("ignored"):
+            count(BYTES_READ, 1)
+        self.assertEqual(_add(1, 2), 3)
+        self.assertIsNone(get_profiler())
+
+    def test_write_on_stop(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            trace_path = os.path.join(temp_dir, "trace.json")
+            data_path = os.path.join(temp_dir, "data.bin")
+            with open(data_path, "wb") as f:
+                f.write(b"x" * 100)
+
+            @timed("compute")
+            def _compute():
+                count_file(BYTES_READ, data_path)
+
+            start_profiling(trace_path, sample_interval=0)
+            _compute()
+            profiler = stop_profiling()
+
+            self.assertIsNone(instrumentation._PROFILER)
+            self.assertEqual(profiler.counters[BYTES_READ], 100)
+            with open(trace_path) as f:
+                trace = json.load(f)
+        names = [e["name"] for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(names, ["compute"])
+
+
+if __name__ == "__main__":
+    unittest.main()